@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Batch rendering of life calendars for many users at once.
+
+Reads a CSV (user_id,birth_date,gender) or JSONL file, renders every calendar in a
+process pool and writes one image per user to a directory, a zip archive and/or the
+render cache disk tier the broadcast reads from. Users with the same render key share
+one render. A rerun skips work that is already done, so an interrupted run resumes:
+
+    python batch_render.py users.csv --output-dir grids/
+    python batch_render.py users.jsonl --archive grids.zip --week-of next
+    python batch_render.py users.csv --cache-dir "$RENDER_CACHE_DIR" --week-of next
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from calendar_math import week_start
+from life_visualizer import LifeVisualizer, RENDER_ENGINES, get_profile
+from image_encoding import ENCODING_PRESETS
+from inline_query import valid_birth_date
+from render_cache import RenderCache, render_key_digest
+from render_pool import _init_worker, _render_grid
+from config import RENDER_WORKERS, RENDER_ENGINE, OUTPUT_PRESET, RENDER_CACHE_DISK_MAX_BYTES
+
+
+def parse_date(text):
+    """YYYY-MM-DD or DD.MM.YYYY, the format /setbirth accepts"""
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(text.strip(), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"bad date {text!r}")
+
+
+def read_users(path, stats, today):
+    """Yield (user_id, birth_date, gender) rows.
+
+    Rows that cannot be parsed, and birth dates /setbirth would reject, are counted in stats['invalid'].
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            # Строки разбираются внутри try: одна битая строка не останавливает весь запуск
+            records, load = (line for line in f if line.strip()), json.loads
+        else:
+            records, load = csv.DictReader(f), dict
+        for record in records:
+            try:
+                record = load(record)
+                user_id, birth_date = int(record['user_id']), parse_date(str(record['birth_date']))
+                gender = record.get('gender') or 'default'
+            except (KeyError, TypeError, ValueError, AttributeError):
+                stats['invalid'] += 1
+                continue
+            if not valid_birth_date(birth_date, today):
+                stats['invalid'] += 1
+                continue
+            yield user_id, birth_date, gender
+
+
+def parse_week_of(text):
+    """'today', 'next' (the coming Monday) or a date inside the week to render"""
+    today = date.today()
+    if text == 'today':
+        return today
+    if text == 'next':
+        return week_start(today) + timedelta(weeks=1)
+    return parse_date(text)
+
+
+class DirectorySink:
+    """One file per user: <user_id>.<ext>.
+
+    The render key digest of every written file goes to an append-only manifest, so a rerun for
+    another week (or engine, or preset) re-renders files instead of keeping last week's calendars.
+    """
+
+    MANIFEST = '.manifest'
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._digests = {}  # имя файла -> дайджест ключа, с которым он записан
+        manifest_path = os.path.join(path, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    name, _, digest = line.strip().partition(' ')
+                    if digest:
+                        self._digests[name] = digest  # более поздняя запись перекрывает раннюю
+        self._manifest = open(manifest_path, 'a', encoding='utf-8')
+
+    def _user_path(self, user_id, ext):
+        return os.path.join(self.path, f"{user_id}.{ext}")
+
+    def done(self, key, user_ids, ext):
+        digest = render_key_digest(key)
+        return all(self._digests.get(f"{u}.{ext}") == digest and os.path.exists(self._user_path(u, ext))
+                   for u in user_ids)
+
+    def write(self, key, user_ids, ext, data):
+        digest = render_key_digest(key)
+        for user_id in user_ids:
+            path = self._user_path(user_id, ext)
+            # Запись через временный файл: прерванный запуск не оставит обрезанных картинок
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+            # В манифест - только после замены файла: прерванная запись будет повторена
+            self._manifest.write(f"{user_id}.{ext} {digest}\n")
+            self._digests[f"{user_id}.{ext}"] = digest
+        self._manifest.flush()
+
+    def finish(self, plan, ext):
+        self._manifest.close()
+
+
+class ArchiveSink:
+    """A zip archive with one entry per user.
+
+    Renders are staged per key in <archive>.parts/ and packed at the end, so an interrupted
+    run resumes from the staged files instead of a half-written archive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parts = DirectorySink(f"{path}.parts")
+
+    def done(self, key, user_ids, ext):
+        return self.parts.done(key, [render_key_digest(key)], ext)
+
+    def write(self, key, user_ids, ext, data):
+        self.parts.write(key, [render_key_digest(key)], ext, data)
+
+    def finish(self, plan, ext):
+        tmp_path = f"{self.path}.tmp"
+        # Изображения уже сжаты - zip их только хранит
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for key, user_ids in plan.items():
+                part = self.parts._user_path(render_key_digest(key), ext)
+                for user_id in user_ids:
+                    archive.write(part, f"{user_id}.{ext}")
+        os.replace(tmp_path, self.path)
+        self.parts.finish(plan, ext)
+        shutil.rmtree(self.parts.path)
+
+
+class CacheSink:
+    """The render cache disk tier, keyed by render key: the broadcast picks these up instead of rendering"""
+
+    def __init__(self, path):
+        self.cache = RenderCache(max_bytes=0, disk_dir=path, disk_max_bytes=RENDER_CACHE_DISK_MAX_BYTES)
+
+    def done(self, key, user_ids, ext):
+        return self.cache.on_disk(key)
+
+    def write(self, key, user_ids, ext, data):
+        self.cache.put(key, data, evict=False)
+
+    def finish(self, plan, ext):
+        self.cache.evict_disk()
+
+
+def build_plan(users, visualizer, today):
+    """Group users by render key: users with the same key share one render"""
+    plan = defaultdict(list)
+    count = 0
+    for user_id, birth_date, gender in users:
+        plan[visualizer.get_render_key(birth_date, profile=get_profile(gender), today=today)].append(user_id)
+        count += 1
+    return plan, count
+
+
+class Progress:
+    """Renders done, throughput and ETA on one stderr line"""
+
+    def __init__(self, total, enabled=True, interval=0.5):
+        self.total = total
+        self.enabled = enabled
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self._shown = 0
+
+    def advance(self):
+        self.done += 1
+        now = time.perf_counter()
+        if self.enabled and (now - self._shown >= self.interval or self.done == self.total):
+            self._shown = now
+            rate = self.done / max(now - self.started, 1e-9)
+            eta = (self.total - self.done) / rate if rate else 0
+            end = '\n' if self.done == self.total else ''
+            print(f"\r🎨 {self.done}/{self.total} renders, {rate:.1f}/s, ETA {eta:.0f}s ", end=end,
+                  file=sys.stderr, flush=True)
+
+
+def _render(key):
+    png_bytes, _ = _render_grid(key)
+    return key, png_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render life calendars for many users")
+    parser.add_argument('input', help="CSV with user_id,birth_date,gender columns or JSONL with the same fields")
+    parser.add_argument('--output-dir', help="write <user_id>.<ext> files here")
+    parser.add_argument('--archive', help="write a zip archive with <user_id>.<ext> entries")
+    parser.add_argument('--cache-dir', help="fill the render cache disk tier (RENDER_CACHE_DIR) for the broadcast")
+    parser.add_argument('--week-of', default='today',
+                        help="week to render: 'today', 'next' (the coming Monday) or a date")
+    parser.add_argument('--engine', choices=RENDER_ENGINES, default=RENDER_ENGINE)
+    parser.add_argument('--preset', choices=sorted(ENCODING_PRESETS), default=OUTPUT_PRESET)
+    parser.add_argument('--workers', type=int, default=max(RENDER_WORKERS, os.cpu_count() or 1))
+    parser.add_argument('--quiet', action='store_true', help="no progress line")
+    args = parser.parse_args(argv)
+
+    sinks = [sink(path) for sink, path in ((DirectorySink, args.output_dir), (ArchiveSink, args.archive),
+                                           (CacheSink, args.cache_dir)) if path]
+    if not sinks:
+        parser.error("choose at least one of --output-dir, --archive, --cache-dir")
+
+    started = time.perf_counter()
+    today = parse_week_of(args.week_of)
+    visualizer = LifeVisualizer(engine=args.engine, preset=args.preset)
+    stats = {'invalid': 0}
+    plan, users = build_plan(read_users(args.input, stats, today), visualizer, today)
+    ext = visualizer.file_extension(next(iter(plan))) if plan else 'png'
+    pending = [key for key, user_ids in plan.items() if not all(s.done(key, user_ids, ext) for s in sinks)]
+
+    progress = Progress(len(pending), enabled=not args.quiet)
+    written = 0
+    if pending:
+        workers = min(args.workers, len(pending))
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            # Без порядка: результат пишется сразу, и прерванный запуск теряет только рендеры в работе
+            for key, data in pool.imap_unordered(_render, pending, chunksize=4):
+                for sink in sinks:
+                    if not sink.done(key, plan[key], ext):
+                        sink.write(key, plan[key], ext, data)
+                written += len(data)
+                progress.advance()
+    for sink in sinks:
+        sink.finish(plan, ext)
+
+    elapsed = time.perf_counter() - started
+    results = {
+        'users': users,
+        'invalid_rows': stats['invalid'],
+        'week_of': week_start(today).isoformat(),
+        'unique_keys': len(plan),
+        'rendered': len(pending),
+        'skipped': len(plan) - len(pending),
+        'workers': min(args.workers, len(pending)) if pending else 0,
+        'seconds': round(elapsed, 2),
+        'renders_per_s': round(len(pending) / elapsed, 1),
+        'users_per_s': round(users / elapsed, 1),
+        'rendered_bytes': written
+    }
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark: how long `import bot` takes and which modules it pulls in.
+
+Runs `python -X importtime -c "import bot"` in fresh interpreters, so nothing is
+cached between runs, and fails when startup goes over budget or a module that
+should be loaded lazily shows up:
+
+    python bench_startup.py
+    python bench_startup.py --budget-ms 500 --forbid matplotlib,aiohttp
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Модули, которые должны загружаться только при первом рендере или по требованию
+DEFAULT_FORBIDDEN = 'matplotlib,aiohttp,metrics_server'
+
+
+def run_importtime(module):
+    """Import a module in a fresh interpreter; return (wall seconds, {module: (self_us, cumulative_us)})"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    # Формат строки: "import time:  self [us] | cumulative | imported package"
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall, modules
+
+
+def top_level_cost(modules):
+    """Own import time summed per top-level package, in milliseconds"""
+    costs = {}
+    for name, (self_us, _) in modules.items():
+        package = name.split('.')[0]
+        costs[package] = costs.get(package, 0) + self_us / 1000
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bot cold start")
+    parser.add_argument('--module', default='bot', help="module to import")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument('--budget-ms', type=float, default=600.0, help="allowed median import time")
+    parser.add_argument('--forbid', default=DEFAULT_FORBIDDEN,
+                        help="comma-separated top-level modules that must not be imported")
+    parser.add_argument('--top', type=int, default=10, help="heaviest packages to report")
+    args = parser.parse_args()
+
+    walls, imports = [], []
+    for _ in range(args.runs):
+        wall, modules = run_importtime(args.module)
+        walls.append(wall)
+        imports.append(modules[args.module][1] / 1000)
+
+    costs = top_level_cost(modules)
+    forbidden = [m for m in args.forbid.split(',') if m]
+    found = sorted(m for m in forbidden if m in costs)
+    import_ms = statistics.median(imports)
+
+    results = {
+        'module': args.module,
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'import_ms': round(import_ms, 1),
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'budget_ms': args.budget_ms,
+        'modules_loaded': len(modules),
+        'heaviest': {name: round(ms, 1) for name, ms in sorted(costs.items(), key=lambda item: -item[1])[:args.top]},
+        'forbidden_imported': found
+    }
+    print(json.dumps(results, indent=2))
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"import {args.module} took {import_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if found:
+        failures.append(f"imported at startup: {', '.join(found)}")
+    if failures:
+        print("❌ " + "\n❌ ".join(failures), file=sys.stderr)
+        sys.exit(1)
+    print("✅ Startup within budget", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark for life calendar rendering and stats computation.
+
+Runs fully offline (no Telegram token needed) and prints JSON that can be
+saved and compared between releases:
+
+    python bench_visualization.py --output bench.json
+    python bench_visualization.py --compare bench.json --threshold 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+import numpy as np
+from life_visualizer import LifeVisualizer, RENDER_ENGINES, get_profile
+from image_encoding import ENCODING_PRESETS
+from calendar_math import life_stats_batch
+from render_pool import RenderPool
+
+# Набор дат рождения, чтобы каждый рендер получал свой ключ
+BIRTH_DATES = [date(1950, 1, 1) + timedelta(days=97 * i) for i in range(256)]
+GENDERS = ['default', 'male', 'female']
+
+
+def latency_stats(samples):
+    """p50/p95/p99/mean latency in milliseconds"""
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4)
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure(func, iterations):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_render(engine, iterations, tmp_dir):
+    """Latency and PNG size of create_life_grid for one engine"""
+    visualizer = LifeVisualizer(engine=engine)
+    profiles = [get_profile(g) for g in GENDERS]
+    output_path = os.path.join(tmp_dir, f"bench_{engine}.png")
+
+    # Первые рендеры строят шаблоны и прогревают matplotlib - меряем их отдельно
+    started = time.perf_counter()
+    visualizer.create_life_grid(BIRTH_DATES[0], output_path, profile=profiles[0])
+    first_render = time.perf_counter() - started
+    for profile in profiles[1:]:
+        visualizer.create_life_grid(BIRTH_DATES[0], output_path, profile=profile)
+
+    samples = measure(
+        lambda i: visualizer.create_life_grid(
+            BIRTH_DATES[i % len(BIRTH_DATES)], output_path, profile=profiles[i % len(profiles)]
+        ),
+        iterations
+    )
+    sizes = [len(visualizer.render_life_grid(d, profile=profiles[0])) for d in BIRTH_DATES[:5]]
+
+    result = latency_stats(samples)
+    result['first_render_ms'] = round(first_render * 1000, 2)
+    result['png_bytes_mean'] = int(np.mean(sizes))
+    return result
+
+
+def bench_encoding(preset, iterations):
+    """Encode time and output size of one preset on the template engine"""
+    visualizer = LifeVisualizer(engine='template', preset=preset)
+    visualizer.warm_up()
+    key = visualizer.get_render_key(BIRTH_DATES[0])
+    visualizer.render_grid(key)  # палитра пресета подбирается при первом кодировании
+
+    samples = []
+    for i in range(iterations):
+        timings = {}
+        image_bytes = visualizer.render_grid(key._replace(weeks_lived=key.weeks_lived + i), timings)
+        samples.append(timings['encode'])
+
+    result = latency_stats(samples)
+    result['bytes'] = len(image_bytes)
+    return result
+
+
+def bench_stats(iterations):
+    """Latency of the text-command computations"""
+    visualizer = LifeVisualizer()
+    profile = get_profile('male')
+    today = date.today()
+    calls = {
+        'get_week_info': lambda i: visualizer.get_week_info(BIRTH_DATES[i % len(BIRTH_DATES)], profile),
+        'calculate_age': lambda i: visualizer.calculate_age(BIRTH_DATES[i % len(BIRTH_DATES)]),
+        'get_life_percentage': lambda i: visualizer.get_life_percentage(BIRTH_DATES[i % len(BIRTH_DATES)], profile),
+        # Вся выборка дат за один вызов, как в еженедельной рассылке
+        f'life_stats_batch_{len(BIRTH_DATES)}': lambda i: life_stats_batch(BIRTH_DATES, profile.life_expectancy_years, today)
+    }
+    return {name: latency_stats(measure(call, iterations)) for name, call in calls.items()}
+
+
+async def bench_throughput(engine, concurrency, renders):
+    """Renders per second through the process pool with `concurrency` workers"""
+    pool = RenderPool(workers=concurrency, queue_limit=renders)
+    visualizer = LifeVisualizer(engine=engine)
+    keys = [visualizer.get_render_key(BIRTH_DATES[i % len(BIRTH_DATES)]) for i in range(renders)]
+    try:
+        await pool.warm_up()
+        started = time.perf_counter()
+        await asyncio.gather(*(pool.render_grid(key) for key in keys))
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+    return {
+        'workers': concurrency,
+        'renders': renders,
+        'seconds': round(elapsed, 3),
+        'renders_per_sec': round(renders / elapsed, 2)
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return a list of metrics that got slower than baseline by more than threshold %"""
+    regressions = []
+
+    def check(path, current, previous):
+        if previous and current > previous * (1 + threshold / 100):
+            regressions.append(f"{path}: {previous} -> {current}")
+
+    for engine, stats in results['render'].items():
+        old = baseline.get('render', {}).get(engine, {})
+        check(f"render.{engine}.p95_ms", stats['p95_ms'], old.get('p95_ms'))
+        check(f"render.{engine}.png_bytes_mean", stats['png_bytes_mean'], old.get('png_bytes_mean'))
+    for preset, stats in results.get('encoding', {}).items():
+        old = baseline.get('encoding', {}).get(preset, {})
+        check(f"encoding.{preset}.p95_ms", stats['p95_ms'], old.get('p95_ms'))
+        check(f"encoding.{preset}.bytes", stats['bytes'], old.get('bytes'))
+    for name, stats in results['stats'].items():
+        old = baseline.get('stats', {}).get(name, {})
+        check(f"stats.{name}.p95_ms", stats['p95_ms'], old.get('p95_ms'))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark life calendar rendering")
+    parser.add_argument('--engines', default=','.join(RENDER_ENGINES),
+                        help="comma-separated render engines to benchmark")
+    parser.add_argument('--iterations', type=int, default=20, help="renders per engine")
+    parser.add_argument('--presets', default=','.join(ENCODING_PRESETS),
+                        help="comma-separated output presets to benchmark")
+    parser.add_argument('--stats-iterations', type=int, default=10000, help="calls per stats function")
+    parser.add_argument('--concurrency', default='1,2,4', help="comma-separated pool sizes for throughput")
+    parser.add_argument('--throughput-renders', type=int, default=24, help="renders per throughput run")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=20.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    engines = [e for e in args.engines.split(',') if e]
+    concurrency_levels = [int(c) for c in args.concurrency.split(',') if c]
+
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'render': {},
+        'encoding': {},
+        'stats': bench_stats(args.stats_iterations),
+        'throughput': {}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for engine in engines:
+            print(f"🎨 Rendering with {engine}...", file=sys.stderr)
+            results['render'][engine] = bench_render(engine, args.iterations, tmp_dir)
+    for preset in (p for p in args.presets.split(',') if p):
+        print(f"🗜️ Encoding with {preset}...", file=sys.stderr)
+        results['encoding'][preset] = bench_encoding(preset, args.iterations)
+
+    for engine in engines:
+        results['throughput'][engine] = [
+            asyncio.run(bench_throughput(engine, level, args.throughput_renders))
+            for level in concurrency_levels
+        ]
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    results['peak_rss_worker_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("❌ Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+        print("✅ No regressions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
 import logging
-import os
 import asyncio
 from datetime import datetime, date
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
-from life_visualizer import LifeVisualizer
-from scheduler import WeeklyReportScheduler
-from config import BOT_TOKEN
+from telegram import (Update, ChatMember, InlineQueryResultArticle, InlineQueryResultCachedPhoto, InlineQueryResultsButton,
+                      InputTextMessageContent)
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import Application, CommandHandler, ContextTypes, InlineQueryHandler, MessageHandler, filters
+from life_visualizer import LifeVisualizer, get_profile
+import calendar_math
+from render_pool import RenderPool, RenderPoolBusy
+from render_cache import RenderCache, render_key_digest
+from response_memo import ResponseMemo
+from inline_query import parse_inline_query, inline_cache_time
+from file_id_index import FileIdIndex
+from storage import UserStore
+from leader import SQLiteLease
+from broadcast import WeeklyBroadcast
+from channels import ChannelRegistry, REPORT_TYPES, local_now
+from update_processor import UserOrderedUpdateProcessor
+from metrics import (HANDLER_ERRORS, RENDER_CACHE_HIT_RATIO, RENDER_POOL_PENDING, RENDER_POOL_SATURATED,
+                     track_handler)
+from telegram_request import InstrumentedRequest
+from config import (BOT_TOKEN, BROADCAST_ENABLED, BOT_MODE, TELEGRAM_API_URL, TELEGRAM_FILE_URL,
+                    METRICS_ENABLED, CHANNEL_DEFAULT_TIMEZONE, CHANNEL_DEFAULT_SCHEDULE, CHANNEL_DEFAULT_REPORT,
+                    OUTPUT_PRESET, INLINE_UPLOAD_CHAT_ID, INLINE_CACHE_MAX_QUERIES, BOT_ADMIN_IDS)
 
 # Настройка логирования
 logging.basicConfig(
@@ -15,16 +31,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Словарь для хранения дат рождения пользователей (в реальном проекте лучше использовать базу данных)
-user_birth_dates = {}
-# Словарь для хранения пола пользователей
-user_genders = {}
-
 class LifeBot:
     def __init__(self):
         self.visualizer = LifeVisualizer()
+        self.render_pool = RenderPool()
+        self.render_cache = RenderCache()
+        self.responses = ResponseMemo()
+        # Готовые ответы инлайн-режима: ключ - (дата рождения, пол) вместо user_id
+        self.inline_answers = ResponseMemo(max_users=INLINE_CACHE_MAX_QUERIES)
+        self._inline_in_flight = {}
+        self.file_ids = FileIdIndex()
+        self.users = UserStore()
+        self.broadcast = WeeklyBroadcast(self.users, self.render_cache, self.render_pool, self.file_ids)
+        # Планировщик работает только в процессе, держащем аренду, - отчеты не уйдут дважды
+        self.lease = SQLiteLease()
+        self._lease_task = None
+        self._flush_task = None
+        self._warm_up_task = None
+        self.application = None
+        self.metrics_server = None
         self.scheduler = None
-        self.channel_id = None  # Will be set via command
+        self.channels = ChannelRegistry()
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -41,9 +68,12 @@ class LifeBot:
 /show - показать ваш календарь жизни
 /week - показать информацию о текущей неделе
 /percentage - показать процент прожитой жизни
+@бот <дата> [пол] - календарь в любом чате (инлайн-режим)
 
 🕐 **Автоматические отчеты:**
-/setchannel <ID> - установить канал для еженедельных отчетов
+/setchannel <ID> [пояс] [тип] [cron] - добавить канал для отчетов
+/removechannel <ID> - убрать канал
+/channels - список каналов
 /schedulestatus - показать статус планировщика
 /help - показать справку
 
@@ -68,22 +98,22 @@ class LifeBot:
         try:
             birth_date_str = context.args[0]
             birth_date = datetime.strptime(birth_date_str, "%d.%m.%Y").date()
+            today = date.today()
             
             # Проверяем, что дата не в будущем
-            if birth_date > date.today():
+            if birth_date > today:
                 await update.message.reply_text("❌ Дата рождения не может быть в будущем!")
                 return
             
             # Проверяем разумность даты (не старше 120 лет)
-            if (date.today() - birth_date).days > 120 * 365:
+            if calendar_math.exact_age(birth_date, today).years >= 120:
                 await update.message.reply_text("❌ Пожалуйста, проверьте дату рождения!")
                 return
             
-            user_birth_dates[user_id] = birth_date
+            self.users.set_birth_date(user_id, birth_date)
+            self.responses.invalidate(user_id)
             
-            # Создаем новый визуализатор с учетом пола пользователя
-            gender = user_genders.get(user_id, 'default')
-            self.visualizer.set_gender(gender)
+            gender = self.users.get_gender(user_id)
             
             await update.message.reply_text(
                 f"✅ Дата рождения установлена: {birth_date.strftime('%d.%m.%Y')}\n"
@@ -121,14 +151,12 @@ class LifeBot:
             )
             return
         
-        user_genders[user_id] = gender
-        
-        # Обновляем визуализатор
-        self.visualizer.set_gender(gender)
+        self.users.set_gender(user_id, gender)
+        self.responses.invalidate(user_id)
         
         await update.message.reply_text(
             f"✅ Пол установлен: {self._get_gender_display(gender)}\n"
-            f"Ожидаемая продолжительность жизни: {self.visualizer.life_expectancy_years} лет\n"
+            f"Ожидаемая продолжительность жизни: {get_profile(gender).life_expectancy_years} лет\n"
             f"Используйте /show для обновленного календаря!"
         )
     
@@ -145,27 +173,78 @@ class LifeBot:
         """Показать календарь жизни"""
         user_id = update.effective_user.id
         
-        if user_id not in user_birth_dates:
+        user = self.users.get(user_id)
+        if not user or not user.birth_date:
             await update.message.reply_text(
                 "❌ Сначала установите дату рождения!\n"
                 "Используйте: /setbirth DD.MM.YYYY"
             )
             return
         
-        birth_date = user_birth_dates[user_id]
-        gender = user_genders.get(user_id, 'default')
-        self.visualizer.set_gender(gender)
+        birth_date = user.birth_date
+        gender = user.gender
+        profile = get_profile(gender)
+        
+        # Одна дата на весь ответ: картинка и подпись не разойдутся в полночь
+        today = date.today()
         
-        # Создаем изображение
         try:
-            image_path = self.visualizer.create_life_grid(birth_date)
-            
-            # Получаем информацию для подписи
-            week_info = self.visualizer.get_week_info(birth_date)
-            percentage_info = self.visualizer.get_life_percentage(birth_date)
+            render_key = self.visualizer.get_render_key(birth_date, profile=profile, today=today)
             
             # Создаем красивую подпись
-            caption = f"""🎯 **Your Life Calendar**
+            caption = self._format_caption(birth_date, gender, self._user_stats(user, today))
+            
+            # Такое изображение уже загружалось - отправляем по file_id без повторной загрузки
+            file_id = self.file_ids.get(render_key)
+            if file_id:
+                try:
+                    await update.message.reply_photo(
+                        photo=file_id,
+                        caption=caption,
+                        parse_mode='Markdown'
+                    )
+                    return
+                except BadRequest as e:
+                    logger.warning(f"file_id больше не принимается, загружаем заново: {e}")
+                    self.file_ids.discard(render_key)
+            
+            # Берем изображение из кэша или рисуем в пуле процессов, чтобы не блокировать event loop
+            png_bytes = await self.render_cache.get_or_render(render_key, self.render_pool.render_grid)
+            
+            # Отправляем изображение прямо из памяти и запоминаем его file_id
+            message = await update.message.reply_photo(
+                photo=png_bytes,
+                caption=caption,
+                parse_mode='Markdown'
+            )
+            if message.photo:
+                self.file_ids.put(render_key, message.photo[-1].file_id)
+            
+        except RenderPoolBusy:
+            await update.message.reply_text(
+                "⏳ Сейчас слишком много запросов на построение календаря.\n"
+                "Пожалуйста, попробуйте /show через минуту."
+            )
+        except Exception as e:
+            HANDLER_ERRORS.labels('show_calendar').inc()
+            logger.error(f"Ошибка при создании изображения: {e}")
+            await update.message.reply_text("❌ Произошла ошибка при создании изображения")
+    
+    def _format_caption(self, birth_date, gender, stats, personal=True):
+        """Подпись к календарю: для /show и для инлайн-режима.
+        
+        personal=False - календарь по чужой дате из инлайн-запроса: без "Your" и "you've"
+        """
+        week_info, percentage_info = stats['week'], stats['percentage']
+        if personal:
+            title = "Your Life Calendar"
+            legend = ("🔴 Red squares = Weeks you've lived\n⚪ White squares = Weeks ahead of you\n\n"
+                      "💡 Each square represents 1 week of your life")
+        else:
+            title = "Life Calendar"
+            legend = ("🔴 Red squares = Weeks lived\n⚪ White squares = Weeks ahead\n\n"
+                      "💡 Each square represents 1 week of life")
+        return f"""🎯 **{title}**
 
 📅 **Birth Date:** {birth_date.strftime('%B %d, %Y')}
 👤 **Gender:** {self._get_gender_display(gender)}
@@ -177,43 +256,45 @@ class LifeBot:
 • Weeks Remaining: {week_info['weeks_remaining']:,}
 • Life Progress: {percentage_info['percentage']:.1f}%
 
-🔴 Red squares = Weeks you've lived
-⚪ White squares = Weeks ahead of you
-
-💡 Each square represents 1 week of your life"""
-            
-            # Отправляем изображение
-            with open(image_path, 'rb') as photo:
-                await update.message.reply_photo(
-                    photo=photo,
-                    caption=caption,
-                    parse_mode='Markdown'
-                )
-            
-            # Удаляем временный файл
-            os.remove(image_path)
-            
-        except Exception as e:
-            logger.error(f"Ошибка при создании изображения: {e}")
-            await update.message.reply_text("❌ Произошла ошибка при создании изображения")
+{legend}"""
     
     async def week_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать информацию о текущей неделе"""
         user_id = update.effective_user.id
         
-        if user_id not in user_birth_dates:
+        user = self.users.get(user_id)
+        if not user or not user.birth_date:
             await update.message.reply_text(
                 "❌ Сначала установите дату рождения!\n"
                 "Используйте: /setbirth DD.MM.YYYY"
             )
             return
         
-        birth_date = user_birth_dates[user_id]
-        gender = user_genders.get(user_id, 'default')
-        self.visualizer.set_gender(gender)
-        week_info = self.visualizer.get_week_info(birth_date)
+        today = date.today()
+        message = self.responses.get_or_build(user_id, 'week', today, lambda: self._format_week_info(user, today))
+        await update.message.reply_text(message)
+    
+    def _life_stats(self, birth_date, gender, today):
+        """Статистика жизни на день: по неделям, точный возраст и процент"""
+        profile = get_profile(gender)
+        return {
+            'week': self.visualizer.get_week_info(birth_date, profile, today),
+            'age': self.visualizer.calculate_age(birth_date, today),
+            'percentage': self.visualizer.get_life_percentage(birth_date, profile, today)
+        }
+    
+    def _user_stats(self, user, today):
+        """Статистика пользователя на день: считается один раз и до полуночи берется из памяти"""
+        return self.responses.get_or_build(
+            user.user_id, 'stats', today, lambda: self._life_stats(user.birth_date, user.gender, today))
+    
+    def _format_week_info(self, user, today):
+        """Текст ответа /week"""
+        birth_date = user.birth_date
+        gender = user.gender
+        week_info = self._user_stats(user, today)['week']
         
-        message = f"""
+        return f"""
 📊 Информация о вашей жизни:
 
 🎂 Дата рождения: {birth_date.strftime('%d.%m.%Y')}
@@ -226,28 +307,33 @@ class LifeBot:
 
 💡 Используйте /show для просмотра визуального календаря!
         """
-        
-        await update.message.reply_text(message)
     
     async def show_age(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать точный возраст"""
         user_id = update.effective_user.id
         
-        if user_id not in user_birth_dates:
+        user = self.users.get(user_id)
+        if not user or not user.birth_date:
             await update.message.reply_text(
                 "❌ Сначала установите дату рождения!\n"
                 "Используйте: /setbirth DD.MM.YYYY"
             )
             return
         
-        birth_date = user_birth_dates[user_id]
-        age_info = self.visualizer.calculate_age(birth_date)
+        today = date.today()
+        message = self.responses.get_or_build(user_id, 'age', today, lambda: self._format_age(user, today))
+        await update.message.reply_text(message)
+    
+    def _format_age(self, user, today):
+        """Текст ответа /age"""
+        birth_date = user.birth_date
+        age_info = self._user_stats(user, today)['age']
         
-        message = f"""
+        return f"""
 🎂 Ваш точный возраст:
 
 📅 Дата рождения: {birth_date.strftime('%d.%m.%Y')}
-⏰ Текущая дата: {date.today().strftime('%d.%m.%Y')}
+⏰ Текущая дата: {today.strftime('%d.%m.%Y')}
 
 📊 Возраст:
    • {age_info['years']} лет
@@ -260,34 +346,40 @@ class LifeBot:
 
 💡 Используйте /percentage для просмотра процента прожитой жизни!
         """
-        
-        await update.message.reply_text(message)
     
     async def show_percentage(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать процент прожитой жизни"""
         user_id = update.effective_user.id
         
-        if user_id not in user_birth_dates:
+        user = self.users.get(user_id)
+        if not user or not user.birth_date:
             await update.message.reply_text(
                 "❌ Сначала установите дату рождения!\n"
                 "Используйте: /setbirth DD.MM.YYYY"
             )
             return
         
-        birth_date = user_birth_dates[user_id]
-        gender = user_genders.get(user_id, 'default')
-        self.visualizer.set_gender(gender)
-        percentage_info = self.visualizer.get_life_percentage(birth_date)
+        today = date.today()
+        message = self.responses.get_or_build(user_id, 'percentage', today,
+                                              lambda: self._format_percentage(user, today))
+        await update.message.reply_text(message)
+    
+    def _format_percentage(self, user, today):
+        """Текст ответа /percentage"""
+        birth_date = user.birth_date
+        gender = user.gender
+        profile = get_profile(gender)
+        percentage_info = self._user_stats(user, today)['percentage']
         
         # Создаем визуальную шкалу прогресса
         progress_bar = self._create_progress_bar(percentage_info['percentage'])
         
-        message = f"""
+        return f"""
 📊 Процент прожитой жизни:
 
 🎂 Дата рождения: {birth_date.strftime('%d.%m.%Y')}
 👤 Пол: {self._get_gender_display(gender)}
-📈 Ожидаемая продолжительность: {self.visualizer.life_expectancy_years} лет
+📈 Ожидаемая продолжительность: {profile.life_expectancy_years} лет
 
 {progress_bar}
 
@@ -299,8 +391,6 @@ class LifeBot:
 
 💡 Используйте /show для просмотра визуального календаря!
         """
-        
-        await update.message.reply_text(message)
     
     def _create_progress_bar(self, percentage):
         """Создает текстовую шкалу прогресса"""
@@ -312,6 +402,98 @@ class LifeBot:
         
         return f"Прогресс: [{filled}{empty}] {percentage}%"
     
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Инлайн-режим: @бот 15.03.1990 [male|female] - статистика и календарь в любом чате"""
+        query = update.inline_query
+        today = date.today()
+        
+        if query.query.strip():
+            parsed = parse_inline_query(query.query, today)
+            is_personal = False
+        else:
+            # Пустой запрос - собственный календарь, если дата рождения уже установлена
+            user = self.users.get(query.from_user.id)
+            parsed = (user.birth_date, user.gender) if user and user.birth_date else None
+            is_personal = True
+        
+        if parsed is None:
+            # Подсказка для незаконченного запроса; личную не кэшируем - дату могут сейчас установить
+            await query.answer(
+                [], cache_time=0 if is_personal else inline_cache_time(), is_personal=is_personal,
+                button=InlineQueryResultsButton("Введите дату рождения: DD.MM.YYYY", start_parameter='inline')
+            )
+            return
+        
+        # Личный и явный запрос с одной датой различаются подписью - кэшируются отдельно
+        results = await self._inline_results(context.bot, (*parsed, is_personal), today)
+        # Ответ зависит только от запроса и даты: Telegram отдает его повторным запросам сам.
+        # Ответ без фото, которое не удалось загрузить, не кэшируем - в следующий раз фото будет
+        complete = self._inline_complete(results)
+        await query.answer(results, cache_time=inline_cache_time() if complete else 0, is_personal=is_personal)
+    
+    @staticmethod
+    def _inline_complete(results):
+        return isinstance(results[0], InlineQueryResultCachedPhoto) or not INLINE_UPLOAD_CHAT_ID
+    
+    async def _inline_results(self, bot, query_key, today):
+        """Готовые результаты для (дата рождения, пол, личный ли запрос): строятся один раз в день на запрос"""
+        results = self.inline_answers.get(query_key, 'inline', today)
+        if results is not None:
+            return results
+        # Одинаковые запросы, пришедшие одновременно, ждут одну сборку
+        task = self._inline_in_flight.get(query_key)
+        if task is None:
+            task = self._inline_in_flight[query_key] = asyncio.ensure_future(
+                self._build_inline_results(bot, query_key, today))
+            task.add_done_callback(lambda _: self._inline_in_flight.pop(query_key, None))
+        return await asyncio.shield(task)
+    
+    async def _build_inline_results(self, bot, query_key, today):
+        birth_date, gender, is_personal = query_key
+        stats = self._life_stats(birth_date, gender, today)
+        caption = self._format_caption(birth_date, gender, stats, personal=is_personal)
+        render_key = self.visualizer.get_render_key(birth_date, profile=get_profile(gender), today=today)
+        result_id = render_key_digest(render_key)[:32]
+        week_info = stats['week']
+        
+        results = [InlineQueryResultArticle(
+            id=f"stats-{result_id}",
+            title=f"📅 {birth_date.strftime('%d.%m.%Y')}: {stats['percentage']['percentage']:.1f}% of life lived",
+            description=f"Age {week_info['age_years']} years, {week_info['week_in_year']} weeks · "
+                        f"{week_info['weeks_remaining']:,} weeks remaining",
+            input_message_content=InputTextMessageContent(caption, parse_mode='Markdown')
+        )]
+        file_id = await self._inline_photo(bot, render_key)
+        if file_id:
+            results.insert(0, InlineQueryResultCachedPhoto(
+                id=f"calendar-{result_id}", photo_file_id=file_id, caption=caption, parse_mode='Markdown'
+            ))
+        if self._inline_complete(results):
+            self.inline_answers.put(query_key, 'inline', today, results)
+        return results
+    
+    async def _inline_photo(self, bot, render_key):
+        """file_id календаря; еще не загруженный календарь один раз отправляется в INLINE_UPLOAD_CHAT_ID"""
+        file_id = self.file_ids.get(render_key)
+        if file_id or not INLINE_UPLOAD_CHAT_ID:
+            return file_id
+        try:
+            png_bytes = await self.render_cache.get_or_render(render_key, self.render_pool.render_grid)
+            message = await bot.send_photo(INLINE_UPLOAD_CHAT_ID, photo=png_bytes, disable_notification=True)
+            file_id = message.photo[-1].file_id
+        except RenderPoolBusy:
+            return None
+        except TelegramError as e:
+            logger.warning(f"Не удалось загрузить календарь для инлайн-ответа: {e}")
+            return None
+        except Exception as e:
+            # Как и в /show: ошибка рендера не должна оставить запрос без ответа - отвечаем статистикой
+            HANDLER_ERRORS.labels('inline_query').inc()
+            logger.error(f"Ошибка при создании изображения для инлайн-ответа: {e}")
+            return None
+        self.file_ids.put(render_key, file_id)
+        return file_id
+    
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать справку"""
         help_text = """
@@ -328,9 +510,12 @@ class LifeBot:
 /show - показать календарь жизни
 /week - показать статистику по неделям
 /percentage - показать процент прожитой жизни
+@бот <дата> [пол] - календарь в любом чате (инлайн-режим)
 
 🕐 **Автоматические отчеты:**
-/setchannel <ID> - установить канал для еженедельных отчетов
+/setchannel <ID> [пояс] [тип] [cron] - добавить канал для отчетов
+/removechannel <ID> - убрать канал
+/channels - список каналов
 /schedulestatus - показать статус планировщика
 /help - показать эту справку
 
@@ -363,14 +548,15 @@ class LifeBot:
         )
     
     async def set_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Установка канала для еженедельных отчетов"""
-        user_id = update.effective_user.id
-        
+        """Добавление канала или изменение его расписания"""
         if not context.args:
             await update.message.reply_text(
                 "❌ Пожалуйста, укажите ID канала!\n"
-                "Формат: /setchannel <ID_канала>\n"
-                "Пример: /setchannel -1001234567890\n\n"
+                "Формат: /setchannel <ID_канала> [часовой_пояс] [тип_отчета] [расписание_cron]\n"
+                "Пример: /setchannel -1001234567890\n"
+                "Пример: /setchannel -1001234567890 Europe/Moscow year 0 9 * * mon\n\n"
+                f"По умолчанию: {CHANNEL_DEFAULT_TIMEZONE}, {CHANNEL_DEFAULT_REPORT}, «{CHANNEL_DEFAULT_SCHEDULE}»\n"
+                f"Типы отчетов: {', '.join(REPORT_TYPES)}\n\n"
                 "💡 Как получить ID канала:\n"
                 "1. Добавьте @userinfobot в ваш канал\n"
                 "2. Скопируйте ID (начинается с -100)"
@@ -389,34 +575,101 @@ class LifeBot:
                 )
                 return
             
-            # Сохраняем ID канала
-            self.channel_id = channel_id
-            
-            # Инициализируем планировщик если еще не создан
-            if not self.scheduler:
-                self.scheduler = WeeklyReportScheduler(BOT_TOKEN, channel_id)
-                self.scheduler.start_scheduler()
-                await update.message.reply_text(
-                    f"✅ Канал установлен: {channel_id}\n"
-                    f"🕐 Планировщик запущен!\n"
-                    f"📅 Отчеты будут отправляться каждый понедельник в 00:00 по португальскому времени\n"
-                    f"🌍 Время: Europe/Lisbon (Португалия)"
-                )
-            else:
-                # Обновляем существующий планировщик
-                self.scheduler.channel_id = channel_id
+            timezone = context.args[1] if len(context.args) > 1 else CHANNEL_DEFAULT_TIMEZONE
+            report = context.args[2] if len(context.args) > 2 else CHANNEL_DEFAULT_REPORT
+            schedule = ' '.join(context.args[3:]) or CHANNEL_DEFAULT_SCHEDULE
+            if not await self._can_manage_channel(update, context, channel_id):
                 await update.message.reply_text(
-                    f"✅ Канал обновлен: {channel_id}\n"
-                    f"🕐 Планировщик продолжает работать\n"
-                    f"📅 Следующий отчет: каждый понедельник в 00:00 (Португалия)"
+                    "❌ Настраивать отчеты может только администратор канала\n"
+                    "💡 Добавьте бота в канал администратором и повторите команду"
                 )
+                return
+            try:
+                # Канал хранится в общей базе: его увидит процесс-лидер, даже если это не мы
+                channel = self.channels.add(channel_id, timezone, schedule, report, owner_id=update.effective_user.id)
+            except ValueError as e:
+                await update.message.reply_text(f"❌ Неверные настройки канала: {e}")
+                return
+            
+            if self.scheduler and self.scheduler.dispatcher:
+                self.scheduler.dispatcher.schedule(channel)
+            
+            await update.message.reply_text(
+                f"✅ Канал установлен: {channel.chat_id}\n"
+                f"📋 Отчет: {channel.report}\n"
+                f"📅 Расписание: {channel.schedule}\n"
+                f"🌍 Часовой пояс: {channel.timezone}\n"
+                f"⏰ Следующий отчет: {self._format_channel_time(channel)}"
+            )
                 
         except Exception as e:
             logger.error(f"Ошибка при установке канала: {e}")
             await update.message.reply_text("❌ Произошла ошибка при установке канала")
     
+    async def remove_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Удаление канала из рассылки отчетов"""
+        if not context.args:
+            await update.message.reply_text("❌ Укажите ID канала: /removechannel -1001234567890")
+            return
+        
+        channel = self.channels.get(context.args[0])
+        # Чужой канал выглядит так же, как несуществующий: список каналов не угадать перебором
+        if channel is None or (channel.owner_id != update.effective_user.id
+                               and not await self._can_manage_channel(update, context, channel.chat_id)):
+            await update.message.reply_text(f"❌ Канал {context.args[0]} не найден")
+            return
+        
+        self.channels.remove(channel.chat_id)
+        await update.message.reply_text(f"✅ Канал {channel.chat_id} больше не получает отчеты")
+    
+    async def list_channels(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Список каналов пользователя в порядке ближайших отчетов (администратору бота - всех)"""
+        owner_id = None if update.effective_user.id in BOT_ADMIN_IDS else update.effective_user.id
+        total = self.channels.count(owner_id)
+        if not total:
+            await update.message.reply_text(
+                "📭 Каналы не добавлены\n"
+                "💡 Используйте /setchannel для настройки автоматических отчетов"
+            )
+            return
+        
+        lines = [f"📡 Каналов: {total}\n"]
+        for channel in self.channels.channels(limit=20, owner_id=owner_id):
+            lines.append(f"• {channel.chat_id}: {channel.report}, «{channel.schedule}» {channel.timezone}\n"
+                         f"  следующий: {self._format_channel_time(channel)}")
+        if total > 20:
+            lines.append(f"… и еще {total - 20}")
+        await update.message.reply_text("\n".join(lines))
+    
+    async def _can_manage_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id):
+        """Администратор бота из BOT_ADMIN_IDS или администратор самого канала"""
+        user_id = update.effective_user.id
+        if user_id in BOT_ADMIN_IDS:
+            return True
+        try:
+            member = await context.bot.get_chat_member(chat_id, user_id)
+        except TelegramError as e:
+            # Бот не состоит в канале или канала нет - отчеты туда все равно не отправить
+            logger.info(f"Не удалось проверить права {user_id} в канале {chat_id}: {e}")
+            return False
+        return member.status in (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+    
+    @staticmethod
+    def _format_channel_time(channel):
+        if channel.next_run is None:
+            return "Не определено"
+        return local_now(channel.timezone, channel.next_run).strftime('%d.%m.%Y %H:%M')
+    
     async def scheduler_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать статус планировщика"""
+        if not self.scheduler and not self.lease.held and self.lease.holder():
+            await update.message.reply_text(
+                "🕐 **Статус планировщика:**\n\n"
+                f"✅ Планировщик работает в ведущем процессе: {self.lease.holder()}\n"
+                f"• Каналов: {len(self.channels)}"
+            )
+            return
+        
         if not self.scheduler:
             await update.message.reply_text(
                 "🕐 **Статус планировщика:**\n\n"
@@ -434,6 +687,8 @@ class LifeBot:
             
             next_run = status['next_run']
             next_run_str = next_run.strftime('%A, %d %B %Y at %H:%M') if next_run else "Не определено"
+            next_report = status['next_channel_report']
+            next_report_str = next_report.strftime('%A, %d %B %Y at %H:%M') if next_report else "Не определено"
             
             message = f"""🕐 **Статус планировщика:**
 
@@ -443,47 +698,167 @@ class LifeBot:
 📊 **Задач:** {status['job_count']}
 ⏰ **Следующий запуск:** {next_run_str}
 
-💡 **Автоматические отчеты:**
-• Отправляются каждый понедельник в 00:00
-• Время: Португалия (Europe/Lisbon)
-• Канал: {self.channel_id or 'Не установлен'}"""
+💡 **Отчеты в каналы:**
+• Каналов: {status['channels']}
+• Ближайший отчет: {next_report_str} (Португалия)
+• Список каналов: /channels"""
             
             await update.message.reply_text(message)
             
         except Exception as e:
             logger.error(f"Ошибка при получении статуса планировщика: {e}")
             await update.message.reply_text("❌ Произошла ошибка при получении статуса")
+    
+    def _start_scheduler(self):
+        """Создает и запускает планировщик еженедельных отчетов и отчетов в каналы"""
+        # APScheduler и pytz нужны только ведущему процессу - не грузим их при старте
+        from scheduler import WeeklyReportScheduler
+        
+        broadcast = self.broadcast if BROADCAST_ENABLED else None
+        self.scheduler = WeeklyReportScheduler(self.application.bot, broadcast, channels=self.channels,
+                                               file_ids=self.file_ids)
+        self.scheduler.start_scheduler()
+    
+    def readiness(self):
+        """Проверки готовности для /health/ready"""
+        # Заполненный пул рендеринга - это нагрузка, а не неготовность: он виден в метриках RENDER_POOL_*
+        checks = {
+            'application': bool(self.application and self.application.running)
+        }
+        if self.lease.held:
+            checks['scheduler'] = bool(self.scheduler and self.scheduler.scheduler.running)
+        return checks
+    
+    async def _warm_up_render_pool(self):
+        """Запускает процессы рендеринга заранее; ошибка прогрева не мешает работе бота"""
+        try:
+            await self.render_pool.warm_up()
+            logger.info("🔥 Render pool is warm")
+        except Exception as e:
+            logger.error(f"❌ Render pool warm-up failed: {e}")
+    
+    async def post_init(self, application):
+        """Запуск процессов рендеринга, фоновой записи пользователей и рассылки"""
+        self.application = application
+        if METRICS_ENABLED:
+            from metrics_server import MetricsServer  # aiohttp импортируется только когда нужен
+            
+            RENDER_CACHE_HIT_RATIO.set_function(lambda: self.render_cache.hit_ratio)
+            RENDER_POOL_PENDING.set_function(lambda: self.render_pool.pending)
+            RENDER_POOL_SATURATED.set_function(lambda: int(self.render_pool.saturated))
+            self.metrics_server = MetricsServer(self.readiness)
+            await self.metrics_server.start()
+        
+        self._flush_task = asyncio.create_task(self.users.run_flusher())
+        # Процессы рендеринга прогреваются в фоне: бот начинает отвечать на команды сразу
+        self._warm_up_task = asyncio.create_task(self._warm_up_render_pool())
+        
+        # Канал из /setchannel до появления списка каналов переносим в него один раз
+        legacy_channel = self.users.get_setting('channel_id')
+        if legacy_channel:
+            if not self.channels.get(legacy_channel):
+                self.channels.add(legacy_channel, 'Europe/Lisbon', '0 0 * * mon', 'weekly')
+            self.users.set_setting('channel_id', '')
+        self._lease_task = asyncio.create_task(self.lease.run(self._become_leader, self._step_down))
+    
+    async def _become_leader(self):
+        """Этот процесс получил аренду: запускаем планировщик.
+        
+        Пропущенный отчет и прерванную рассылку планировщик догоняет сам при старте.
+        """
+        # Каналы могут добавить в любом процессе, поэтому планировщик нужен лидеру всегда
+        self._start_scheduler()
+    
+    async def _step_down(self):
+        """Аренду забрал другой процесс - останавливаем свои задачи"""
+        if self.scheduler:
+            self.scheduler.stop_scheduler()
+            self.scheduler = None
+    
+    async def post_stop(self, application):
+        """Планировщик работает через бота Application - останавливаем его до закрытия соединений"""
+        if self._lease_task:
+            self._lease_task.cancel()
+        await self._step_down()
+    
+    async def post_shutdown(self, application):
+        """Остановка фоновых ресурсов"""
+        if self._lease_task:
+            self._lease_task.cancel()
+        if self._warm_up_task:
+            self._warm_up_task.cancel()
+        if self._flush_task:
+            self._flush_task.cancel()
+        self.users.close()
+        self.file_ids.close()
+        self.channels.close()
+        self.render_pool.shutdown()
+        if self.scheduler:
+            self.scheduler.stop_scheduler()
+        # Отдаем аренду сразу, чтобы другой процесс не ждал ее истечения
+        self.lease.release()
+        self.lease.close()
+        if self.metrics_server:
+            await self.metrics_server.stop()
 
 def main():
     """Главная функция"""
     if not BOT_TOKEN:
         logger.error("Не установлен BOT_TOKEN в переменных окружения!")
         return
+    if OUTPUT_PRESET == 'svg':
+        logger.error("OUTPUT_PRESET=svg не подходит боту: Telegram не показывает SVG как фото")
+        return
     
     # Создаем бота
     bot = LifeBot()
     
     # Создаем приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_API_URL)
+        .base_file_url(TELEGRAM_FILE_URL)
+        .request(InstrumentedRequest())
+        # Длинному опросу getUpdates хватает одного соединения, пул остается командам и рассылке
+        .get_updates_request(InstrumentedRequest(connection_pool_size=1))
+        .post_init(bot.post_init)
+        .post_stop(bot.post_stop)
+        .post_shutdown(bot.post_shutdown)
+        # Обработчики разных пользователей работают параллельно, команды одного - по порядку
+        .concurrent_updates(UserOrderedUpdateProcessor())
+    )
+    if BOT_MODE == 'webhook':
+        # Обновления приходят через наш aiohttp-сервер, Updater не нужен
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Добавляем обработчики команд
-    application.add_handler(CommandHandler("start", bot.start))
-    application.add_handler(CommandHandler("setbirth", bot.set_birth))
-    application.add_handler(CommandHandler("setgender", bot.set_gender))
-    application.add_handler(CommandHandler("age", bot.show_age))
-    application.add_handler(CommandHandler("show", bot.show_calendar))
-    application.add_handler(CommandHandler("week", bot.week_info))
-    application.add_handler(CommandHandler("percentage", bot.show_percentage))
-    application.add_handler(CommandHandler("setchannel", bot.set_channel))
-    application.add_handler(CommandHandler("schedulestatus", bot.scheduler_status))
-    application.add_handler(CommandHandler("help", bot.help_command))
+    application.add_handler(CommandHandler("start", track_handler(bot.start)))
+    application.add_handler(CommandHandler("setbirth", track_handler(bot.set_birth)))
+    application.add_handler(CommandHandler("setgender", track_handler(bot.set_gender)))
+    application.add_handler(CommandHandler("age", track_handler(bot.show_age)))
+    application.add_handler(CommandHandler("show", track_handler(bot.show_calendar)))
+    application.add_handler(CommandHandler("week", track_handler(bot.week_info)))
+    application.add_handler(CommandHandler("percentage", track_handler(bot.show_percentage)))
+    application.add_handler(CommandHandler("setchannel", track_handler(bot.set_channel)))
+    application.add_handler(CommandHandler("removechannel", track_handler(bot.remove_channel)))
+    application.add_handler(CommandHandler("channels", track_handler(bot.list_channels)))
+    application.add_handler(CommandHandler("schedulestatus", track_handler(bot.scheduler_status)))
+    application.add_handler(CommandHandler("help", track_handler(bot.help_command)))
+    application.add_handler(InlineQueryHandler(track_handler(bot.inline_query)))
     
     # Обработчик обычных сообщений
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, track_handler(bot.handle_message)))
     
     # Запускаем бота
-    logger.info("Бот запущен!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        from webhook_server import run_webhook
+        logger.info("Бот запущен в режиме webhook!")
+        asyncio.run(run_webhook(application))
+    else:
+        logger.info("Бот запущен!")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
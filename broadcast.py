@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Weekly broadcast of personal life calendars to every registered user
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from life_visualizer import LifeVisualizer, RenderKey, get_profile
+from calendar_math import life_stats_batch, week_start
+from render_pool import RenderPoolBusy
+from config import (BROADCAST_GLOBAL_RATE, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_CONCURRENCY,
+                    BROADCAST_MAX_RETRIES, BROADCAST_CHECKPOINT_PATH, BROADCAST_CHECKPOINT_EVERY,
+                    BROADCAST_RENDER_SLOTS)
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def pause(self, seconds):
+        """Take every token for `seconds`: after a flood-wait no sender goes before it is over"""
+        async with self._lock:
+            # Отсчет пополнения - с момента паузы, а не с прошлой выдачи токена
+            self._tokens = -seconds * self.rate
+            self._updated = time.monotonic()
+
+
+class SendRateLimiter:
+    """Respects Telegram's global limit and the minimum interval between messages to one chat"""
+
+    def __init__(self, global_rate=BROADCAST_GLOBAL_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self._last_sent = {}  # chat_id -> monotonic time of the last message
+
+    async def acquire(self, chat_id):
+        last_sent = self._last_sent.get(chat_id)
+        if last_sent is not None:
+            wait = last_sent + self.per_chat_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self.global_bucket.acquire()
+        self._last_sent[chat_id] = time.monotonic()
+
+    async def pause(self, seconds):
+        """Drain the global bucket after a flood-wait so every sender backs off"""
+        await self.global_bucket.pause(seconds)
+
+
+class BroadcastCheckpoint:
+    """Progress of one broadcast, saved to disk so a restart can resume it.
+
+    Progress is saved every BROADCAST_CHECKPOINT_EVERY users, so delivery is at least once:
+    after a crash the users completed since the last save (and sends that were in flight)
+    get their calendar again.
+    """
+
+    def __init__(self, path=BROADCAST_CHECKPOINT_PATH):
+        self.path = path
+        self.broadcast_id = None
+        self.watermark = None  # все пользователи с id <= watermark уже обработаны
+        self.done_after = set()  # обработанные пользователи с id > watermark
+        self.sent = 0
+        self.failed = 0
+        self.finished = False
+
+    def load(self, broadcast_id):
+        """Load progress for broadcast_id; start fresh if the file belongs to another broadcast"""
+        self.broadcast_id = broadcast_id
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Failed to read broadcast checkpoint: {e}")
+            return
+
+        if data.get('broadcast_id') == broadcast_id:
+            self.watermark = data.get('watermark')
+            self.done_after = set(data.get('done_after', []))
+            self.sent = data.get('sent', 0)
+            self.failed = data.get('failed', 0)
+            self.finished = data.get('finished', False)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'broadcast_id': self.broadcast_id,
+                    'watermark': self.watermark,
+                    'done_after': sorted(self.done_after),
+                    'sent': self.sent,
+                    'failed': self.failed,
+                    'finished': self.finished
+                }, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"❌ Failed to save broadcast checkpoint: {e}")
+
+    def is_done(self, user_id):
+        return (self.watermark is not None and user_id <= self.watermark) or user_id in self.done_after
+
+    def advance(self, ordered_ids, position):
+        """Move the watermark over the completed prefix of ordered_ids starting at position"""
+        while position < len(ordered_ids) and ordered_ids[position] in self.done_after:
+            self.done_after.discard(ordered_ids[position])
+            self.watermark = ordered_ids[position]
+            position += 1
+        return position
+
+
+class WeeklyBroadcast:
+    def __init__(self, users, render_cache, render_pool, file_ids,
+                 concurrency=BROADCAST_CONCURRENCY, max_retries=BROADCAST_MAX_RETRIES,
+                 render_slots=BROADCAST_RENDER_SLOTS):
+        self.users = users
+        self.render_cache = render_cache
+        self.render_pool = render_pool
+        self.file_ids = file_ids
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.render_slots = render_slots
+        self._render_slots = None  # asyncio.Semaphore на время одного запуска
+        self.limiter = SendRateLimiter()
+        self.checkpoint = BroadcastCheckpoint()
+        self.visualizer = LifeVisualizer()
+        self._running = False
+
+    @staticmethod
+    def current_broadcast_id(today=None):
+        """Broadcasts are identified by ISO week, e.g. '2024-W12'"""
+        year, week, _ = (today or date.today()).isocalendar()
+        return f"{year}-W{week:02d}"
+
+    def _saved_checkpoint(self, today):
+        # Отдельный объект: проверка не должна затирать состояние идущей рассылки
+        checkpoint = BroadcastCheckpoint(self.checkpoint.path)
+        checkpoint.load(self.current_broadcast_id(today))
+        return checkpoint
+
+    def has_unfinished(self, today=None):
+        """True if this week's broadcast was started but did not finish"""
+        checkpoint = self._saved_checkpoint(today)
+        return (checkpoint.sent + checkpoint.failed) > 0 and not checkpoint.finished
+
+    def is_finished(self, today=None):
+        """True if this week's broadcast already went out to everyone"""
+        return self._saved_checkpoint(today).finished
+
+    @staticmethod
+    def _caption(weeks_lived, age_years, week_in_year, weeks_remaining, percentage):
+        return (
+            f"📅 **Your Weekly Life Calendar**\n\n"
+            f"• Week {weeks_lived + 1:,} of your life\n"
+            f"• Age: {age_years} years, {week_in_year} weeks\n"
+            f"• Weeks Remaining: {weeks_remaining:,}\n"
+            f"• Life Progress: {percentage:.1f}%"
+        )
+
+    def _prepare(self, users, today):
+        """Render keys and captions for all users, computed in one vectorized pass"""
+        if not users:
+            return {}
+        life_expectancy = [get_profile(u.gender).life_expectancy_years for u in users]
+        stats = life_stats_batch([u.birth_date for u in users], life_expectancy, today)
+        week_of = week_start(today)
+        columns = zip(stats['weeks_lived'].tolist(), stats['age_years'].tolist(), stats['week_in_year'].tolist(),
+                      stats['weeks_remaining'].tolist(), stats['percentage'].tolist(), life_expectancy)
+
+        prepared = {}
+        for user, (lived, age_years, week_in_year, remaining, percentage, expectancy) in zip(users, columns):
+            key = RenderKey(self.visualizer.engine, expectancy, lived, week_of, self.visualizer.preset)
+            prepared[user.user_id] = (key, self._caption(lived, age_years, week_in_year, remaining, percentage))
+        return prepared
+
+    async def _render(self, key):
+        """Render through the shared cache with at most render_slots of our renders in the pool.
+
+        The rest of the pool's capacity stays free for /show, so a broadcast never makes
+        interactive requests fail with RenderPoolBusy.
+        """
+        async with self._render_slots:
+            while True:
+                await self.render_pool.wait_for_capacity()
+                try:
+                    return await self.render_cache.get_or_render(key, self.render_pool.render_grid)
+                except RenderPoolBusy:
+                    # Емкость заняли между ожиданием и отправкой - ждем снова
+                    pass
+
+    async def _send_to_user(self, bot, user, key, caption):
+        """Deliver one calendar; returns True on success"""
+
+        for attempt in range(self.max_retries + 1):
+            file_id = self.file_ids.get(key)
+            photo = file_id or await self._render(key)
+            await self.limiter.acquire(user.user_id)
+            try:
+                message = await bot.send_photo(
+                    chat_id=user.user_id, photo=photo, caption=caption, parse_mode='Markdown'
+                )
+                if not file_id and message.photo:
+                    self.file_ids.put(key, message.photo[-1].file_id)
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"⏳ Flood control, waiting {retry_after}s")
+                await self.limiter.pause(retry_after)
+            except Forbidden:
+                # Пользователь заблокировал бота - повторять бессмысленно
+                return False
+            except BadRequest as e:
+                if file_id:
+                    self.file_ids.discard(key)
+                    continue
+                logger.error(f"❌ Failed to send calendar to {user.user_id}: {e}")
+                return False
+            except NetworkError as e:
+                logger.warning(f"⚠️ Network error sending to {user.user_id}: {e}")
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                logger.error(f"❌ Failed to send calendar to {user.user_id}: {e}")
+                return False
+        return False
+
+    async def run(self, bot, today=None):
+        """Send every user their calendar, resuming this week's checkpoint if present.
+
+        today selects the week; the scheduler passes the Monday of the report week, so a run
+        that starts late on Sunday night UTC still counts as the new week.
+        """
+        if self._running:
+            logger.warning("⚠️ Broadcast is already running")
+            return
+        self._running = True
+        try:
+            await self._run(bot, today or date.today())
+        finally:
+            self._running = False
+
+    async def _run(self, bot, today):
+        # Вся рассылка считается на одну дату, даже если закончится после полуночи
+        self.checkpoint.load(self.current_broadcast_id(today))
+        if self.checkpoint.finished:
+            logger.info(f"✅ Broadcast {self.checkpoint.broadcast_id} already finished")
+            return
+
+        self._render_slots = asyncio.Semaphore(self.render_slots)
+        users = sorted(self.users.all_users(), key=lambda u: u.user_id)
+        ordered_ids = [u.user_id for u in users]
+        pending = [u for u in users if not self.checkpoint.is_done(u.user_id)]
+        prepared = self._prepare(pending, today)
+        position = next((i for i, uid in enumerate(ordered_ids) if not self.checkpoint.is_done(uid)),
+                        len(ordered_ids))
+
+        eta = len(pending) / self.limiter.global_bucket.rate
+        logger.info(f"🚀 Broadcast {self.checkpoint.broadcast_id}: {len(pending)} of {len(users)} users "
+                    f"left, estimated {eta / 60:.1f} min")
+
+        queue = iter(pending)
+        completed_since_save = 0
+        started = time.monotonic()
+
+        async def worker():
+            nonlocal position, completed_since_save
+            for user in queue:
+                ok = await self._send_to_user(bot, user, *prepared[user.user_id])
+                if ok:
+                    self.checkpoint.sent += 1
+                else:
+                    self.checkpoint.failed += 1
+                self.checkpoint.done_after.add(user.user_id)
+                position = self.checkpoint.advance(ordered_ids, position)
+
+                completed_since_save += 1
+                if completed_since_save >= BROADCAST_CHECKPOINT_EVERY:
+                    completed_since_save = 0
+                    self.checkpoint.save()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            self.checkpoint.finished = True
+        finally:
+            self.checkpoint.save()
+
+        elapsed = time.monotonic() - started
+        logger.info(f"✅ Broadcast {self.checkpoint.broadcast_id} finished in {elapsed:.0f}s: "
+                    f"{self.checkpoint.sent} sent, {self.checkpoint.failed} failed")
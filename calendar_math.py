@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Exact calendar arithmetic for ages and life weeks, for one date or a whole array of birth dates.
+
+Every function takes `today` explicitly: the caller reads the clock once per request
+(or once per broadcast) and all numbers in a reply agree with each other.
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+from config import WEEKS_PER_YEAR
+
+# Точный возраст: полные годы и месяцы, оставшиеся дни и итоги в днях и неделях
+Age = namedtuple('Age', ['years', 'months', 'days', 'total_days', 'total_weeks'])
+
+
+def week_start(today):
+    """Monday of the week containing today"""
+    return today - timedelta(days=today.weekday())
+
+
+def weeks_lived(birth_date, today):
+    """Full weeks between birth_date and today, never negative"""
+    return max(0, (today - birth_date).days // 7)
+
+
+def add_months(day, months):
+    """Shift a date by whole months; the day is clamped to the end of a shorter month (Jan 31 + 1 = Feb 28)"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def exact_age(birth_date, today):
+    """Age in full years, months and days.
+
+    A month is counted once its clamped anniversary is reached, so someone born on Feb 29
+    turns a year older on Feb 28 in common years.
+    """
+    total_days = (today - birth_date).days
+    if total_days < 0:
+        return Age(0, 0, 0, 0, 0)
+
+    months = (today.year - birth_date.year) * 12 + today.month - birth_date.month
+    anniversary = add_months(birth_date, months)
+    if anniversary > today:
+        months -= 1
+        anniversary = add_months(birth_date, months)
+
+    years, months = divmod(months, 12)
+    return Age(years, months, (today - anniversary).days, total_days, total_days // 7)
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_datetime64(dates):
+    """Array of datetime.date as datetime64[D]; datetime64 arrays are returned unchanged"""
+    if isinstance(dates, np.ndarray) and dates.dtype.kind == 'M':
+        return dates.astype('datetime64[D]')
+    # Через порядковые номера дней в ~20 раз быстрее, чем разбор каждого date внутри NumPy
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+    return (ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+def _add_months_batch(births, months):
+    """Vectorized add_months for datetime64[D] births and integer month offsets"""
+    month_start = births.astype('datetime64[M]') + months
+    days_in_month = (month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')
+    day_of_month = births - births.astype('datetime64[M]').astype('datetime64[D]')
+    return month_start.astype('datetime64[D]') + np.minimum(day_of_month, days_in_month - 1)
+
+
+def weeks_lived_batch(birth_dates, today):
+    """weeks_lived for every birth date at once"""
+    days = (np.datetime64(today, 'D') - to_datetime64(birth_dates)).astype(np.int64)
+    return np.maximum(days // 7, 0)
+
+
+def exact_age_batch(birth_dates, today):
+    """exact_age for every birth date at once; returns an Age of int64 arrays"""
+    births = to_datetime64(birth_dates)
+    today64 = np.datetime64(today, 'D')
+    total_days = (today64 - births).astype(np.int64)
+
+    months = (today64.astype('datetime64[M]') - births.astype('datetime64[M]')).astype(np.int64)
+    anniversary = _add_months_batch(births, months)
+    months = months - (anniversary > today64)
+    anniversary = _add_months_batch(births, months)
+
+    # Даты рождения в будущем дают нулевой возраст, как и в exact_age
+    future = total_days < 0
+    years, months = np.divmod(months, 12)
+    days = (today64 - anniversary).astype(np.int64)
+    return Age(*(np.where(future, 0, values) for values in (years, months, days, total_days, total_days // 7)))
+
+
+def life_stats_batch(birth_dates, life_expectancy_years, today, weeks_per_year=WEEKS_PER_YEAR):
+    """Week and percentage stats for every user in one pass.
+
+    life_expectancy_years is a number or an array aligned with birth_dates (per-user profiles).
+    Returns a dict of arrays named like the keys of get_week_info and get_life_percentage.
+    """
+    lived = weeks_lived_batch(birth_dates, today)
+    total_weeks = np.asarray(life_expectancy_years, dtype=np.int64) * weeks_per_year
+    return {
+        'weeks_lived': lived,
+        'age_years': lived // weeks_per_year,
+        'week_in_year': lived % weeks_per_year,
+        'weeks_remaining': total_weeks - lived,
+        'total_weeks': np.broadcast_to(total_weeks, lived.shape),
+        'percentage': np.round(lived / total_weeks * 100, 2)
+    }
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Registry of report channels, each with its own timezone, cron schedule and report type
+"""
+
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+from telegram.helpers import escape_markdown
+from config import (CHANNEL_DB_PATH, CHANNEL_DEFAULT_TIMEZONE, CHANNEL_DEFAULT_SCHEDULE,
+                    CHANNEL_DEFAULT_REPORT)
+
+Channel = namedtuple('Channel', 'chat_id timezone schedule report next_run owner_id')
+
+
+@lru_cache(maxsize=1024)
+def _trigger(schedule, timezone):
+    # Тысячи каналов обычно делят несколько расписаний - каждое разбирается один раз.
+    # APScheduler и pytz загружаются при первом обращении, а не при старте бота
+    import pytz
+    from apscheduler.triggers.cron import CronTrigger
+    return CronTrigger.from_crontab(schedule, timezone=pytz.timezone(timezone))
+
+
+def next_fire_time(schedule, timezone, after):
+    """UTC timestamp of the first run of a cron schedule strictly after the `after` timestamp"""
+    # Cron считает минутами: сдвиг на секунду исключает запуск, который идет прямо сейчас
+    start = datetime.fromtimestamp(after + 1).astimezone()
+    fire_time = _trigger(schedule, timezone).get_next_fire_time(None, start)
+    return fire_time.timestamp() if fire_time else None
+
+
+def local_now(timezone, now=None):
+    import pytz
+    return datetime.fromtimestamp(now or time.time(), pytz.timezone(timezone))
+
+
+def _zone_name(now):
+    # Отчеты уходят с parse_mode='Markdown': "_" в America/New_York открыл бы курсив без конца
+    return escape_markdown(now.tzinfo.zone)
+
+
+def weekly_report(now):
+    """Weekly reminder about the life calendar"""
+    year, week, _ = now.isocalendar()
+    return f"""📅 **Weekly Life Calendar Report**
+
+🗓️ **Week {week}, {year}**
+⏰ **Generated:** {now.strftime('%B %d, %Y at %H:%M')}
+🌍 **Time Zone:** {_zone_name(now)}
+
+💡 **This week's reminder:**
+Every square represents one week of your life.
+Red squares = weeks you've lived
+White squares = weeks ahead of you
+
+🎯 **Use /start in the bot to see your personal calendar!**
+
+#LifeCalendar #WeeklyReminder #TimeManagement"""
+
+
+def year_report(now):
+    """How much of the current year has passed"""
+    year_start = date(now.year, 1, 1)
+    days_in_year = (date(now.year + 1, 1, 1) - year_start).days
+    percentage = (now.date() - year_start).days / days_in_year * 100
+    filled = int(percentage / 5)
+    _, week, _ = now.isocalendar()
+    return f"""📆 **Year Progress {now.year}**
+
+{'█' * filled}{'░' * (20 - filled)} {percentage:.1f}%
+
+🗓️ **Week {week}** of the year
+⏳ **Weeks left:** {(date(now.year, 12, 31) - now.date()).days // 7}
+🌍 **Time Zone:** {_zone_name(now)}
+
+#LifeCalendar #YearProgress"""
+
+
+REPORT_TYPES = {
+    'weekly': weekly_report,
+    'year': year_report,
+}
+
+
+def build_report(channel, now=None):
+    """Text of the channel's report in the channel's local time"""
+    return REPORT_TYPES[channel.report](local_now(channel.timezone, now))
+
+
+def validate(timezone, schedule, report):
+    """Raise ValueError naming the first bad channel setting"""
+    if report not in REPORT_TYPES:
+        raise ValueError(f"unknown report type {report!r}, expected one of {', '.join(REPORT_TYPES)}")
+    try:
+        _trigger(schedule, timezone)
+    except KeyError:
+        # pytz.UnknownTimeZoneError наследует KeyError
+        raise ValueError(f"unknown timezone {timezone!r}") from None
+    except ValueError as e:
+        raise ValueError(f"bad cron schedule {schedule!r}: {e}") from None
+
+
+class ChannelRegistry:
+    """Report channels in SQLite shared by every bot process.
+
+    next_run is the UTC timestamp of a channel's next report. The dispatcher claims a run by moving
+    it forward with a compare-and-set, so one run is never sent twice.
+    """
+
+    def __init__(self, path=CHANNEL_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS channels (
+                    chat_id TEXT PRIMARY KEY,
+                    timezone TEXT NOT NULL,
+                    schedule TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    next_run REAL,
+                    updated_at REAL NOT NULL,
+                    owner_id INTEGER
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(channels)")}
+            if 'owner_id' not in columns:
+                # Базы, созданные до появления владельцев: старые каналы видны только администраторам бота
+                self._conn.execute("ALTER TABLE channels ADD COLUMN owner_id INTEGER")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS channels_updated_at ON channels (updated_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS channels_next_run ON channels (next_run)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS channels_owner_id ON channels (owner_id)")
+
+    def add(self, chat_id, timezone=CHANNEL_DEFAULT_TIMEZONE, schedule=CHANNEL_DEFAULT_SCHEDULE,
+            report=CHANNEL_DEFAULT_REPORT, owner_id=None):
+        """Add a channel or replace its settings; raises ValueError for a bad timezone, schedule or report.
+
+        owner_id is the user who set the channel up: /channels lists a user only their own channels.
+        """
+        validate(timezone, schedule, report)
+        now = time.time()
+        channel = Channel(str(chat_id), timezone, schedule, report, next_fire_time(schedule, timezone, now), owner_id)
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO channels (chat_id, timezone, schedule, report, next_run, owner_id, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET timezone = excluded.timezone, schedule = excluded.schedule, "
+                "report = excluded.report, next_run = excluded.next_run, owner_id = excluded.owner_id, "
+                "updated_at = excluded.updated_at",
+                (*channel, now)
+            )
+        return channel
+
+    def remove(self, chat_id):
+        """Forget a channel; returns False if it was not registered"""
+        with self._conn:
+            cursor = self._conn.execute("DELETE FROM channels WHERE chat_id = ?", (str(chat_id),))
+        return cursor.rowcount == 1
+
+    def get(self, chat_id):
+        row = self._conn.execute(
+            "SELECT chat_id, timezone, schedule, report, next_run, owner_id FROM channels WHERE chat_id = ?",
+            (str(chat_id),)
+        ).fetchone()
+        return Channel(*row) if row else None
+
+    def channels(self, limit=None, owner_id=None):
+        """Channels ordered by their next report, all of them or only those of one owner"""
+        rows = self._conn.execute(
+            "SELECT chat_id, timezone, schedule, report, next_run, owner_id FROM channels "
+            "WHERE ? IS NULL OR owner_id = ? "
+            "ORDER BY next_run IS NULL, next_run LIMIT ?", (owner_id, owner_id, -1 if limit is None else limit)
+        )
+        return [Channel(*row) for row in rows]
+
+    def count(self, owner_id=None):
+        """Number of channels, all of them or only those of one owner"""
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM channels WHERE ? IS NULL OR owner_id = ?", (owner_id, owner_id)
+        ).fetchone()[0]
+
+    def next_runs(self, changed_since=None):
+        """Iterate (next_run, chat_id) of every scheduled channel, or only of those changed since a timestamp"""
+        if changed_since is None:
+            return self._conn.execute("SELECT next_run, chat_id FROM channels WHERE next_run IS NOT NULL")
+        return self._conn.execute(
+            "SELECT next_run, chat_id FROM channels WHERE next_run IS NOT NULL AND updated_at >= ?", (changed_since,)
+        )
+
+    def claim(self, chat_id, expected, next_run):
+        """Move next_run from `expected` to `next_run`; False if another run or process got there first"""
+        with self._conn:
+            cursor = self._conn.execute(
+                "UPDATE channels SET next_run = ? WHERE chat_id = ? AND next_run IS ?", (next_run, chat_id, expected)
+            )
+        return cursor.rowcount == 1
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0]
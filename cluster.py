@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Cluster mode: one webhook front process and N bot worker processes sharded by user_id.
+
+    WEBHOOK_URL=https://bot.example.com CLUSTER_WORKERS=4 python cluster.py
+
+The front accepts Telegram webhooks, picks a worker by user_id and forwards the update
+to it over localhost, one update at a time per worker, so each user's updates stay in
+order. Workers are ordinary `bot.py` processes in webhook mode; they share users and
+file_ids through SQLite, and the one holding the scheduler lease sends weekly reports.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import signal
+import sys
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+from telegram import Bot, Update
+from webhook_server import SECRET_HEADER
+from config import (BOT_TOKEN, TELEGRAM_API_URL, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_LISTEN,
+                    WEBHOOK_PORT, CLUSTER_WORKERS, CLUSTER_BASE_PORT, CLUSTER_QUEUE_LIMIT, METRICS_PORT)
+
+logger = logging.getLogger(__name__)
+
+# Поля обновления, в которых Telegram передает отправителя
+_SENDER_FIELDS = ('message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+                  'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member', 'chat_join_request',
+                  'message_reaction', 'business_message', 'edited_business_message')
+_CHAT_FIELDS = ('channel_post', 'edited_channel_post')
+
+
+def update_user_id(data):
+    """User id an update belongs to (chat id for channel posts), or None"""
+    for field in _SENDER_FIELDS:
+        payload = data.get(field)
+        if payload:
+            sender = payload.get('from') or payload.get('user')
+            if sender:
+                return sender['id']
+    for field in _CHAT_FIELDS:
+        payload = data.get(field)
+        if payload:
+            return payload['chat']['id']
+    poll_answer = data.get('poll_answer')
+    if poll_answer and poll_answer.get('user'):
+        return poll_answer['user']['id']
+    return None
+
+
+def shard_for(user_id, workers):
+    """Worker index for a user; updates without a user go to worker 0"""
+    return user_id % workers if user_id is not None else 0
+
+
+class WorkerProcess:
+    """One `bot.py` subprocess in webhook mode on a local port, restarted if it exits"""
+
+    def __init__(self, index, port, secret, extra_env=None):
+        self.index = index
+        self.port = port
+        self.secret = secret
+        self.extra_env = extra_env or {}
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}{WEBHOOK_PATH}"
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    def _env(self):
+        env = dict(os.environ)
+        env.update({
+            'BOT_MODE': 'webhook',
+            'WEBHOOK_URL': '',  # вебхук в Telegram регистрирует фронт, а не воркер
+            'WEBHOOK_LISTEN': '127.0.0.1',
+            'PORT': str(self.port),
+            'WEBHOOK_SECRET': self.secret,
+            'METRICS_PORT': str(METRICS_PORT + 1 + self.index),
+            'CLUSTER_WORKER_ID': str(self.index),
+        })
+        env.update(self.extra_env)
+        return env
+
+    async def start(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+        self.process = await asyncio.create_subprocess_exec(sys.executable, script, env=self._env())
+        logger.info(f"🚀 Worker {self.index} started (pid {self.process.pid}, port {self.port})")
+
+    async def supervise(self):
+        """Restart the worker whenever it exits, until cancelled"""
+        while True:
+            await self.start()
+            code = await self.process.wait()
+            self.restarts += 1
+            logger.error(f"❌ Worker {self.index} exited with code {code}, restarting")
+            await asyncio.sleep(1)
+
+    async def stop(self, timeout=15):
+        if not self.alive:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Worker {self.index} did not stop in {timeout}s, killing")
+            self.process.kill()
+            await self.process.wait()
+
+
+class ClusterFront:
+    """Webhook endpoint that forwards each update to the worker owning its user"""
+
+    def __init__(self, workers, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET, listen=WEBHOOK_LISTEN,
+                 port=WEBHOOK_PORT, queue_limit=CLUSTER_QUEUE_LIMIT):
+        self.workers = workers
+        self.path = path
+        self.secret = secret
+        self.listen = listen
+        self.port = port
+        self.queue_limit = queue_limit
+        self.received = 0
+        self.rejected = 0
+        self.forwarded = [0] * len(workers)
+        self._queues = None  # создаются внутри цикла событий (Python 3.9)
+        self._tasks = []
+        self._session = None
+        self._runner = None
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/health', self.handle_health)
+        return app
+
+    def _authorized(self, request):
+        if not self.secret:
+            return True
+        token = request.headers.get(SECRET_HEADER, '')
+        return hmac.compare_digest(token.encode('utf-8'), self.secret.encode('utf-8'))
+
+    async def handle_update(self, request):
+        """Queue the raw update for its worker; Telegram gets 200 before the update is handled"""
+        if not self._authorized(request):
+            self.rejected += 1
+            logger.warning(f"⚠️ Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+
+        body = await request.read()
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+        try:
+            user_id = update_user_id(data)
+        except (TypeError, KeyError, AttributeError):
+            # Поля обновления не того типа - такое обновление воркер все равно не разберет
+            return web.Response(status=400)
+
+        index = shard_for(user_id, len(self.workers))
+        try:
+            self._queues[index].put_nowait(body)
+        except asyncio.QueueFull:
+            # Telegram повторит доставку позже - так очередь не растет бесконечно
+            logger.warning(f"⚠️ Worker {index} queue is full, asking Telegram to retry")
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def handle_health(self, request):
+        """200 while every worker process is running, 503 otherwise"""
+        workers = [{
+            'index': worker.index,
+            'alive': worker.alive,
+            'restarts': worker.restarts,
+            'queued': self._queues[worker.index].qsize(),
+            'forwarded': self.forwarded[worker.index]
+        } for worker in self.workers]
+        healthy = all(w['alive'] for w in workers)
+        return web.json_response({
+            'status': 'ok' if healthy else 'degraded',
+            'mode': 'cluster',
+            'received': self.received,
+            'rejected': self.rejected,
+            'workers': workers
+        }, status=200 if healthy else 503)
+
+    async def _forward(self, worker):
+        """Send queued updates to one worker strictly in order, retrying while it is down"""
+        queue = self._queues[worker.index]
+        headers = {'Content-Type': 'application/json', SECRET_HEADER: worker.secret}
+
+        while True:
+            body = await queue.get()
+            delay = 0.1
+            while True:
+                try:
+                    async with self._session.post(worker.url, data=body, headers=headers) as response:
+                        if response.status == 200:
+                            break
+                        if 400 <= response.status < 500:
+                            # Повтор не поможет, а очередь пользователя встанет
+                            logger.error(f"❌ Worker {worker.index} rejected an update: {response.status}")
+                            break
+                        logger.warning(f"⚠️ Worker {worker.index} answered {response.status}")
+                except (ClientError, asyncio.TimeoutError) as e:
+                    if worker.alive:
+                        logger.debug(f"Worker {worker.index} is not reachable yet: {e}")
+                # Воркер запускается или перезапускается - ждем, не теряя порядок
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5)
+            self.forwarded[worker.index] += 1
+            queue.task_done()
+
+    async def start(self):
+        self._queues = [asyncio.Queue(self.queue_limit) for _ in self.workers]
+        self._session = ClientSession(timeout=ClientTimeout(total=10))
+        self._tasks = [asyncio.create_task(self._forward(worker)) for worker in self.workers]
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"🌐 Cluster front listening on {self.listen}:{self.port}{self.path} "
+                    f"for {len(self.workers)} workers")
+
+    async def stop(self, drain_timeout=5):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        # Telegram уже получил 200 на эти обновления - стараемся доставить их воркерам
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {sum(q.qsize() for q in self._queues)} updates were not forwarded before shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+        logger.info("🛑 Cluster front stopped")
+
+
+async def run_cluster(workers=CLUSTER_WORKERS, webhook_url=WEBHOOK_URL, base_port=CLUSTER_BASE_PORT,
+                      listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, secret=WEBHOOK_SECRET,
+                      bot=None, stop_event=None, worker_env=None):
+    """Start the workers and the front, register the webhook and run until SIGINT/SIGTERM or stop_event"""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows или не главный поток
+
+    # Свой секрет для пересылки воркерам: другие локальные процессы не смогут подсунуть им обновления
+    internal_secret = secrets.token_urlsafe(32)
+    processes = [WorkerProcess(i, base_port + i, internal_secret, worker_env) for i in range(workers)]
+    front = ClusterFront(processes, secret=secret, listen=listen, port=port)
+
+    supervisors = [asyncio.create_task(process.supervise()) for process in processes]
+    await front.start()
+    try:
+        if webhook_url:
+            bot = bot or Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL)
+            async with bot:
+                await bot.set_webhook(
+                    url=webhook_url.rstrip('/') + front.path,
+                    secret_token=front.secret or None,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            logger.info(f"✅ Webhook registered at {webhook_url.rstrip('/')}{front.path}")
+        else:
+            logger.warning("⚠️ WEBHOOK_URL is not set, expecting the webhook to be registered externally")
+
+        await stop_event.wait()
+    finally:
+        await front.stop()
+        for task in supervisors:
+            task.cancel()
+        await asyncio.gather(*supervisors, return_exceptions=True)
+        await asyncio.gather(*(process.stop() for process in processes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as a webhook front and sharded worker processes")
+    parser.add_argument('--workers', type=int, default=CLUSTER_WORKERS, help="bot worker processes")
+    parser.add_argument('--base-port', type=int, default=CLUSTER_BASE_PORT, help="port of worker 0")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not BOT_TOKEN:
+        logger.error("Не установлен BOT_TOKEN в переменных окружения!")
+        return
+    asyncio.run(run_cluster(args.workers, base_port=args.base_port))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,47 @@ load_dotenv()
 # Telegram Bot Token
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Bot API endpoint; point it at fake_telegram.py to test without real Telegram
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+TELEGRAM_FILE_URL = os.getenv('TELEGRAM_FILE_URL', 'https://api.telegram.org/file/bot')
+
+# Bot API HTTP client shared by handlers, the scheduler and broadcasts: pool size, idle keep-alive
+# connections and timeouts in seconds. Keep the pool above BROADCAST_CONCURRENCY so a broadcast reuses warm connections
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '64'))
+TELEGRAM_KEEPALIVE_CONNECTIONS = int(os.getenv('TELEGRAM_KEEPALIVE_CONNECTIONS', '64'))
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv('TELEGRAM_KEEPALIVE_EXPIRY', '60'))  # секунд простоя до закрытия соединения
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv('TELEGRAM_CONNECT_TIMEOUT', '5'))
+TELEGRAM_READ_TIMEOUT = float(os.getenv('TELEGRAM_READ_TIMEOUT', '5'))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv('TELEGRAM_WRITE_TIMEOUT', '5'))
+TELEGRAM_MEDIA_WRITE_TIMEOUT = float(os.getenv('TELEGRAM_MEDIA_WRITE_TIMEOUT', '20'))  # загрузка картинок
+TELEGRAM_POOL_TIMEOUT = float(os.getenv('TELEGRAM_POOL_TIMEOUT', '5'))  # ожидание свободного соединения
+
+# Update ingestion: 'polling' (getUpdates long polling) or 'webhook' (local aiohttp server)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')        # публичный https-адрес, например https://bot.onrender.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', os.getenv('WEBHOOK_PORT', '8080')))  # Render передает порт в PORT
+
+# Handlers running at once in both modes; one user's updates are still processed in order
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))
+
+# Cluster mode (python cluster.py): a webhook front process forwards updates to CLUSTER_WORKERS
+# bot processes on local ports starting at CLUSTER_BASE_PORT, sharded by user_id
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', '2'))
+CLUSTER_BASE_PORT = int(os.getenv('CLUSTER_BASE_PORT', '8100'))
+CLUSTER_QUEUE_LIMIT = int(os.getenv('CLUSTER_QUEUE_LIMIT', '1000'))  # обновлений в очереди одного воркера
+CLUSTER_WORKER_ID = os.getenv('CLUSTER_WORKER_ID', '')               # задается cluster.py для каждого воркера
+
+# Only the process holding this lease runs scheduled jobs; others take over when it expires
+LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL', '30'))  # секунд, продлевается каждые TTL/3
+
+# Metrics and health probes on a local HTTP endpoint (/metrics, /health/live, /health/ready)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9090'))
+
 # Life parameters
 LIFE_EXPECTANCY_YEARS_MALE = 75    # средняя продолжительность жизни мужчин
 LIFE_EXPECTANCY_YEARS_FEMALE = 82  # средняя продолжительность жизни женщин
@@ -18,6 +59,95 @@ GRID_ROWS = LIFE_EXPECTANCY_YEARS_DEFAULT
 CELL_SIZE = 8
 DPI = 100
 
+# Rendering engine: 'pillow' (Pillow and NumPy only, no matplotlib needed),
+# 'template' (Pillow compositing over templates pre-rendered by matplotlib),
+# 'raster' (one NumPy image via imshow) or 'patches' (one Rectangle per week)
+RENDER_ENGINE = os.getenv('RENDER_ENGINE', 'pillow')
+# DejaVu Sans for the labels; without these files the fonts come from the matplotlib package
+FONT_DIR = os.getenv('FONT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts'))
+RASTER_CELL_WIDTH = 24   # пикселей на клетку по горизонтали в растровом движке
+RASTER_CELL_HEIGHT = 12  # пикселей на клетку по вертикали в растровом движке
+
+# Output encoding: 'palette' (indexed PNG), 'png' (full color), 'webp', 'jpeg' or 'mobile'
+# (downscaled 32-color PNG for small screens); tuning knobs for each format below.
+# 'svg' (vector) is for batch_render and web clients only - Telegram cannot show it as a photo
+OUTPUT_PRESET = os.getenv('OUTPUT_PRESET', 'palette')
+PNG_COMPRESS_LEVEL = int(os.getenv('PNG_COMPRESS_LEVEL', '6'))  # 0-9, выше - меньше файл, дольше сжатие
+PALETTE_COLORS = int(os.getenv('PALETTE_COLORS', '64'))
+WEBP_QUALITY = int(os.getenv('WEBP_QUALITY', '80'))
+WEBP_METHOD = int(os.getenv('WEBP_METHOD', '4'))  # 0-6, выше - меньше файл, дольше сжатие
+JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', '90'))
+MOBILE_MAX_WIDTH = int(os.getenv('MOBILE_MAX_WIDTH', '1000'))
+
+# Render pool: worker processes and how many extra renders may wait in the queue
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '2'))
+RENDER_QUEUE_LIMIT = int(os.getenv('RENDER_QUEUE_LIMIT', '8'))
+
+# Render cache: in-memory LRU limit and optional disk tier (disabled when RENDER_CACHE_DIR is empty)
+RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', '')
+RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv('RENDER_CACHE_DISK_MAX_BYTES', str(256 * 1024 * 1024)))
+# Каталог кэша сканируется для вытеснения не на каждую запись, а после записи стольких байт
+RENDER_CACHE_EVICT_EVERY_BYTES = int(os.getenv('RENDER_CACHE_EVICT_EVERY_BYTES', str(RENDER_CACHE_DISK_MAX_BYTES // 10)))
+
+# Replies of /week, /age and /percentage are memoized per user until midnight; LRU limit in users
+RESPONSE_MEMO_MAX_USERS = int(os.getenv('RESPONSE_MEMO_MAX_USERS', '10000'))
+
+# Inline mode (@bot 15.03.1990): answers are prepared once a day per query and Telegram caches them
+# for up to INLINE_CACHE_TIME seconds (never past midnight, when the numbers change). A calendar
+# photo needs a file_id: calendars not uploaded yet go once to INLINE_UPLOAD_CHAT_ID, if set
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '86400'))
+INLINE_UPLOAD_CHAT_ID = os.getenv('INLINE_UPLOAD_CHAT_ID', '')
+INLINE_CACHE_MAX_QUERIES = int(os.getenv('INLINE_CACHE_MAX_QUERIES', '10000'))
+
+# User storage: 'sqlite' (persistent, WAL) or 'memory'; writes are batched and flushed periodically
+USER_STORE_BACKEND = os.getenv('USER_STORE_BACKEND', 'sqlite')
+USER_DB_PATH = os.getenv('USER_DB_PATH', 'life_bot.db')
+
+# Telegram file_id of every uploaded calendar, so identical images are never uploaded twice.
+# Kept in SQLite shared by all bot processes; the old JSON index is imported once if present
+FILE_ID_DB_PATH = os.getenv('FILE_ID_DB_PATH', USER_DB_PATH)
+FILE_ID_INDEX_PATH = os.getenv('FILE_ID_INDEX_PATH', 'file_ids.json')
+FILE_ID_KEEP_WEEKS = int(os.getenv('FILE_ID_KEEP_WEEKS', '4'))          # старые недели удаляет ведущий процесс при старте и по понедельникам
+FILE_ID_CACHE_MAX = int(os.getenv('FILE_ID_CACHE_MAX', '20000'))        # file_id в памяти процесса
+USER_STORE_BATCH_SIZE = int(os.getenv('USER_STORE_BATCH_SIZE', '50'))
+USER_STORE_FLUSH_INTERVAL = float(os.getenv('USER_STORE_FLUSH_INTERVAL', '1.0'))
+# Отсутствие пользователя помнится недолго: его могут записать другие процессы кластера
+USER_STORE_MISS_TTL = float(os.getenv('USER_STORE_MISS_TTL', '5'))
+USER_STORE_MISS_MAX = int(os.getenv('USER_STORE_MISS_MAX', '10000'))
+
+# Weekly report scheduler: the job is kept in SQLite and survives restarts. A run missed by less than
+# SCHEDULER_MISFIRE_GRACE seconds still fires (several missed runs fire once with SCHEDULER_COALESCE);
+# with SCHEDULER_CATCH_UP a run missed for longer is sent once on startup
+SCHEDULER_DB_PATH = os.getenv('SCHEDULER_DB_PATH', USER_DB_PATH)
+SCHEDULER_MISFIRE_GRACE = int(os.getenv('SCHEDULER_MISFIRE_GRACE', '3600'))
+SCHEDULER_COALESCE = os.getenv('SCHEDULER_COALESCE', 'true').lower() == 'true'
+SCHEDULER_CATCH_UP = os.getenv('SCHEDULER_CATCH_UP', 'true').lower() == 'true'
+
+# Report channels, each with its own timezone, cron schedule ('minute hour day month day_of_week')
+# and report type. One dispatcher keeps their next fire times in a heap; channels changed by
+# other bot processes are picked up every CHANNEL_SYNC_INTERVAL seconds
+CHANNEL_DB_PATH = os.getenv('CHANNEL_DB_PATH', SCHEDULER_DB_PATH)
+CHANNEL_DEFAULT_TIMEZONE = os.getenv('CHANNEL_DEFAULT_TIMEZONE', 'Europe/Lisbon')
+CHANNEL_DEFAULT_SCHEDULE = os.getenv('CHANNEL_DEFAULT_SCHEDULE', '0 0 * * mon')  # понедельник 00:00
+CHANNEL_DEFAULT_REPORT = os.getenv('CHANNEL_DEFAULT_REPORT', 'weekly')
+CHANNEL_SYNC_INTERVAL = float(os.getenv('CHANNEL_SYNC_INTERVAL', '30'))
+CHANNEL_RETRY_DELAY = float(os.getenv('CHANNEL_RETRY_DELAY', '60'))  # повтор неудачной отправки в пределах SCHEDULER_MISFIRE_GRACE
+# Администраторы бота (ID через запятую) управляют любыми каналами и видят их все в /channels.
+# Остальные пользователи - только каналами, где они сами администраторы
+BOT_ADMIN_IDS = frozenset(int(user_id) for user_id in os.getenv('BOT_ADMIN_IDS', '').split(',') if user_id.strip())
+
+# Weekly broadcast of personal calendars to every user
+BROADCAST_ENABLED = os.getenv('BROADCAST_ENABLED', 'true').lower() == 'true'
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', '25'))            # сообщений в секунду (лимит Telegram ~30)
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv('BROADCAST_PER_CHAT_INTERVAL', '1.0'))  # секунд между сообщениями в один чат
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '32'))
+# Рендеров рассылки в пуле одновременно; остальная емкость пула (RENDER_QUEUE_LIMIT) остается для /show
+BROADCAST_RENDER_SLOTS = int(os.getenv('BROADCAST_RENDER_SLOTS', str(RENDER_WORKERS)))
+BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', '5'))
+BROADCAST_CHECKPOINT_PATH = os.getenv('BROADCAST_CHECKPOINT_PATH', 'broadcast_checkpoint.json')
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv('BROADCAST_CHECKPOINT_EVERY', '100'))  # после падения столько календарей уйдут повторно
+
 # Colors
 COMPLETED_WEEK_COLOR = '#FF6B6B'  # красный для прожитых недель
 FUTURE_WEEK_COLOR = '#F8F9FA'     # светло-серый для будущих недель
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Telegram Bot API for testing the bot without network access.
+
+    python fake_telegram.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_MODE=webhook \\
+        WEBHOOK_URL=http://127.0.0.1:8080 WEBHOOK_SECRET=test python bot.py
+
+    # Отправить боту сообщение от пользователя 42 и посмотреть ответы
+    curl -X POST localhost:8081/fake/updates -d '{"user_id": 42, "text": "/start"}'
+    curl localhost:8081/fake/sent
+
+Updates are delivered to the registered webhook or, without one, returned from getUpdates.
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import time
+from aiohttp import ClientSession, web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Life Calendar Bot', 'username': 'fake_life_bot'}
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.updates = []  # для getUpdates, если вебхук не установлен
+        self.sent = []     # все сообщения, отправленные ботом
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._new_update = None  # создается внутри цикла событий (Python 3.9)
+        self._session = None
+
+    def build_app(self):
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post('/fake/updates', self.handle_fake_update)
+        app.router.add_get('/fake/sent', self.handle_fake_sent)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_api)
+        app.on_cleanup.append(self._close_session)
+        return app
+
+    def _update_event(self):
+        if self._new_update is None:
+            self._new_update = asyncio.Event()
+        return self._new_update
+
+    async def _close_session(self, app):
+        if self._session is not None:
+            await self._session.close()
+
+    @staticmethod
+    async def _read_params(request):
+        """Bot API accepts JSON, urlencoded and multipart bodies"""
+        if request.content_type == 'application/json':
+            return await request.json()
+        params = {}
+        for name, value in (await request.post()).items():
+            if isinstance(value, web.FileField):
+                params[name] = value.file.read()
+            else:
+                params[name] = value
+        return params
+
+    def _message(self, chat_id, **fields):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private' if int(chat_id) > 0 else 'channel'}
+        }
+        message.update(fields)
+        return message
+
+    def make_update(self, user_id, text):
+        """Build a private text message update the way Telegram sends it"""
+        sender = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+        message = self._message(user_id, text=text, **{'from': sender})
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._update_ids), 'message': message}
+
+    async def deliver(self, update):
+        """Post the update to the webhook or keep it for getUpdates; returns the webhook status"""
+        if not self.webhook_url:
+            self.updates.append(update)
+            self._update_event().set()
+            return None
+
+        if self._session is None:
+            self._session = ClientSession()
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret} if self.webhook_secret else {}
+        async with self._session.post(self.webhook_url, json=update, headers=headers) as response:
+            return response.status
+
+    async def handle_fake_update(self, request):
+        data = await request.json()
+        update = data if 'update_id' in data else self.make_update(int(data['user_id']), data['text'])
+        status = await self.deliver(update)
+        return web.json_response({'update_id': update['update_id'], 'webhook_status': status})
+
+    async def handle_fake_sent(self, request):
+        return web.json_response(self.sent)
+
+    async def handle_api(self, request):
+        method = request.match_info['method']
+        params = await self._read_params(request)
+        handler = getattr(self, f"api_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_setWebhook(self, params):
+        self.webhook_url = params.get('url') or None
+        self.webhook_secret = params.get('secret_token') or None
+        logger.info(f"🔗 Webhook set to {self.webhook_url}")
+        if params.get('drop_pending_updates') in (True, 'true', 'True'):
+            self.updates = []
+        elif self.webhook_url and self.updates:
+            # Как и Telegram, доставляем накопившиеся обновления после установки вебхука
+            pending, self.updates = self.updates, []
+            asyncio.ensure_future(self._deliver_all(pending))
+        return True
+
+    async def _deliver_all(self, updates):
+        for update in updates:
+            await self.deliver(update)
+
+    async def api_deleteWebhook(self, params):
+        self.webhook_url = None
+        self.webhook_secret = None
+        return True
+
+    async def api_getWebhookInfo(self, params):
+        return {'url': self.webhook_url or '', 'has_custom_certificate': False,
+                'pending_update_count': len(self.updates)}
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get('offset') or 0)
+        self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates:
+            event = self._update_event()
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates
+
+    async def api_sendMessage(self, params):
+        message = self._message(params['chat_id'], text=params.get('text', ''), **{'from': BOT_USER})
+        self.sent.append({'method': 'sendMessage', 'chat_id': int(params['chat_id']), 'text': message['text']})
+        return message
+
+    async def api_sendPhoto(self, params):
+        photo = params['photo']
+        if isinstance(photo, bytes):
+            file_id = f"fake-photo-{next(self._file_ids)}"
+            size = len(photo)
+        else:
+            file_id, size = photo, 0  # повторная отправка по file_id
+        sizes = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 1280, 'file_size': size}]
+        message = self._message(params['chat_id'], photo=sizes, caption=params.get('caption'), **{'from': BOT_USER})
+        self.sent.append({'method': 'sendPhoto', 'chat_id': int(params['chat_id']), 'file_id': file_id,
+                          'uploaded_bytes': size, 'caption': params.get('caption')})
+        return message
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    fake = FakeTelegram()
+    print(f"🧪 Fake Telegram API on http://{args.host}:{args.port}/bot")
+    web.run_app(fake.build_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Persistent index of Telegram file_ids for already uploaded calendar images
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from datetime import timedelta
+from render_cache import render_key_digest
+from metrics import FILE_ID_REQUESTS
+from config import FILE_ID_DB_PATH, FILE_ID_INDEX_PATH, FILE_ID_KEEP_WEEKS, FILE_ID_CACHE_MAX
+
+logger = logging.getLogger(__name__)
+
+
+class FileIdIndex:
+    """file_ids in a SQLite table shared by every bot process, with a per-process read cache.
+
+    Every row remembers the week of its calendar: a calendar changes weekly, so the scheduler's
+    leader prunes weeks nobody is sent anymore, and the read cache keeps only the most recently used ids.
+    """
+
+    def __init__(self, path=FILE_ID_DB_PATH, legacy_path=FILE_ID_INDEX_PATH, max_cached=FILE_ID_CACHE_MAX):
+        self.path = path
+        self.max_cached = max_cached
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS file_ids (digest TEXT PRIMARY KEY, file_id TEXT NOT NULL, "
+                           "week_of TEXT)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(file_ids)")}
+        if 'week_of' not in columns:
+            # Строки из базы без недель удалит первая же очистка
+            self._conn.execute("ALTER TABLE file_ids ADD COLUMN week_of TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS file_ids_week_of ON file_ids (week_of)")
+        self._conn.commit()
+        self._file_ids = OrderedDict()  # digest -> file_id, уже прочитанные из базы, в порядке использования
+        if legacy_path:
+            self._import_legacy(legacy_path)
+
+    def _remember(self, digest, file_id):
+        self._file_ids[digest] = file_id
+        self._file_ids.move_to_end(digest)
+        while len(self._file_ids) > self.max_cached:
+            self._file_ids.popitem(last=False)
+
+    def _import_legacy(self, legacy_path):
+        """Move file_ids from the old JSON index into SQLite once"""
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                file_ids = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Failed to load file_id index {legacy_path}: {e}")
+            return
+
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO file_ids (digest, file_id) VALUES (?, ?)",
+                                   list(file_ids.items()))
+        os.replace(legacy_path, f"{legacy_path}.imported")
+        logger.info(f"📦 Imported {len(file_ids)} file_ids from {legacy_path}")
+
+    def get(self, key):
+        """Return the Telegram file_id uploaded for a render key or None"""
+        digest = render_key_digest(key)
+        file_id = self._file_ids.get(digest)
+        if file_id is None:
+            # Промах не кэшируем: картинку мог только что загрузить другой процесс
+            row = self._conn.execute("SELECT file_id FROM file_ids WHERE digest = ?", (digest,)).fetchone()
+            if row:
+                file_id = row[0]
+                self._remember(digest, file_id)
+        else:
+            self._file_ids.move_to_end(digest)
+        FILE_ID_REQUESTS.labels('hit' if file_id else 'miss').inc()
+        return file_id
+
+    def put(self, key, file_id):
+        """Remember the file_id Telegram returned for a render key"""
+        digest = render_key_digest(key)
+        if self._file_ids.get(digest) != file_id:
+            self._remember(digest, file_id)
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO file_ids (digest, file_id, week_of) VALUES (?, ?, ?) "
+                        "ON CONFLICT(digest) DO UPDATE SET file_id = excluded.file_id, week_of = excluded.week_of",
+                        (digest, file_id, key.week_of.isoformat())
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"❌ Failed to save file_id: {e}")
+
+    def discard(self, key):
+        """Forget a file_id that Telegram no longer accepts"""
+        digest = render_key_digest(key)
+        file_id = self._file_ids.pop(digest, None)
+        if file_id is not None:
+            try:
+                with self._conn:
+                    # Удаляем только отклоненный file_id: другой процесс мог уже сохранить новый
+                    self._conn.execute("DELETE FROM file_ids WHERE digest = ? AND file_id = ?", (digest, file_id))
+            except sqlite3.Error as e:
+                logger.error(f"❌ Failed to delete file_id: {e}")
+
+    def prune(self, week_of, keep_weeks=FILE_ID_KEEP_WEEKS):
+        """Delete file_ids of calendars more than keep_weeks weeks older than week_of; returns the count"""
+        oldest = (week_of - timedelta(weeks=keep_weeks)).isoformat()
+        try:
+            with self._conn:
+                cursor = self._conn.execute("DELETE FROM file_ids WHERE week_of IS NULL OR week_of < ?", (oldest,))
+        except sqlite3.Error as e:
+            logger.error(f"❌ Failed to prune file_ids: {e}")
+            return 0
+        if cursor.rowcount:
+            # Дайджест не говорит о неделе - кэш процесса просто заполнится заново
+            self._file_ids.clear()
+            logger.info(f"🧹 Pruned {cursor.rowcount} file_ids older than {oldest}")
+        return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
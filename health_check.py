@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 """
 Health check script for Render Background Worker
+
+    python health_check.py          # проверка окружения перед запуском
+    python health_check.py --live   # жив ли запущенный бот (код выхода 0/1)
+    python health_check.py --ready  # готов ли бот обрабатывать обновления
 """
 
+import json
 import os
 import logging
+import sys
+import urllib.error
+import urllib.request
 from datetime import datetime
 
 # Configure logging
@@ -35,5 +43,35 @@ def health_check():
     
     return True
 
+def probe(kind='ready', timeout=3):
+    """Query the running bot's /health/live or /health/ready endpoint"""
+    host = os.getenv('METRICS_LISTEN', '127.0.0.1')
+    if host == '0.0.0.0':
+        host = '127.0.0.1'
+    url = f"http://{host}:{os.getenv('METRICS_PORT', '9090')}/health/{kind}"
+    
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = json.load(response)
+    except urllib.error.HTTPError as e:
+        # 503 - бот запущен, но какая-то проверка не прошла
+        try:
+            checks = json.load(e).get('checks', {})
+        except ValueError:
+            checks = {}
+        failed = [name for name, ok in checks.items() if not ok]
+        logging.error(f"❌ {kind} probe failed ({e.code}): {', '.join(failed) or e.reason}")
+        return False
+    except (urllib.error.URLError, OSError) as e:
+        logging.error(f"❌ {kind} probe could not reach {url}: {e}")
+        return False
+    
+    logging.info(f"✅ {kind} probe passed: {body}")
+    return True
+
 if __name__ == "__main__":
-    health_check()
+    if '--live' in sys.argv:
+        sys.exit(0 if probe('live') else 1)
+    if '--ready' in sys.argv:
+        sys.exit(0 if probe('ready') else 1)
+    sys.exit(0 if health_check() else 1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Final encoding stage for rendered calendars: full-color PNG, palette PNG, WebP or JPEG
+"""
+
+from collections import namedtuple
+from io import BytesIO
+from PIL import Image
+from config import (PNG_COMPRESS_LEVEL, PALETTE_COLORS, WEBP_QUALITY, WEBP_METHOD, JPEG_QUALITY,
+                    MOBILE_MAX_WIDTH)
+
+# colors - размер палитры (None = полноцветное изображение), compress_level - zlib для PNG,
+# quality/method - для WebP и JPEG, max_width - уменьшать более широкие изображения
+EncodingPreset = namedtuple('EncodingPreset', ['format', 'colors', 'compress_level', 'quality', 'method', 'max_width'])
+
+ENCODING_PRESETS = {
+    'png': EncodingPreset('PNG', None, PNG_COMPRESS_LEVEL, None, None, None),
+    # В календаре всего несколько цветов плюс сглаживание текста - палитры хватает без потерь на глаз
+    'palette': EncodingPreset('PNG', PALETTE_COLORS, PNG_COMPRESS_LEVEL, None, None, None),
+    'webp': EncodingPreset('WEBP', None, None, WEBP_QUALITY, WEBP_METHOD, None),
+    'jpeg': EncodingPreset('JPEG', None, None, JPEG_QUALITY, None, None),
+    # Для телефонов: меньше пикселей, меньше цветов, максимальное сжатие
+    'mobile': EncodingPreset('PNG', 32, 9, None, None, MOBILE_MAX_WIDTH),
+    # Вектор для веб-клиентов и batch_render: рисуется svg_renderer, а не encode_image.
+    # Telegram не показывает SVG как фото, поэтому боту этот пресет не подходит
+    'svg': EncodingPreset('SVG', None, None, None, None, None),
+}
+
+FILE_EXTENSIONS = {'PNG': 'png', 'WEBP': 'webp', 'JPEG': 'jpg', 'SVG': 'svg'}
+
+
+def get_preset(name):
+    try:
+        return ENCODING_PRESETS[name]
+    except KeyError:
+        raise ValueError(f"Unknown output preset: {name}") from None
+
+
+def prepare_image(image, preset):
+    """Drop alpha (the background is opaque white) and downscale for presets with max_width"""
+    image = image.convert('RGB')
+    if preset.max_width and image.width > preset.max_width:
+        height = round(image.height * preset.max_width / image.width)
+        # BOX усредняет пиксели - быстро и без звона на тонких линиях сетки
+        image = image.resize((preset.max_width, height), Image.BOX)
+    return image
+
+
+def build_palette(image, preset, exact_colors=()):
+    """Palette image for quantize(palette=...); reusing it skips the per-image color search.
+
+    exact_colors (RGB tuples) are kept as is, the rest of the palette is fitted to the image.
+    """
+    exact_colors = list(dict.fromkeys(exact_colors))
+    fitted = prepare_image(image, preset).quantize(
+        preset.colors - len(exact_colors), method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE
+    )
+    fitted_palette = fitted.getpalette()[:3 * (preset.colors - len(exact_colors))]
+    fitted_colors = [tuple(fitted_palette[i:i + 3]) for i in range(0, len(fitted_palette), 3)]
+    # Pillow сопоставляет цвета с палитрой с пониженной точностью: близкий к точному цвет
+    # мог бы "перехватить" его пиксели, поэтому такие цвета не добавляем
+    fitted_colors = [
+        color for color in fitted_colors
+        if all(max(abs(a - b) for a, b in zip(color, exact)) > 8 for exact in exact_colors)
+    ]
+    colors = [channel for color in exact_colors + fitted_colors for channel in color]
+
+    palette = Image.new('P', (1, 1))
+    palette.putpalette(colors)
+    return palette
+
+
+def encode_image(image, preset, palette=None):
+    """Encode a Pillow image with a preset and return the bytes; palette comes from build_palette"""
+    image = prepare_image(image, preset)
+    buffer = BytesIO()
+
+    if preset.format == 'PNG':
+        if preset.colors:
+            if palette is not None:
+                image = image.quantize(palette=palette, dither=Image.Dither.NONE)
+            else:
+                image = image.quantize(preset.colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        image.save(buffer, format='PNG', compress_level=preset.compress_level)
+    elif preset.format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=preset.quality, method=preset.method)
+    else:
+        image.save(buffer, format='JPEG', quality=preset.quality, optimize=True)
+
+    return buffer.getvalue()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Inline mode helpers: parsing `@bot 15.03.1990 female` queries and how long Telegram may cache answers
+"""
+
+from datetime import datetime, timedelta
+import calendar_math
+from config import INLINE_CACHE_TIME
+
+GENDERS = ('male', 'female')
+
+
+def valid_birth_date(birth_date, today):
+    """The limits /setbirth enforces: not in the future and less than 120 years ago"""
+    return birth_date <= today and calendar_math.exact_age(birth_date, today).years < 120
+
+
+def parse_inline_query(text, today):
+    """(birth_date, gender) from an inline query, or None if it is not a valid birth date.
+
+    The date is DD.MM.YYYY like /setbirth (YYYY-MM-DD also works), the gender is optional.
+    """
+    parts = text.lower().split()
+    if not 1 <= len(parts) <= 2:
+        return None
+    gender = parts[1] if len(parts) == 2 else 'default'
+    if gender not in GENDERS + ('default',):
+        return None
+    for fmt in ('%d.%m.%Y', '%Y-%m-%d'):
+        try:
+            birth_date = datetime.strptime(parts[0], fmt).date()
+            break
+        except ValueError:
+            pass
+    else:
+        return None
+    if not valid_birth_date(birth_date, today):
+        return None
+    return birth_date, gender
+
+
+def inline_cache_time(now=None, limit=INLINE_CACHE_TIME):
+    """Seconds Telegram may cache an answer: the numbers in it change at local midnight"""
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, min(limit, int((midnight - now).total_seconds())))
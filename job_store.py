@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+APScheduler job store on the standard sqlite3 module, so scheduled jobs survive restarts
+"""
+
+import pickle
+import sqlite3
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+from config import SCHEDULER_DB_PATH
+
+
+class SQLiteJobStore(BaseJobStore):
+    """Same table layout as APScheduler's SQLAlchemyJobStore, without the SQLAlchemy dependency.
+
+    Job functions are stored by reference ("module:function"), so they must be module-level.
+    """
+
+    def __init__(self, path=SCHEDULER_DB_PATH, table='apscheduler_jobs', pickle_protocol=pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self.pickle_protocol = pickle_protocol
+        self._conn = None
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id TEXT PRIMARY KEY,
+                    next_run_time REAL,
+                    job_state BLOB NOT NULL
+                )
+            """)
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_next_run_time "
+                               f"ON {self.table} (next_run_time)")
+
+    def lookup_job(self, job_id):
+        row = self._conn.execute(f"SELECT job_state FROM {self.table} WHERE id = ?", (job_id,)).fetchone()
+        return self._reconstitute_job(row[0]) if row else None
+
+    def get_due_jobs(self, now):
+        return self._get_jobs("WHERE next_run_time <= ?", (datetime_to_utc_timestamp(now),))
+
+    def get_next_run_time(self):
+        row = self._conn.execute(
+            f"SELECT next_run_time FROM {self.table} WHERE next_run_time IS NOT NULL "
+            f"ORDER BY next_run_time LIMIT 1"
+        ).fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def _serialize(self, job):
+        return (datetime_to_utc_timestamp(job.next_run_time),
+                pickle.dumps(job.__getstate__(), self.pickle_protocol))
+
+    def add_job(self, job):
+        try:
+            with self._conn:
+                self._conn.execute(f"INSERT INTO {self.table} (id, next_run_time, job_state) VALUES (?, ?, ?)",
+                                   (job.id, *self._serialize(job)))
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id) from None
+
+    def update_job(self, job):
+        with self._conn:
+            cursor = self._conn.execute(f"UPDATE {self.table} SET next_run_time = ?, job_state = ? WHERE id = ?",
+                                        (*self._serialize(job), job.id))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        with self._conn:
+            cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE id = ?", (job_id,))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        with self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def shutdown(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _reconstitute_job(self, job_state):
+        job_state = pickle.loads(job_state)
+        job_state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, condition='', params=()):
+        jobs = []
+        failed_job_ids = []
+        rows = self._conn.execute(
+            f"SELECT id, job_state FROM {self.table} {condition} ORDER BY next_run_time", params
+        ).fetchall()
+        for job_id, job_state in rows:
+            try:
+                jobs.append(self._reconstitute_job(job_state))
+            except BaseException:
+                # Функцию задачи переименовали или удалили - такую задачу уже не восстановить
+                self._logger.exception(f'Unable to restore job "{job_id}" -- removing it')
+                failed_job_ids.append(job_id)
+
+        if failed_job_ids:
+            with self._conn:
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE id = ?", [(i,) for i in failed_job_ids])
+        return jobs
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} (path={self.path})>"
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Leader election through a lease row in SQLite: one process at a time runs scheduled jobs
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+from config import USER_DB_PATH, LEADER_LEASE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteLease:
+    """A named lease with an owner and an expiry time.
+
+    The holder renews it every ttl/3 seconds; if the holder dies, any process may take it
+    once it expires. All processes must share the database file (one host or a shared volume).
+    """
+
+    def __init__(self, name='scheduler', path=USER_DB_PATH, ttl=LEADER_LEASE_TTL, owner=None):
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.held = False
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def try_acquire(self):
+        """Take or renew the lease; returns True if this process holds it afterwards"""
+        now = time.time()
+        try:
+            with self._conn:
+                # Одно атомарное выражение: чужую аренду можно забрать только после истечения
+                self._conn.execute(
+                    "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                    (self.name, self.owner, now + self.ttl, now)
+                )
+            self.held = self.holder() == self.owner
+        except sqlite3.Error as e:
+            # Не смогли продлить - считаем, что аренды нет, иначе задачи могут запуститься дважды
+            logger.error(f"❌ Lease {self.name} check failed: {e}")
+            self.held = False
+        return self.held
+
+    def holder(self):
+        """Owner of an unexpired lease or None"""
+        row = self._conn.execute(
+            "SELECT owner FROM leases WHERE name = ? AND expires_at >= ?", (self.name, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def release(self):
+        """Give the lease up so another process can take it without waiting for expiry"""
+        try:
+            with self._conn:
+                self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, self.owner))
+        except sqlite3.Error as e:
+            logger.error(f"❌ Failed to release lease {self.name}: {e}")
+        self.held = False
+
+    async def run(self, on_acquired, on_lost):
+        """Keep trying to hold the lease until cancelled, calling on_acquired()/on_lost() on changes"""
+        try:
+            while True:
+                was_held = self.held
+                held = self.try_acquire()
+                if held and not was_held:
+                    logger.info(f"👑 {self.owner} is now the {self.name} leader")
+                    await on_acquired()
+                elif was_held and not held:
+                    logger.warning(f"⚠️ {self.owner} lost the {self.name} lease")
+                    await on_lost()
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if self.held:
+                self.release()
+
+    def close(self):
+        self._conn.close()
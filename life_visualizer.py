@@ -1,69 +1,207 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from datetime import datetime, date
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from collections import namedtuple
+from datetime import date
+from io import BytesIO
 import math
+import os
+import time
 from config import *
+from image_encoding import FILE_EXTENSIONS, build_palette, encode_image, get_preset
+import calendar_math
+
+RENDER_ENGINES = ('pillow', 'template', 'raster', 'patches')
+
+# Шрифты DejaVu Sans (те же, что у matplotlib по умолчанию) в FONT_DIR
+FONT_FILES = {
+    'normal': 'DejaVuSans.ttf',
+    'bold': 'DejaVuSans-Bold.ttf',
+    'italic': 'DejaVuSans-Oblique.ttf'
+}
+
+# matplotlib.pyplot: импортируется при первом рендере, чтобы не замедлять запуск бота
+plt = None
+
+# Цвета календаря, которые должны остаться точными после перевода в палитру
+PALETTE_EXACT_COLORS = tuple(
+    ImageColor.getrgb(color)[:3]
+    for color in ('white', COMPLETED_WEEK_COLOR, FUTURE_WEEK_COLOR, GRID_COLOR, TEXT_COLOR,
+                  '#f8f9fa', '#dee2e6', '#6c757d')
+)
+
+# Все входные данные, от которых зависит картинка. Одинаковый ключ = одинаковые пиксели
+RenderKey = namedtuple('RenderKey', ['engine', 'life_expectancy', 'weeks_lived', 'week_of', 'preset'])
+
+# Оформление надписи: начертание шрифта (normal, bold, italic), кегль, цвет и
+# (необязательно) скругленная рамка вокруг текста; кегль и поле рамки - в пунктах
+TextStyle = namedtuple('TextStyle', ['font', 'size', 'color', 'box_fill', 'box_edge', 'pad'])
+STATS_STYLE = TextStyle('normal', 11, TEXT_COLOR, '#f8f9fa', '#dee2e6', 0.5 * 11)
+FOOTER_STYLE = TextStyle('italic', 8, '#6c757d', None, None, 0)
+
+# Заранее нарисованные части картинки для одной продолжительности жизни
+GridTemplate = namedtuple('GridTemplate', [
+    'empty',          # RGBA-картинка с пустой сеткой и всеми неизменными надписями
+    'full',           # то же самое, но все недели закрашены как прожитые
+    'week_index',     # номер недели для каждого пикселя области сетки (0xFFFF - граница)
+    'row_first_week', # наименьший номер недели в каждой строке пикселей сетки
+    'grid_box',       # (left, top, right, bottom) области сетки в пикселях
+    'stats_center',   # центр блока статистики
+    'footer_center'   # центр подписи с датой
+])
+
+
+# Параметры жизни конкретного пользователя. Неизменяемый, передается в каждый вызов
+LifeProfile = namedtuple('LifeProfile', ['gender', 'life_expectancy_years'])
+
+
+def get_life_expectancy(gender):
+    """Возвращает ожидаемую продолжительность жизни в зависимости от пола"""
+    if gender == 'male':
+        return LIFE_EXPECTANCY_YEARS_MALE
+    elif gender == 'female':
+        return LIFE_EXPECTANCY_YEARS_FEMALE
+    else:
+        return LIFE_EXPECTANCY_YEARS_DEFAULT
+
+
+_PROFILES = {}
+
+
+def get_profile(gender):
+    """Возвращает (общий для всех) профиль для пола"""
+    profile = _PROFILES.get(gender)
+    if profile is None:
+        profile = _PROFILES[gender] = LifeProfile(gender, get_life_expectancy(gender))
+    return profile
+
+
+def _load_pyplot():
+    """Импортирует matplotlib с безоконным backend Agg (один раз на процесс)"""
+    global plt
+    if plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot
+        plt = matplotlib.pyplot
+    return plt
+
+
+def _with_alpha(color, alpha):
+    """Цвет matplotlib в виде RGBA-кортежа для Pillow"""
+    return ImageColor.getrgb(color)[:3] + (int(round(alpha * 255)),)
+
+
+class MatplotlibBackend:
+    """Движки template, raster и patches: картинка рисуется через matplotlib
+    (template - один раз на продолжительность жизни, дальше только Pillow)"""
+    
+    def __init__(self, visualizer):
+        self.visualizer = visualizer
+    
+    def warm_up(self, engine):
+        """Импортирует matplotlib, а для движка template строит шаблоны"""
+        if engine == 'template':
+            for life_expectancy in (LIFE_EXPECTANCY_YEARS_MALE,
+                                    LIFE_EXPECTANCY_YEARS_FEMALE,
+                                    LIFE_EXPECTANCY_YEARS_DEFAULT):
+                self.visualizer._get_template(life_expectancy)
+        else:
+            _load_pyplot()
+    
+    def draw(self, key, timings):
+        if key.engine == 'template':
+            return self.visualizer._composite_from_template(key, timings)
+        return self.visualizer._draw_with_matplotlib(key, timings)
+
+
+def _pillow_backend(visualizer):
+    from pillow_renderer import PillowBackend
+    return PillowBackend(visualizer)
+
+
+# Бэкенд рисует картинку Pillow по ключу рендеринга: draw(key, timings) и warm_up(engine).
+# Бэкенд создается при первом рендере его движком, поэтому движок pillow не загружает matplotlib
+RENDER_BACKENDS = {
+    'pillow': _pillow_backend,
+    'template': MatplotlibBackend,
+    'raster': MatplotlibBackend,
+    'patches': MatplotlibBackend
+}
+
 
 class LifeVisualizer:
-    def __init__(self, gender='default'):
-        self.gender = gender
-        self.life_expectancy_years = self._get_life_expectancy(gender)
+    """Визуализатор без изменяемого состояния: пол и продолжительность жизни
+    передаются в каждый вызов через LifeProfile, поэтому один экземпляр
+    можно безопасно использовать для любых пользователей одновременно.
+    Профиль из конструктора используется, только если profile не передан."""
+    
+    def __init__(self, gender='default', engine=RENDER_ENGINE, preset=OUTPUT_PRESET):
+        if engine not in RENDER_ENGINES:
+            raise ValueError(f"Неизвестный движок рендеринга: {engine}")
+        get_preset(preset)  # проверяем имя сразу, а не при первом рендере
+        self.profile = get_profile(gender)
+        self.engine = engine
+        self.preset = preset
         self.weeks_per_year = WEEKS_PER_YEAR
         self.grid_columns = GRID_COLUMNS
-        self.grid_rows = self.life_expectancy_years
         self.cell_size = CELL_SIZE
         self.dpi = DPI
+        # Кэши бэкендов, шаблонов и шрифтов: заполняются один раз и дальше только читаются
+        self._backends = {}
+        self._templates = {}
+        self._fonts = {}
+        self._palettes = {}
     
-    def _get_life_expectancy(self, gender):
-        """Возвращает ожидаемую продолжительность жизни в зависимости от пола"""
-        if gender == 'male':
-            return LIFE_EXPECTANCY_YEARS_MALE
-        elif gender == 'female':
-            return LIFE_EXPECTANCY_YEARS_FEMALE
-        else:
-            return LIFE_EXPECTANCY_YEARS_DEFAULT
+    @property
+    def gender(self):
+        return self.profile.gender
     
-    def set_gender(self, gender):
-        """Устанавливает пол и пересчитывает параметры"""
-        self.gender = gender
-        self.life_expectancy_years = self._get_life_expectancy(gender)
-        self.grid_rows = self.life_expectancy_years
-        
-    def calculate_weeks_lived(self, birth_date):
+    @property
+    def life_expectancy_years(self):
+        return self.profile.life_expectancy_years
+    
+    def calculate_weeks_lived(self, birth_date, today=None):
         """Вычисляет количество прожитых недель"""
-        today = date.today()
-        delta = today - birth_date
-        weeks = math.floor(delta.days / 7)
-        return max(0, weeks)
+        return calendar_math.weeks_lived(birth_date, today or date.today())
     
-    def create_life_grid(self, birth_date, output_path="life_grid.png"):
-        """Создает визуализацию жизни в неделях"""
-        weeks_lived = self.calculate_weeks_lived(birth_date)
+    def _grid_cell_indices(self, grid_rows, width, height):
+        """Номер недели и признак границы клетки для каждого пикселя сетки height x width"""
+        # Номер колонки/строки для каждого пикселя
+        cols = np.arange(width) * self.grid_columns // width
+        rows = np.arange(height) * grid_rows // height
+        weeks = rows[:, None] * self.grid_columns + cols[None, :]
         
-        # Создаем фигуру с оптимальными размерами для Telegram
-        fig, ax = plt.subplots(figsize=(14, 12), dpi=self.dpi)
+        # Границы клеток - первый пиксель каждой клетки и край сетки
+        col_edges = np.r_[True, cols[1:] != cols[:-1]]
+        row_edges = np.r_[True, rows[1:] != rows[:-1]]
+        col_edges[-1] = row_edges[-1] = True
+        edges = row_edges[:, None] | col_edges[None, :]
         
-        # Настройки осей с запасом для текста
-        ax.set_xlim(-2, self.grid_columns + 2)
-        ax.set_ylim(-12, self.grid_rows + 3)
+        return weeks, edges
+    
+    def _build_grid_pixels(self, weeks_lived, grid_rows, width, height):
+        """Рисует сетку недель как RGB-массив размером height x width"""
+        weeks, edges = self._grid_cell_indices(grid_rows, width, height)
         
-        # Убираем оси
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['left'].set_visible(False)
+        lived_color = np.array(ImageColor.getrgb(COMPLETED_WEEK_COLOR)[:3], dtype=np.uint8)
+        future_color = np.array(ImageColor.getrgb(FUTURE_WEEK_COLOR)[:3], dtype=np.uint8)
+        pixels = np.where((weeks < weeks_lived)[..., None], lived_color, future_color)
+        pixels[edges] = ImageColor.getrgb(GRID_COLOR)[:3]
         
-        # Рисуем сетку недель
-        for row in range(self.grid_rows):
+        return pixels
+    
+    def _draw_grid_patches(self, ax, weeks_lived, grid_rows):
+        """Рисует сетку недель отдельными прямоугольниками (медленно)"""
+        from matplotlib import patches
+        
+        for row in range(grid_rows):
             for col in range(self.grid_columns):
                 week_number = row * self.grid_columns + col
                 
                 if week_number < weeks_lived:
                     # Прожитая неделя - красный квадрат
                     rect = patches.Rectangle(
-                        (col, self.grid_rows - 1 - row), 
+                        (col, grid_rows - 1 - row), 
                         1, 1, 
                         facecolor=COMPLETED_WEEK_COLOR,
                         edgecolor=GRID_COLOR,
@@ -72,7 +210,7 @@ class LifeVisualizer:
                 else:
                     # Будущая неделя - пустой квадрат
                     rect = patches.Rectangle(
-                        (col, self.grid_rows - 1 - row), 
+                        (col, grid_rows - 1 - row), 
                         1, 1, 
                         facecolor=FUTURE_WEEK_COLOR,
                         edgecolor=GRID_COLOR,
@@ -80,9 +218,168 @@ class LifeVisualizer:
                     )
                 
                 ax.add_patch(rect)
+    
+    def _draw_grid_raster(self, ax, weeks_lived, grid_rows):
+        """Рисует сетку недель одним изображением через imshow"""
+        pixels = self._build_grid_pixels(
+            weeks_lived,
+            grid_rows,
+            self.grid_columns * RASTER_CELL_WIDTH,
+            grid_rows * RASTER_CELL_HEIGHT
+        )
+        ax.imshow(pixels, extent=(0, self.grid_columns, 0, grid_rows),
+                  interpolation='nearest', aspect='auto', zorder=0)
+    
+    def create_life_grid(self, birth_date, output_path="life_grid.png", engine=None, profile=None, preset=None):
+        """Создает визуализацию жизни в неделях и сохраняет ее в файл"""
+        image_bytes = self.render_life_grid(birth_date, engine, profile, preset)
+        with open(output_path, 'wb') as f:
+            f.write(image_bytes)
+        
+        return output_path
+    
+    def get_render_key(self, birth_date, engine=None, profile=None, preset=None, today=None):
+        """Возвращает ключ рендеринга для даты рождения на текущую неделю"""
+        profile = profile or self.profile
+        today = today or date.today()
+        return RenderKey(
+            engine=engine or self.engine,
+            life_expectancy=profile.life_expectancy_years,
+            weeks_lived=calendar_math.weeks_lived(birth_date, today),
+            # Понедельник текущей недели - дата в подписи меняется раз в неделю
+            week_of=calendar_math.week_start(today),
+            preset=preset or self.preset
+        )
+    
+    def render_life_grid(self, birth_date, engine=None, profile=None, preset=None):
+        """Создает визуализацию жизни в неделях и возвращает изображение в виде байтов"""
+        return self.render_grid(self.get_render_key(birth_date, engine, profile, preset))
+    
+    @staticmethod
+    def file_extension(key):
+        """Расширение файла для формата пресета ключа: png, webp или jpg"""
+        return FILE_EXTENSIONS[get_preset(key.preset).format]
+    
+    def render_grid(self, key, timings=None):
+        """Рисует календарь по ключу рендеринга и возвращает изображение в формате пресета key.preset.
+        
+        Если передан словарь timings, в него записывается время фаз layout/rasterize/encode в секундах.
+        """
+        timings = {} if timings is None else timings
+        if get_preset(key.preset).format == 'SVG':
+            # Векторный вывод не растеризуется: весь рендер - это запись SVG
+            started = time.perf_counter()
+            svg_bytes = self._get_svg_renderer().render(key)
+            timings['encode'] = time.perf_counter() - started
+            return svg_bytes
+        image = self._get_backend(key.engine).draw(key, timings)
+        
+        started = time.perf_counter()
+        image_bytes = self._encode(image, key)
+        timings['encode'] = timings.get('encode', 0) + time.perf_counter() - started
+        return image_bytes
+    
+    def render_delta(self, key, since_weeks_lived=None):
+        """JSON-обновление SVG календаря: прожитые с since_weeks_lived недели (по умолчанию -
+        с прошлой недели), новая статистика и подпись. Клиент хранит SVG и применяет только его"""
+        if since_weeks_lived is None:
+            since_weeks_lived = max(key.weeks_lived - 1, 0)
+        return self._get_svg_renderer().render_delta(key, since_weeks_lived)
+    
+    def _get_svg_renderer(self):
+        renderer = self._backends.get('svg')
+        if renderer is None:
+            from svg_renderer import SvgRenderer
+            renderer = self._backends['svg'] = SvgRenderer(self)
+        return renderer
+    
+    def _encode(self, image, key):
+        """Кодирует изображение по пресету; палитру подбираем один раз на движок и пресет"""
+        preset = get_preset(key.preset)
+        palette = None
+        if preset.colors:
+            palette = self._palettes.get((key.engine, key.preset))
+            if palette is None:
+                sample = image
+                if key.engine in ('pillow', 'template'):
+                    # Подбираем палитру по календарю, где есть и прожитые, и будущие недели
+                    sample = self._get_backend(key.engine).draw(
+                        key._replace(weeks_lived=key.life_expectancy * self.weeks_per_year // 2), {}
+                    )
+                palette = build_palette(sample, preset, exact_colors=PALETTE_EXACT_COLORS)
+                self._palettes[(key.engine, key.preset)] = palette
+        return encode_image(image, preset, palette)
+    
+    def _draw_with_matplotlib(self, key, timings):
+        """Рисует календарь через matplotlib (движки patches и raster) и возвращает изображение Pillow"""
+        started = time.perf_counter()
+        weeks_lived = key.weeks_lived
+        grid_rows = key.life_expectancy
+        fig, ax = self._create_figure(grid_rows)
+        
+        # Рисуем сетку недель
+        if key.engine == 'patches':
+            self._draw_grid_patches(ax, weeks_lived, grid_rows)
+        else:
+            self._draw_grid_raster(ax, weeks_lived, grid_rows)
+        
+        self._draw_static_text(ax, grid_rows)
+        
+        # Создаем красивую статистику (левая колонка)
+        ax.text(self.grid_columns / 4, -2, self._format_stats_text(weeks_lived, grid_rows), 
+                ha='center', va='center', 
+                fontsize=11, color=TEXT_COLOR, fontweight='normal',
+                bbox=dict(boxstyle="round,pad=0.5", facecolor='#f8f9fa', edgecolor='#dee2e6', alpha=0.8))
+        
+        # Добавляем неделю создания (по центру внизу)
+        ax.text(self.grid_columns / 2, -6, 
+                self._format_footer_text(key.week_of), 
+                ha='center', va='center', 
+                fontsize=8, color='#6c757d', style='italic')
+        
+        # Настройки макета
+        plt.tight_layout()
+        laid_out = time.perf_counter()
+        
+        # Растеризуем в несжатый PNG - сжатие делает этап кодирования по пресету
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', dpi=self.dpi, bbox_inches='tight', 
+                    facecolor='white', edgecolor='none', 
+                    pad_inches=0.2, pil_kwargs={'compress_level': 0})
+        plt.close(fig)
+        rasterized = time.perf_counter()
+        
+        image = Image.open(buffer)
+        image.load()
+        timings['layout'] = laid_out - started
+        timings['rasterize'] = rasterized - laid_out
+        timings['encode'] = time.perf_counter() - rasterized
+        return image
+    
+    def _create_figure(self, grid_rows):
+        """Создает фигуру и оси без рамок под сетку из grid_rows строк"""
+        # Создаем фигуру с оптимальными размерами для Telegram
+        _load_pyplot()
+        fig, ax = plt.subplots(figsize=(14, 12), dpi=self.dpi)
+        
+        # Настройки осей с запасом для текста
+        ax.set_xlim(-2, self.grid_columns + 2)
+        ax.set_ylim(-12, grid_rows + 3)
         
+        # Убираем оси
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['bottom'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        
+        return fig, ax
+    
+    def _draw_static_text(self, ax, grid_rows):
+        """Рисует все надписи, которые не зависят от пользователя"""
         # Добавляем подписи осей
-        ax.text(-1.5, self.grid_rows / 2, 'AGE\nВОЗРАСТ', 
+        ax.text(-1.5, grid_rows / 2, 'AGE\nВОЗРАСТ', 
                 rotation=90, ha='center', va='center', 
                 fontsize=14, color=TEXT_COLOR, fontweight='bold')
         
@@ -91,30 +388,11 @@ class LifeVisualizer:
                 fontsize=14, color=TEXT_COLOR, fontweight='bold')
         
         # Добавляем заголовок
-        ax.text(self.grid_columns / 2, self.grid_rows + 2, 
-                f'A {self.life_expectancy_years}-YEAR HUMAN LIFE IN WEEKS', 
+        ax.text(self.grid_columns / 2, grid_rows + 2, 
+                f'A {grid_rows}-YEAR HUMAN LIFE IN WEEKS', 
                 ha='center', va='center', 
                 fontsize=18, color=TEXT_COLOR, fontweight='bold')
         
-        # Добавляем статистику жизни
-        current_age = weeks_lived // self.weeks_per_year
-        current_week_in_year = weeks_lived % self.weeks_per_year
-        total_weeks = self.life_expectancy_years * self.weeks_per_year
-        weeks_remaining = total_weeks - weeks_lived
-        life_percentage = (weeks_lived / total_weeks) * 100
-        
-        # Создаем красивую статистику (левая колонка)
-        stats_text = f"LIFE STATISTICS\n"
-        stats_text += f"Current Age: {current_age} years, {current_week_in_year} weeks\n"
-        stats_text += f"Weeks Lived: {weeks_lived:,}\n"
-        stats_text += f"Weeks Remaining: {weeks_remaining:,}\n"
-        stats_text += f"Life Progress: {life_percentage:.1f}%"
-        
-        ax.text(self.grid_columns / 4, -2, stats_text, 
-                ha='center', va='center', 
-                fontsize=11, color=TEXT_COLOR, fontweight='normal',
-                bbox=dict(boxstyle="round,pad=0.5", facecolor='#f8f9fa', edgecolor='#dee2e6', alpha=0.8))
-        
         # Добавляем легенду (правая колонка)
         legend_text = "Red squares = Weeks lived\nWhite squares = Weeks remaining"
         ax.text(3 * self.grid_columns / 4, -2, legend_text, 
@@ -128,69 +406,226 @@ class LifeVisualizer:
                 ha='center', va='center', 
                 fontsize=9, color=TEXT_COLOR, style='italic',
                 bbox=dict(boxstyle="round,pad=0.3", facecolor='#f1f3f4', edgecolor='#dadce0', alpha=0.8))
+    
+    def _format_stats_text(self, weeks_lived, life_expectancy):
+        """Текст блока статистики жизни"""
+        current_age = weeks_lived // self.weeks_per_year
+        current_week_in_year = weeks_lived % self.weeks_per_year
+        total_weeks = life_expectancy * self.weeks_per_year
+        weeks_remaining = total_weeks - weeks_lived
+        life_percentage = (weeks_lived / total_weeks) * 100
         
-        # Добавляем дату создания (по центру внизу)
-        creation_date = date.today().strftime("%B %d, %Y")
-        ax.text(self.grid_columns / 2, -6, 
-                f"Generated on {creation_date}", 
-                ha='center', va='center', 
-                fontsize=8, color='#6c757d', style='italic')
+        stats_text = f"LIFE STATISTICS\n"
+        stats_text += f"Current Age: {current_age} years, {current_week_in_year} weeks\n"
+        stats_text += f"Weeks Lived: {weeks_lived:,}\n"
+        stats_text += f"Weeks Remaining: {weeks_remaining:,}\n"
+        stats_text += f"Life Progress: {life_percentage:.1f}%"
+        return stats_text
+    
+    def _format_footer_text(self, week_of):
+        """Подпись с неделей создания"""
+        return f"Generated for the week of {week_of.strftime('%B %d, %Y')}"
+    
+    def _get_backend(self, engine):
+        """Возвращает (и при первом обращении создает) бэкенд движка"""
+        backend_factory = RENDER_BACKENDS[engine]
+        backend = self._backends.get(backend_factory)
+        if backend is None:
+            backend = self._backends[backend_factory] = backend_factory(self)
+        return backend
+    
+    def warm_up(self):
+        """Готовит движок по умолчанию заранее, чтобы первый /show не был медленнее"""
+        backend = self._get_backend(self.engine)
+        backend.warm_up(self.engine)
+        # И палитру пресета по умолчанию, чтобы первый /show не подбирал ее
+        if self.engine in ('pillow', 'template') and get_preset(self.preset).colors:
+            key = RenderKey(self.engine, LIFE_EXPECTANCY_YEARS_DEFAULT, 0, date.today(), self.preset)
+            self._encode(backend.draw(key, {}), key)
+    
+    def _get_template(self, life_expectancy):
+        """Возвращает (и при первом обращении строит) шаблон для продолжительности жизни"""
+        template = self._templates.get(life_expectancy)
+        if template is None:
+            template = self._templates[life_expectancy] = self._build_template(life_expectancy)
+        return template
+    
+    def _build_template(self, life_expectancy):
+        """Рисует через matplotlib все неизменные части картинки один раз"""
+        grid_rows = life_expectancy
+        width = self.grid_columns * RASTER_CELL_WIDTH
+        height = grid_rows * RASTER_CELL_HEIGHT
         
-        # Настройки макета
+        fig, ax = self._create_figure(grid_rows)
+        grid_image = ax.imshow(self._build_grid_pixels(0, grid_rows, width, height),
+                               extent=(0, self.grid_columns, 0, grid_rows),
+                               interpolation='nearest', aspect='auto', zorder=0)
+        self._draw_static_text(ax, grid_rows)
         plt.tight_layout()
+        fig.canvas.draw()
         
-        # Сохраняем изображение с высоким качеством
-        plt.savefig(output_path, dpi=self.dpi, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none', 
-                   pad_inches=0.2)
-        plt.close()
+        # Обрезаем так же, как savefig(bbox_inches='tight', pad_inches=0.2)
+        fig_height = fig.bbox.height
+        crop = fig.get_tightbbox(fig.canvas.get_renderer()).padded(0.2)
+        left = max(int(round(crop.x0 * self.dpi)), 0)
+        top = max(int(round(fig_height - crop.y1 * self.dpi)), 0)
+        right = int(round(crop.x1 * self.dpi))
+        bottom = int(round(fig_height - crop.y0 * self.dpi))
         
-        return output_path
+        def rasterize():
+            fig.canvas.draw()
+            return np.asarray(fig.canvas.buffer_rgba())[top:bottom, left:right].copy()
+        
+        def to_image(x, y):
+            display_x, display_y = ax.transData.transform((x, y))
+            return display_x - left, fig_height - display_y - top
+        
+        # Пустая и полностью заполненная сетка с одинаковыми надписями поверх
+        empty = rasterize()
+        grid_image.set_data(self._build_grid_pixels(grid_rows * self.grid_columns, grid_rows, width, height))
+        full = rasterize()
+        
+        # Слой с номером недели в каждом пикселе: тот же ресэмплинг, что и у сетки, без надписей
+        weeks, edges = self._grid_cell_indices(grid_rows, width, height)
+        weeks = np.where(edges, 0xFFFF, weeks)
+        grid_image.set_data(np.stack([weeks >> 8, weeks & 0xFF, np.zeros_like(weeks)], axis=-1).astype(np.uint8))
+        for text in ax.texts:
+            text.set_visible(False)
+        index_layer = rasterize()
+        plt.close(fig)
+        
+        grid_left, grid_top = to_image(0, grid_rows)
+        grid_right, grid_bottom = to_image(self.grid_columns, 0)
+        grid_box = (int(math.floor(grid_left)), int(math.floor(grid_top)),
+                    int(math.ceil(grid_right)), int(math.ceil(grid_bottom)))
+        x0, y0, x1, y1 = grid_box
+        region = index_layer[y0:y1, x0:x1].astype(np.int32)
+        week_index = (region[..., 0] << 8) | region[..., 1]
+        
+        return GridTemplate(
+            empty=empty,
+            full=full,
+            week_index=week_index,
+            row_first_week=week_index.min(axis=1),
+            grid_box=grid_box,
+            stats_center=to_image(self.grid_columns / 4, -2),
+            footer_center=to_image(self.grid_columns / 2, -6)
+        )
     
-    def get_week_info(self, birth_date):
-        """Возвращает информацию о текущей неделе"""
-        weeks_lived = self.calculate_weeks_lived(birth_date)
-        current_age = weeks_lived // self.weeks_per_year
-        current_week_in_year = weeks_lived % self.weeks_per_year
+    def _composite_from_template(self, key, timings=None):
+        """Накладывает прожитые недели и статистику на готовый шаблон через Pillow"""
+        started = time.perf_counter()
+        template = self._get_template(key.life_expectancy)
         
-        return {
-            'total_weeks': weeks_lived,
-            'age_years': current_age,
-            'week_in_year': current_week_in_year,
-            'weeks_remaining': (self.life_expectancy_years * self.weeks_per_year) - weeks_lived,
-            'gender': self.gender,
-            'life_expectancy': self.life_expectancy_years
-        }
+        # Копируем пустой шаблон и переносим пиксели прожитых недель из заполненного,
+        # проходя только по строкам, где есть прожитые недели
+        pixels = template.empty.copy()
+        x0, y0, x1, y1 = template.grid_box
+        lived_rows = np.flatnonzero(template.row_first_week < key.weeks_lived)
+        if lived_rows.size:
+            y_end = y0 + lived_rows[-1] + 1
+            lived = template.week_index[:y_end - y0] < key.weeks_lived
+        laid_out = time.perf_counter()
+        if lived_rows.size:
+            np.copyto(pixels[y0:y_end, x0:x1], template.full[y0:y_end, x0:x1], where=lived[..., None])
+        image = Image.fromarray(pixels, 'RGBA')
+        self._draw_stats_and_footer(image, key, template.stats_center, template.footer_center)
+        
+        if timings is not None:
+            timings['layout'] = laid_out - started
+            timings['rasterize'] = time.perf_counter() - laid_out
+        return image
+    
+    def _draw_stats_and_footer(self, image, key, stats_center, footer_center):
+        """Дописывает на картинку блок статистики и подпись с датой"""
+        self._draw_styled_text(image, stats_center,
+                               self._format_stats_text(key.weeks_lived, key.life_expectancy), STATS_STYLE)
+        self._draw_styled_text(image, footer_center, self._format_footer_text(key.week_of), FOOTER_STYLE)
     
-    def calculate_age(self, birth_date):
-        """Вычисляет точный возраст в годах, месяцах и днях"""
-        today = date.today()
-        delta = today - birth_date
+    def _get_font(self, style, size_points):
+        """Шрифт Pillow: DejaVu Sans из FONT_DIR, тот же, что у matplotlib по умолчанию"""
+        font_key = (style, size_points)
+        font = self._fonts.get(font_key)
+        if font is None:
+            path = os.path.join(FONT_DIR, FONT_FILES[style])
+            if not os.path.exists(path):
+                # Без файлов шрифтов берем шрифт из пакета matplotlib
+                from matplotlib.font_manager import FontProperties, findfont
+                path = findfont(FontProperties(style='italic' if style == 'italic' else 'normal',
+                                               weight='bold' if style == 'bold' else 'normal'))
+            font = self._fonts[font_key] = ImageFont.truetype(path, size_points * self.dpi / 72)
+        return font
+    
+    @staticmethod
+    def _line_spacing(draw, font):
+        # matplotlib ставит строки через 1.2 размера шрифта, Pillow - через высоту "A" + spacing
+        return max(0, round(1.2 * font.size - draw.textbbox((0, 0), "A", font=font)[3]))
+    
+    def _text_box_size(self, text, style):
+        """Ширина и высота в пикселях, которые займет текст (с рамкой) в _draw_styled_text"""
+        font = self._get_font(style.font, style.size)
+        draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+        left, top, right, bottom = draw.multiline_textbbox(
+            (0, 0), text, font=font, anchor='mm', align='center', spacing=self._line_spacing(draw, font))
+        pad = style.pad * self.dpi / 72
+        return int(math.ceil(right - left + 2 * pad)), int(math.ceil(bottom - top + 2 * pad))
+    
+    def _draw_styled_text(self, image, center, text, style):
+        self._draw_text_box(image, center, text, self._get_font(style.font, style.size), style.color,
+                            box_fill=style.box_fill, box_edge=style.box_edge, pad_points=style.pad)
+    
+    def _draw_text_box(self, image, center, text, font, color,
+                       box_fill=None, box_edge=None, pad_points=0):
+        """Рисует многострочный текст по центру точки, при необходимости в скругленной рамке"""
+        draw = ImageDraw.Draw(image)
+        spacing = self._line_spacing(draw, font)
         
-        years = delta.days // 365
-        remaining_days = delta.days % 365
+        if box_fill:
+            left, top, right, bottom = draw.multiline_textbbox(
+                center, text, font=font, anchor='mm', align='center', spacing=spacing)
+            pad = pad_points * self.dpi / 72
+            box = (int(left - pad), int(top - pad), int(math.ceil(right + pad)), int(math.ceil(bottom + pad)))
+            
+            # Полупрозрачная рамка, как bbox(alpha=0.8) в matplotlib
+            overlay = Image.new('RGBA', (box[2] - box[0] + 1, box[3] - box[1] + 1), (0, 0, 0, 0))
+            ImageDraw.Draw(overlay).rounded_rectangle(
+                (0, 0, overlay.width - 1, overlay.height - 1), radius=pad,
+                fill=_with_alpha(box_fill, 0.8), outline=_with_alpha(box_edge, 0.8))
+            image.alpha_composite(overlay, dest=(box[0], box[1]))
         
-        # Примерный расчет месяцев (не очень точный, но простой)
-        months = remaining_days // 30
-        days = remaining_days % 30
+        draw.multiline_text(center, text, font=font, fill=color, anchor='mm',
+                            align='center', spacing=spacing)
+    
+    def get_week_info(self, birth_date, profile=None, today=None):
+        """Возвращает информацию о текущей неделе"""
+        profile = profile or self.profile
+        lived = self.calculate_weeks_lived(birth_date, today)
+        current_age = lived // self.weeks_per_year
+        current_week_in_year = lived % self.weeks_per_year
         
         return {
-            'years': years,
-            'months': months,
-            'days': days,
-            'total_days': delta.days,
-            'total_weeks': self.calculate_weeks_lived(birth_date)
+            'total_weeks': lived,
+            'age_years': current_age,
+            'week_in_year': current_week_in_year,
+            'weeks_remaining': (profile.life_expectancy_years * self.weeks_per_year) - lived,
+            'gender': profile.gender,
+            'life_expectancy': profile.life_expectancy_years
         }
     
-    def get_life_percentage(self, birth_date):
+    def calculate_age(self, birth_date, today=None):
+        """Вычисляет точный возраст в годах, месяцах и днях с учетом високосных лет"""
+        return calendar_math.exact_age(birth_date, today or date.today())._asdict()
+    
+    def get_life_percentage(self, birth_date, profile=None, today=None):
         """Вычисляет процент прожитой жизни"""
-        weeks_lived = self.calculate_weeks_lived(birth_date)
-        total_weeks = self.life_expectancy_years * self.weeks_per_year
-        percentage = (weeks_lived / total_weeks) * 100
+        profile = profile or self.profile
+        lived = self.calculate_weeks_lived(birth_date, today)
+        total_weeks = profile.life_expectancy_years * self.weeks_per_year
+        percentage = (lived / total_weeks) * 100
         
         return {
             'percentage': round(percentage, 2),
-            'weeks_lived': weeks_lived,
+            'weeks_lived': lived,
             'total_weeks': total_weeks,
-            'weeks_remaining': total_weeks - weeks_lived
+            'weeks_remaining': total_weeks - lived
         }
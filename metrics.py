@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Prometheus-style metrics: counters, gauges and histograms in the text exposition format
+"""
+
+import bisect
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Границы по умолчанию: от 5 мс до 30 с
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _REGISTRY.append(self)
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _default(self):
+        """Child for a metric without labels"""
+        return self.labels()
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._child_lines(values, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _child_lines(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time"""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def _child_lines(self, values, child):
+        try:
+            value = child.get()
+        except Exception as e:
+            logger.error(f"❌ Failed to read gauge {self.name}: {e}")
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _child_lines(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts + [child.count - sum(child.counts)]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+def generate_latest():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+# Метрики бота
+HANDLER_DURATION = Histogram('bot_handler_duration_seconds', 'Time spent in a command handler', ['handler'])
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Handler calls that raised an exception', ['handler'])
+RENDER_PHASE_DURATION = Histogram('bot_render_phase_seconds', 'Render time by phase (layout, rasterize, encode)',
+                                  ['engine', 'phase'])
+RENDER_CACHE_REQUESTS = Counter('bot_render_cache_requests_total', 'Render cache lookups', ['result'])
+RENDER_CACHE_HIT_RATIO = Gauge('bot_render_cache_hit_ratio', 'Share of render cache lookups served from cache')
+RENDER_POOL_PENDING = Gauge('bot_render_pool_pending', 'Renders running or queued in the render pool')
+RENDER_POOL_SATURATED = Gauge('bot_render_pool_saturated', '1 while the render pool rejects new renders')
+FILE_ID_REQUESTS = Counter('bot_file_id_requests_total', 'Uploaded file_id lookups before sending a photo',
+                           ['result'])
+RESPONSE_MEMO_REQUESTS = Counter('bot_response_memo_requests_total', 'Memoized text command reply lookups',
+                                 ['name', 'result'])
+TELEGRAM_REQUEST_DURATION = Histogram('bot_telegram_request_seconds', 'Bot API call latency', ['method'])
+TELEGRAM_REQUEST_ERRORS = Counter('bot_telegram_request_errors_total', 'Failed Bot API calls', ['method', 'error'])
+SCHEDULER_JOB_DURATION = Histogram('bot_scheduler_job_seconds', 'Scheduled job duration', ['job'],
+                                   buckets=(1, 5, 15, 60, 300, 900, 1800, 3600, 7200))
+SCHEDULER_JOB_FAILURES = Counter('bot_scheduler_job_failures_total', 'Scheduled jobs that failed', ['job'])
+
+
+def track_handler(handler):
+    """Wrap a PTB handler callback to record its latency and errors under its function name"""
+    name = handler.__name__
+    duration = HANDLER_DURATION.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def observe_render_timings(engine, timings):
+    """Record phase timings returned by LifeVisualizer.render_grid"""
+    for phase, seconds in timings.items():
+        RENDER_PHASE_DURATION.labels(engine, phase).observe(seconds)
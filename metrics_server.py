@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Local HTTP endpoint with metrics and liveness/readiness probes
+"""
+
+import logging
+import time
+from aiohttp import web
+from metrics import generate_latest
+from config import METRICS_LISTEN, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    """Local HTTP endpoint with /metrics and liveness/readiness probes"""
+
+    def __init__(self, readiness=None, listen=METRICS_LISTEN, port=METRICS_PORT):
+        self.readiness = readiness  # () -> dict проверок {name: bool}
+        self.listen = listen
+        self.port = port
+        self.started = time.monotonic()
+        self._runner = None
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.router.add_get('/health/live', self.handle_live)
+        app.router.add_get('/health/ready', self.handle_ready)
+        return app
+
+    async def handle_metrics(self, request):
+        return web.Response(text=generate_latest(), content_type='text/plain', charset='utf-8')
+
+    async def handle_live(self, request):
+        # Раз цикл событий успел ответить, процесс жив
+        return web.json_response({'status': 'ok', 'uptime_seconds': round(time.monotonic() - self.started, 1)})
+
+    async def handle_ready(self, request):
+        checks = self.readiness() if self.readiness else {}
+        ready = all(checks.values())
+        return web.json_response({'status': 'ok' if ready else 'not ready', 'checks': checks},
+                                 status=200 if ready else 503)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"📈 Metrics available at http://{self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
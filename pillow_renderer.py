@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Rendering backend that draws the life calendar with Pillow and NumPy only, without matplotlib
+"""
+
+import time
+from collections import namedtuple
+from datetime import date
+import numpy as np
+from PIL import Image
+from config import (GRID_COLUMNS, RASTER_CELL_WIDTH, RASTER_CELL_HEIGHT, TEXT_COLOR, LIFE_EXPECTANCY_YEARS_MALE,
+                    LIFE_EXPECTANCY_YEARS_FEMALE, LIFE_EXPECTANCY_YEARS_DEFAULT)
+from life_visualizer import TextStyle, STATS_STYLE, FOOTER_STYLE
+
+# Отступы макета в пикселях
+MARGIN = 20        # от края картинки
+LABEL_GAP = 12     # между подписью оси и сеткой
+SECTION_GAP = 16   # между блоками текста
+
+TITLE_STYLE = TextStyle('bold', 18, TEXT_COLOR, None, None, 0)
+AXIS_STYLE = TextStyle('bold', 14, TEXT_COLOR, None, None, 0)
+LEGEND_STYLE = TextStyle('normal', 10, TEXT_COLOR, '#e9ecef', '#ced4da', 0.5 * 10)
+SIGNATURE_STYLE = TextStyle('italic', 9, TEXT_COLOR, '#f1f3f4', '#dadce0', 0.3 * 9)
+
+AGE_TEXT = 'AGE\nВОЗРАСТ'
+AXIS_TEXT = 'WEEK OF THE YEAR'
+LEGEND_TEXT = "Red squares = Weeks lived\nWhite squares = Weeks remaining"
+SIGNATURE_TEXT = "Get this visualization every week: @lifetime_bot"
+
+# Положение частей картинки для одной продолжительности жизни, в пикселях
+PageLayout = namedtuple('PageLayout', [
+    'size',              # (width, height)
+    'grid_box',          # (left, top, right, bottom) сетки
+    'title_center',
+    'age_center',        # центр повернутой подписи оси возраста
+    'axis_center',
+    'legend_center',
+    'signature_center',
+    'stats_center',
+    'footer_center'
+])
+
+# Заранее нарисованная картинка для одной продолжительности жизни
+PillowLayout = namedtuple('PillowLayout', [
+    'page',       # PageLayout
+    'base',       # RGBA-массив: пустая сетка и все неизменные надписи
+    'full_grid'   # RGBA-массив области сетки, где все недели прожиты
+])
+
+
+def title_text(grid_rows):
+    return f'A {grid_rows}-YEAR HUMAN LIFE IN WEEKS'
+
+
+def measure_layout(visualizer, grid_rows):
+    """Размечает картинку сверху вниз: заголовок, сетка, подпись оси, статистика с легендой, подписи"""
+    def place(top, text, style):
+        # Центр текста, который начинается на высоте top, и низ этого текста
+        height = visualizer._text_box_size(text, style)[1]
+        return top + height / 2, top + height
+
+    grid_width = GRID_COLUMNS * RASTER_CELL_WIDTH
+    grid_height = grid_rows * RASTER_CELL_HEIGHT
+    # Подпись оси повернута: ее высота становится шириной
+    age_width = visualizer._text_box_size(AGE_TEXT, AXIS_STYLE)[1]
+    x0 = MARGIN + age_width + LABEL_GAP
+    center_x = x0 + grid_width / 2
+
+    title_y, y = place(MARGIN, title_text(grid_rows), TITLE_STYLE)
+    y0 = int(y) + SECTION_GAP
+    axis_y, y = place(y0 + grid_height + LABEL_GAP, AXIS_TEXT, AXIS_STYLE)
+    # Высота блоков статистики и подписи не зависит от чисел и даты в них - меряем по любому тексту
+    boxes_height = max(visualizer._text_box_size(visualizer._format_stats_text(0, grid_rows), STATS_STYLE)[1],
+                       visualizer._text_box_size(LEGEND_TEXT, LEGEND_STYLE)[1])
+    boxes_y = y + SECTION_GAP + boxes_height / 2
+    signature_y, y = place(boxes_y + boxes_height / 2 + SECTION_GAP, SIGNATURE_TEXT, SIGNATURE_STYLE)
+    footer_y, y = place(y + SECTION_GAP, visualizer._format_footer_text(date(2000, 1, 3)), FOOTER_STYLE)
+
+    return PageLayout(
+        size=(2 * x0 + grid_width, int(y) + MARGIN),
+        grid_box=(x0, y0, x0 + grid_width, y0 + grid_height),
+        title_center=(center_x, title_y),
+        age_center=(MARGIN + age_width / 2, y0 + grid_height / 2),
+        axis_center=(center_x, axis_y),
+        legend_center=(x0 + 3 * grid_width / 4, boxes_y),
+        signature_center=(center_x, signature_y),
+        stats_center=(x0 + grid_width / 4, boxes_y),
+        footer_center=(center_x, footer_y)
+    )
+
+
+class PillowBackend:
+    """Движок pillow: сетка клетками ровно RASTER_CELL_WIDTH x RASTER_CELL_HEIGHT пикселей,
+    надписи - тем же шрифтом DejaVu Sans, что и у matplotlib"""
+
+    def __init__(self, visualizer):
+        self.visualizer = visualizer
+        self._layouts = {}
+
+    def warm_up(self, engine):
+        """Строит макеты для всех вариантов продолжительности жизни"""
+        for life_expectancy in (LIFE_EXPECTANCY_YEARS_MALE,
+                                LIFE_EXPECTANCY_YEARS_FEMALE,
+                                LIFE_EXPECTANCY_YEARS_DEFAULT):
+            self._get_layout(life_expectancy)
+
+    def draw(self, key, timings):
+        """Копирует готовый макет, закрашивает прожитые недели и дописывает статистику"""
+        started = time.perf_counter()
+        visualizer = self.visualizer
+        layout = self._get_layout(key.life_expectancy)
+        pixels = layout.base.copy()
+        x0, y0 = layout.page.grid_box[:2]
+
+        # Клетки выровнены по пикселям: прожитые недели - это целые строки и начало следующей
+        weeks_lived = min(key.weeks_lived, key.life_expectancy * GRID_COLUMNS)
+        full_rows, partial = divmod(weeks_lived, GRID_COLUMNS)
+        laid_out = time.perf_counter()
+        lived_height = full_rows * RASTER_CELL_HEIGHT
+        pixels[y0:y0 + lived_height, x0:x0 + layout.full_grid.shape[1]] = layout.full_grid[:lived_height]
+        if partial:
+            row_end = lived_height + RASTER_CELL_HEIGHT
+            lived_width = partial * RASTER_CELL_WIDTH
+            pixels[y0 + lived_height:y0 + row_end, x0:x0 + lived_width] = \
+                layout.full_grid[lived_height:row_end, :lived_width]
+        image = Image.fromarray(pixels, 'RGBA')
+
+        visualizer._draw_stats_and_footer(image, key, layout.page.stats_center, layout.page.footer_center)
+        timings['layout'] = laid_out - started
+        timings['rasterize'] = time.perf_counter() - laid_out
+        return image
+
+    def _get_layout(self, life_expectancy):
+        layout = self._layouts.get(life_expectancy)
+        if layout is None:
+            layout = self._layouts[life_expectancy] = self._build_layout(life_expectancy)
+        return layout
+
+    def _build_layout(self, grid_rows):
+        """Рисует все, что не зависит от пользователя"""
+        visualizer = self.visualizer
+        page = measure_layout(visualizer, grid_rows)
+        x0, y0, x1, y1 = page.grid_box
+
+        image = Image.new('RGBA', page.size, 'white')
+        image.paste(Image.fromarray(visualizer._build_grid_pixels(0, grid_rows, x1 - x0, y1 - y0)), (x0, y0))
+        visualizer._draw_styled_text(image, page.title_center, title_text(grid_rows), TITLE_STYLE)
+        visualizer._draw_styled_text(image, page.axis_center, AXIS_TEXT, AXIS_STYLE)
+        visualizer._draw_styled_text(image, page.legend_center, LEGEND_TEXT, LEGEND_STYLE)
+        visualizer._draw_styled_text(image, page.signature_center, SIGNATURE_TEXT, SIGNATURE_STYLE)
+
+        # Повернутую подпись рисуем отдельно и поворачиваем на 90 градусов против часовой стрелки
+        label_width, label_height = visualizer._text_box_size(AGE_TEXT, AXIS_STYLE)
+        label = Image.new('RGBA', (label_width, label_height), 'white')
+        visualizer._draw_styled_text(label, (label_width / 2, label_height / 2), AGE_TEXT, AXIS_STYLE)
+        label = label.rotate(90, expand=True)
+        age_x, age_y = page.age_center
+        image.paste(label, (int(age_x - label.width / 2), int(age_y - label.height / 2)))
+
+        full_grid = np.asarray(Image.fromarray(
+            visualizer._build_grid_pixels(grid_rows * GRID_COLUMNS, grid_rows, x1 - x0, y1 - y0)
+        ).convert('RGBA'))
+        return PillowLayout(page=page, base=np.asarray(image).copy(), full_grid=full_grid)
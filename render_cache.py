@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for rendered life calendars
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from metrics import RENDER_CACHE_REQUESTS
+from config import (RENDER_CACHE_MAX_BYTES, RENDER_CACHE_DIR, RENDER_CACHE_DISK_MAX_BYTES,
+                    RENDER_CACHE_EVICT_EVERY_BYTES)
+
+logger = logging.getLogger(__name__)
+
+
+def render_key_digest(key):
+    """Stable hash of a render key, used as the disk file name"""
+    return hashlib.sha1(repr(tuple(key)).encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """Memory LRU in front of an optional disk tier.
+
+    get() and put() touch the disk synchronously and suit scripts; get_or_render() is what
+    handlers use: it reads and writes the disk tier in a thread so the event loop never waits
+    on file I/O. The disk tier is scanned for eviction once per evict_every bytes written, so it
+    may exceed disk_max_bytes by up to that much between scans.
+    """
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES, disk_dir=RENDER_CACHE_DIR,
+                 disk_max_bytes=RENDER_CACHE_DISK_MAX_BYTES, evict_every=RENDER_CACHE_EVICT_EVERY_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self.evict_every = evict_every
+        self._written_since_evict = 0
+        self._memory = OrderedDict()  # digest -> bytes, в порядке использования
+        self._memory_bytes = 0
+        self._in_flight = {}  # digest -> Future, чтобы не рендерить одно и то же дважды
+        self.hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, digest):
+        # Формат зависит от пресета в ключе, поэтому расширение нейтральное
+        return os.path.join(self.disk_dir, f"{digest}.img")
+
+    def _remember(self, digest, data):
+        """Put data into the memory tier and evict least recently used entries"""
+        if digest in self._memory:
+            self._memory_bytes -= len(self._memory.pop(digest))
+        if len(data) > self.max_bytes:
+            return
+
+        self._memory[digest] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, digest):
+        path = self._disk_path(digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # отмечаем использование для вытеснения по давности
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, digest, data, evict=True):
+        path = self._disk_path(digest)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"❌ Failed to write render cache file: {e}")
+            return
+        if evict:
+            self._written_since_evict += len(data)
+            if self._written_since_evict >= self.evict_every:
+                self.evict_disk()
+
+    def evict_disk(self):
+        """Remove the oldest files until the disk tier fits its size limit"""
+        self._written_since_evict = 0
+        entries = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.img'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # файл удалил другой процесс
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+    def _get_memory(self, digest):
+        data = self._memory.get(digest)
+        if data is not None:
+            self._memory.move_to_end(digest)
+        return data
+
+    def get(self, key):
+        """Return cached image bytes for the key or None"""
+        digest = render_key_digest(key)
+        data = self._get_memory(digest)
+        if data is None and self.disk_dir:
+            data = self._read_disk(digest)
+            if data is not None:
+                self._remember(digest, data)
+        return data
+
+    def on_disk(self, key):
+        """True if the disk tier already holds the key"""
+        return bool(self.disk_dir) and os.path.exists(self._disk_path(render_key_digest(key)))
+
+    def put(self, key, data, evict=True):
+        """Store image bytes for the key in every tier.
+
+        Bulk writers pass evict=False and call evict_disk() once at the end: eviction scans the whole directory.
+        """
+        digest = render_key_digest(key)
+        self._remember(digest, data)
+        if self.disk_dir:
+            self._write_disk(digest, data, evict)
+
+    def _count(self, result):
+        """'hit' and 'shared' (joined an in-flight render) both avoid a render"""
+        if result == 'miss':
+            self.misses += 1
+        else:
+            self.hits += 1
+        RENDER_CACHE_REQUESTS.labels(result).inc()
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get_or_render(self, key, render):
+        """Return cached bytes or await render(key) once for concurrent callers"""
+        digest = render_key_digest(key)
+        data = self._get_memory(digest)
+        if data is not None:
+            self._count('hit')
+            return data
+
+        in_flight = self._in_flight.get(digest)
+        if in_flight is not None:
+            self._count('shared')
+            return await asyncio.shield(in_flight)
+
+        # Чтение диска тоже идет под общим future: параллельные запросы не читают файл повторно
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[digest] = future
+        try:
+            if self.disk_dir:
+                data = await asyncio.to_thread(self._read_disk, digest)
+            if data is not None:
+                self._count('hit')
+                self._remember(digest, data)
+                future.set_result(data)
+                return data
+
+            self._count('miss')
+            data = await render(key)
+            self._remember(digest, data)
+            future.set_result(data)
+            if self.disk_dir:
+                await asyncio.to_thread(self._write_disk, digest, data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if future.done():
+                raise
+            future.set_exception(e)
+            # Ошибку уже передали ожидающим; не даем asyncio ругаться на непрочитанное исключение
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[digest]
+
+    def get_status(self):
+        """Get cache statistics"""
+        return {
+            'entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hit_ratio, 4)
+        }
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Process pool for rendering life calendars off the asyncio event loop
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from metrics import observe_render_timings
+from config import RENDER_WORKERS, RENDER_QUEUE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Визуализатор внутри процесса-воркера
+_worker_visualizer = None
+
+
+class RenderPoolBusy(Exception):
+    """Raised when the render queue is full and a request must be rejected"""
+
+
+def _init_worker():
+    """Preload the render engine (layouts, templates, fonts) so the first render is not slower"""
+    global _worker_visualizer
+    from life_visualizer import LifeVisualizer
+
+    _worker_visualizer = LifeVisualizer()
+    _worker_visualizer.warm_up()
+
+
+def _render_grid(key):
+    """Render a life grid for a render key inside a worker process; returns PNG bytes and phase timings"""
+    global _worker_visualizer
+    from life_visualizer import LifeVisualizer
+
+    if _worker_visualizer is None:
+        _worker_visualizer = LifeVisualizer()
+    timings = {}
+    png_bytes = _worker_visualizer.render_grid(key, timings)
+    return png_bytes, timings
+
+
+def _ping():
+    return True
+
+
+class RenderPool:
+    def __init__(self, workers=RENDER_WORKERS, queue_limit=RENDER_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._executor = None
+        self._capacity_freed = None  # asyncio.Event, создается в цикле событий при первом ожидании
+
+    def _get_executor(self):
+        """Create the executor on first use (matplotlib is not thread-safe, so processes)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            logger.info(f"🎨 Render pool started with {self.workers} workers")
+        return self._executor
+
+    @property
+    def saturated(self):
+        """True when every worker is busy and the queue is full"""
+        return self.pending >= self.workers + self.queue_limit
+
+    async def wait_for_capacity(self):
+        """Wait until a render can be submitted without RenderPoolBusy"""
+        while self.saturated:
+            if self._capacity_freed is None:
+                self._capacity_freed = asyncio.Event()
+            self._capacity_freed.clear()
+            await self._capacity_freed.wait()
+
+    async def _submit(self, func, *args):
+        if self.saturated:
+            raise RenderPoolBusy(f"Render queue is full ({self.pending} pending)")
+
+        self.pending += 1
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # Воркер упал - пересоздадим пул при следующем запросе. Остальные запросы к тому же пулу
+            # получат ту же ошибку: новый пул, созданный после первой из них, не трогаем
+            if self._executor is executor:
+                logger.error("❌ Render pool is broken, restarting on next request")
+                # Оставшиеся процессы и очередь сломанного пула иначе живут до выхода бота
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            raise
+        finally:
+            self.pending -= 1
+            if self._capacity_freed is not None:
+                self._capacity_freed.set()
+
+    async def warm_up(self):
+        """Start all worker processes ahead of the first /show"""
+        await asyncio.gather(*(self._submit(_ping) for _ in range(self.workers)))
+
+    async def render_grid(self, key):
+        """Render a life grid for a render key in the pool and return PNG bytes"""
+        png_bytes, timings = await self._submit(_render_grid, key)
+        # Метрики живут в главном процессе, поэтому время фаз возвращается из воркера
+        observe_render_timings(key.engine, timings)
+        return png_bytes
+
+    def get_status(self):
+        """Get current pool load"""
+        return {
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'pending': self.pending,
+            'saturated': self.saturated
+        }
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("🛑 Render pool stopped")
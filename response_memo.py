@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Per-user memo of text command replies and the stats behind them, valid until local midnight
+"""
+
+from collections import OrderedDict
+from metrics import RESPONSE_MEMO_REQUESTS
+from config import RESPONSE_MEMO_MAX_USERS
+
+
+class ResponseMemo:
+    """Values keyed by (user_id, name) for one calendar day.
+
+    Everything /week, /age and /percentage show depends only on the user's settings and today's
+    date, so an entry stays valid until midnight (the bot's local date, the same one the commands
+    count with) or until the user changes the birth date or gender and the entry is invalidated.
+    On the first lookup of a new day the whole memo is dropped at once.
+    """
+
+    def __init__(self, max_users=RESPONSE_MEMO_MAX_USERS):
+        self.max_users = max_users
+        self._day = None
+        self._users = OrderedDict()  # user_id -> {name: value}, в порядке использования
+        self.hits = 0
+        self.misses = 0
+
+    def _roll(self, today):
+        if today != self._day:
+            self._users.clear()
+            self._day = today
+
+    def get(self, user_id, name, today):
+        self._roll(today)
+        values = self._users.get(user_id)
+        value = values.get(name) if values else None
+        if value is not None:
+            self._users.move_to_end(user_id)
+        return value
+
+    def put(self, user_id, name, today, value):
+        self._roll(today)
+        values = self._users.get(user_id)
+        if values is None:
+            values = self._users[user_id] = {}
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        values[name] = value
+
+    def get_or_build(self, user_id, name, today, build):
+        """Return the memoized value or build() it once for the day"""
+        value = self.get(user_id, name, today)
+        if value is None:
+            self.misses += 1
+            RESPONSE_MEMO_REQUESTS.labels(name, 'miss').inc()
+            value = build()
+            self.put(user_id, name, today, value)
+        else:
+            self.hits += 1
+            RESPONSE_MEMO_REQUESTS.labels(name, 'hit').inc()
+        return value
+
+    def invalidate(self, user_id):
+        """Forget everything memoized for a user whose settings changed"""
+        self._users.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._users)
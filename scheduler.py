@@ -3,101 +3,306 @@
 Scheduler module for automatic weekly reports
 """
 
+import asyncio
+import heapq
 import logging
-from datetime import datetime, time
+import time
+from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import pytz
-from telegram import Bot
-from telegram.error import TelegramError
-from life_visualizer import LifeVisualizer
-import os
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from job_store import SQLiteJobStore
+from broadcast import SendRateLimiter, WeeklyBroadcast
+from channels import build_report, next_fire_time
+from metrics import SCHEDULER_JOB_DURATION, SCHEDULER_JOB_FAILURES
+from config import (SCHEDULER_DB_PATH, SCHEDULER_MISFIRE_GRACE, SCHEDULER_COALESCE, SCHEDULER_CATCH_UP,
+                    CHANNEL_SYNC_INTERVAL, CHANNEL_RETRY_DELAY, BROADCAST_CONCURRENCY)
 
 logger = logging.getLogger(__name__)
 
+# Portugal uses Europe/Lisbon timezone
+REPORT_TIMEZONE = pytz.timezone('Europe/Lisbon')
+JOB_ID = 'weekly_report'
+CLEANUP_JOB_ID = 'file_id_cleanup'
+
+# Задача хранится в базе как ссылка на функцию модуля, а функция находит планировщик этого процесса
+_active_scheduler = None
+
+
+async def run_weekly_report():
+    """Job function kept in the job store; runs the report of this process's scheduler"""
+    if _active_scheduler is None:
+        logger.warning("⚠️ Weekly report fired without an active scheduler")
+        return
+    await _active_scheduler.send_weekly_report()
+
+
+async def run_file_id_cleanup():
+    """Job function kept in the job store; prunes old weeks from the file_id index"""
+    if _active_scheduler is not None:
+        _active_scheduler.prune_file_ids()
+
+
+def report_week_start(now=None):
+    """Monday (Lisbon date) of the latest scheduled run, the week a report belongs to"""
+    now = (now or datetime.now(REPORT_TIMEZONE)).astimezone(REPORT_TIMEZONE)
+    return now.date() - timedelta(days=now.weekday())
+
+
+class ChannelDispatcher:
+    """Sends every registered channel its report from one heap of (fire time, chat_id, due).
+
+    Memory is one small tuple per channel whatever the schedules are. Channels added or changed
+    by other processes are picked up every CHANNEL_SYNC_INTERVAL seconds; stale heap entries
+    are skipped when they come up, because they no longer match the channel's next_run.
+    """
+
+    def __init__(self, bot, channels, limiter=None, concurrency=BROADCAST_CONCURRENCY):
+        self.bot = bot
+        self.channels = channels  # ChannelRegistry
+        self.limiter = limiter or SendRateLimiter()
+        self.concurrency = concurrency
+        self._heap = []
+        self._wakeup = None
+        self._slots = None
+        self._synced_at = 0
+        self._task = None
+        self._sends = set()
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._synced_at = time.time()
+        self._heap = [(next_run, chat_id, next_run) for next_run, chat_id in self.channels.next_runs()]
+        heapq.heapify(self._heap)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"📡 Channel dispatcher started with {len(self._heap)} channels")
+
+    def stop(self):
+        for task in (self._task, *self._sends):
+            if task:
+                task.cancel()
+        self._task = None
+
+    def schedule(self, channel):
+        """Pick up a channel added or changed in this process without waiting for the sync"""
+        if channel.next_run is not None:
+            heapq.heappush(self._heap, (channel.next_run, channel.chat_id, channel.next_run))
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _sync(self):
+        changed_since, self._synced_at = self._synced_at - 1, time.time()
+        for next_run, chat_id in self.channels.next_runs(changed_since):
+            heapq.heappush(self._heap, (next_run, chat_id, next_run))
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            if now - self._synced_at >= CHANNEL_SYNC_INTERVAL:
+                self._sync()
+            while self._heap and self._heap[0][0] <= now:
+                # Не больше concurrency отправок сразу: в понедельник 00:00 срабатывают тысячи каналов
+                await self._slots.acquire()
+                _, chat_id, due = heapq.heappop(self._heap)
+                if not self._fire(chat_id, due):
+                    self._slots.release()
+
+            timeout = self._synced_at + CHANNEL_SYNC_INTERVAL - now
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def _fire(self, chat_id, due):
+        """Claim one run of a channel and start sending it; False if there is nothing to send"""
+        channel = self.channels.get(chat_id)
+        if channel is None or channel.next_run != due:
+            return False  # канал удален или перенесен - актуальная запись уже в куче
+        now = time.time()
+        # Следующий запуск считается от текущего времени: несколько пропущенных запусков дают один отчет
+        next_run = next_fire_time(channel.schedule, channel.timezone, max(now, due))
+        if not self.channels.claim(chat_id, due, next_run):
+            return False
+        if next_run is not None:
+            heapq.heappush(self._heap, (next_run, chat_id, next_run))
+
+        late = now - due
+        if late > SCHEDULER_MISFIRE_GRACE:
+            if not SCHEDULER_CATCH_UP:
+                logger.warning(f"⚠️ Report for channel {chat_id} missed by {late:.0f}s, skipping")
+                return False
+            logger.info(f"⏪ Catching up on the report for channel {chat_id}")
+
+        task = asyncio.get_running_loop().create_task(self._send(channel, due, next_run))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+        return True
+
+    async def _send(self, channel, due, next_run):
+        started = time.perf_counter()
+        try:
+            await self.limiter.acquire(channel.chat_id)
+            await self.bot.send_message(chat_id=channel.chat_id, text=build_report(channel), parse_mode='Markdown')
+            logger.info(f"✅ {channel.report} report sent to channel {channel.chat_id}")
+        except (BadRequest, Forbidden) as e:
+            # Бота убрали из канала или лишили прав - повтор не поможет
+            SCHEDULER_JOB_FAILURES.labels('channel_report').inc()
+            logger.error(f"❌ Channel {channel.chat_id} rejected the report: {e}")
+        except Exception as e:
+            SCHEDULER_JOB_FAILURES.labels('channel_report').inc()
+            delay = CHANNEL_RETRY_DELAY
+            if isinstance(e, RetryAfter):
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            retry_at = time.time() + delay
+            # Возвращаем запуск каналу и повторяем, пока не вышли за SCHEDULER_MISFIRE_GRACE
+            if retry_at - due < SCHEDULER_MISFIRE_GRACE and self.channels.claim(channel.chat_id, next_run, due):
+                logger.warning(f"⚠️ Report to channel {channel.chat_id} failed, retrying in {delay:.0f}s: {e}")
+                heapq.heappush(self._heap, (retry_at, channel.chat_id, due))
+                self._wakeup.set()
+            else:
+                logger.error(f"❌ Report to channel {channel.chat_id} failed: {e}")
+        finally:
+            self._slots.release()
+            SCHEDULER_JOB_DURATION.labels('channel_report').observe(time.perf_counter() - started)
+
+
 class WeeklyReportScheduler:
-    def __init__(self, bot_token, channel_id=None):
-        self.bot_token = bot_token
-        self.channel_id = channel_id
-        self.scheduler = AsyncIOScheduler()
-        self.visualizer = LifeVisualizer()
+    """Weekly personal calendars through an APScheduler job, channel reports through ChannelDispatcher"""
+
+    def __init__(self, bot, broadcast=None, channels=None, file_ids=None, db_path=SCHEDULER_DB_PATH):
+        self.bot = bot              # бот Application: отчеты идут через его пул соединений
+        self.broadcast = broadcast  # WeeklyBroadcast with personal calendars, optional
+        self.channels = channels    # ChannelRegistry, optional
+        self.file_ids = file_ids    # FileIdIndex, чистится раз в неделю и при старте, optional
+        self.dispatcher = ChannelDispatcher(bot, channels) if channels else None
+        self.scheduler = AsyncIOScheduler(
+            jobstores={'default': SQLiteJobStore(db_path)},
+            job_defaults={'misfire_grace_time': SCHEDULER_MISFIRE_GRACE, 'coalesce': SCHEDULER_COALESCE},
+            timezone=REPORT_TIMEZONE
+        )
+        self.missed_run = None  # время пропущенного запуска, найденного при старте
+        self._catch_up_task = None
         
     def start_scheduler(self):
-        """Start the scheduler with weekly report job"""
+        """Start the weekly broadcast job and the channel dispatcher"""
+        global _active_scheduler
         try:
-            # Configure job to run every Monday at 00:00 (midnight) Portugal time
-            # Portugal uses Europe/Lisbon timezone
-            portugal_tz = pytz.timezone('Europe/Lisbon')
+            # Every Monday at 00:00 (midnight) Portugal time
+            trigger = CronTrigger(day_of_week='mon', hour=0, minute=0, timezone=REPORT_TIMEZONE)
             
-            # Add weekly report job - every Monday at 00:00 Portugal time
-            self.scheduler.add_job(
-                func=self.send_weekly_report,
-                trigger=CronTrigger(
-                    day_of_week='mon',
-                    hour=0,
-                    minute=0,
-                    timezone=portugal_tz
-                ),
-                id='weekly_report',
-                name='Weekly Life Calendar Report',
-                replace_existing=True
-            )
+            # На паузе задачи не запускаются, пока мы сверяем сохраненную задачу с расписанием
+            self.scheduler.start(paused=True)
+            _active_scheduler = self
+            
+            job = self.scheduler.get_job(JOB_ID)
+            if not self.broadcast:
+                if job:
+                    self.scheduler.remove_job(JOB_ID)
+            elif job is None or str(job.trigger) != str(trigger):
+                self.scheduler.add_job(
+                    func=run_weekly_report,
+                    trigger=trigger,
+                    id=JOB_ID,
+                    name='Weekly Life Calendar Report',
+                    replace_existing=True
+                )
+            else:
+                # Сохраненная задача сохраняет время следующего запуска - пропущенный запуск не теряется
+                if job.next_run_time and job.next_run_time <= datetime.now(REPORT_TIMEZONE):
+                    self.missed_run = job.next_run_time
+                    logger.warning(f"⚠️ Weekly report scheduled for {job.next_run_time} was missed")
+                job.modify(misfire_grace_time=SCHEDULER_MISFIRE_GRACE, coalesce=SCHEDULER_COALESCE)
+            
+            # /show и инлайн-режим добавляют file_id каждую неделю и без рассылки - чистка идет отдельной задачей
+            cleanup_trigger = CronTrigger(day_of_week='mon', hour=3, minute=0, timezone=REPORT_TIMEZONE)
+            cleanup_job = self.scheduler.get_job(CLEANUP_JOB_ID)
+            if not self.file_ids:
+                if cleanup_job:
+                    self.scheduler.remove_job(CLEANUP_JOB_ID)
+            elif cleanup_job is None or str(cleanup_job.trigger) != str(cleanup_trigger):
+                self.scheduler.add_job(
+                    func=run_file_id_cleanup,
+                    trigger=cleanup_trigger,
+                    id=CLEANUP_JOB_ID,
+                    name='File id cleanup',
+                    replace_existing=True
+                )
+            if self.file_ids:
+                self.prune_file_ids()
             
-            # Start the scheduler
-            self.scheduler.start()
+            self.scheduler.resume()
             logger.info("✅ Weekly report scheduler started successfully")
-            logger.info("📅 Reports will be sent every Monday at 00:00 Portugal time")
+            if self.broadcast:
+                logger.info("📅 Personal calendars will be sent every Monday at 00:00 Portugal time")
+            
+            # Пропущенные отчеты каналов диспетчер отправляет сам: их время уже в прошлом
+            if self.dispatcher:
+                self.dispatcher.start()
+            
+            if self._needs_catch_up():
+                self._catch_up_task = asyncio.get_running_loop().create_task(self.catch_up())
             
         except Exception as e:
             logger.error(f"❌ Failed to start scheduler: {e}")
     
-    async def send_weekly_report(self):
-        """Send weekly life calendar report to channel"""
+    def _needs_catch_up(self):
+        if not self.broadcast:
+            return False
+        # Лидер упал посреди рассылки - ее продолжают с контрольной точки даже без SCHEDULER_CATCH_UP
+        if self.broadcast.has_unfinished(report_week_start()):
+            return True
+        return SCHEDULER_CATCH_UP and bool(self.missed_run)
+    
+    async def catch_up(self):
+        """Send this week's calendars once if the run was missed (e.g. the bot was down on Monday)"""
+        week_start = report_week_start()
+        if not self.broadcast.is_finished(week_start):
+            logger.info(f"⏪ Catching up on the weekly report for {WeeklyBroadcast.current_broadcast_id(week_start)}")
+            await self.send_weekly_report(week_start)
+    
+    async def send_weekly_report(self, week_start=None):
+        """Send every registered user their own calendar"""
+        started = time.perf_counter()
+        week_start = week_start or report_week_start()
         try:
-            logger.info("🚀 Starting weekly report generation...")
-            
-            # Create bot instance
-            bot = Bot(token=self.bot_token)
-            
-            # Get current date for report
-            current_date = datetime.now()
-            current_week = current_date.isocalendar()[1]
-            current_year = current_date.year
-            
-            # Create report message
-            report_message = f"""📅 **Weekly Life Calendar Report**
-
-🗓️ **Week {current_week}, {current_year}**
-⏰ **Generated:** {current_date.strftime('%B %d, %Y at %H:%M')}
-🌍 **Time Zone:** Portugal (Europe/Lisbon)
-
-💡 **This week's reminder:**
-Every square represents one week of your life.
-Red squares = weeks you've lived
-White squares = weeks ahead of you
-
-🎯 **Use /start in the bot to see your personal calendar!**
-
-#LifeCalendar #WeeklyReminder #TimeManagement"""
-            
-            # Send text report
-            if self.channel_id:
-                await bot.send_message(
-                    chat_id=self.channel_id,
-                    text=report_message,
-                    parse_mode='Markdown'
-                )
-                logger.info(f"✅ Weekly report sent to channel {self.channel_id}")
-            else:
-                logger.warning("⚠️ No channel ID configured, skipping report send")
+            if self.broadcast:
+                logger.info(f"🚀 Starting weekly report for {WeeklyBroadcast.current_broadcast_id(week_start)}...")
+                await self.broadcast.run(self.bot, today=week_start)
             
         except TelegramError as e:
+            SCHEDULER_JOB_FAILURES.labels('weekly_report').inc()
             logger.error(f"❌ Telegram error sending weekly report: {e}")
         except Exception as e:
+            SCHEDULER_JOB_FAILURES.labels('weekly_report').inc()
             logger.error(f"❌ Unexpected error in weekly report: {e}")
+        finally:
+            SCHEDULER_JOB_DURATION.labels('weekly_report').observe(time.perf_counter() - started)
+    
+    def prune_file_ids(self):
+        """Drop file_ids of calendars older than FILE_ID_KEEP_WEEKS weeks"""
+        started = time.perf_counter()
+        try:
+            self.file_ids.prune(report_week_start())
+        except Exception as e:
+            SCHEDULER_JOB_FAILURES.labels('file_id_cleanup').inc()
+            logger.error(f"❌ Failed to prune file_ids: {e}")
+        finally:
+            SCHEDULER_JOB_DURATION.labels('file_id_cleanup').observe(time.perf_counter() - started)
     
     def stop_scheduler(self):
         """Stop the scheduler"""
+        global _active_scheduler
+        if self._catch_up_task:
+            self._catch_up_task.cancel()
+        if self.dispatcher:
+            self.dispatcher.stop()
+        if _active_scheduler is self:
+            _active_scheduler = None
         if self.scheduler.running:
             self.scheduler.shutdown()
             logger.info("🛑 Weekly report scheduler stopped")
@@ -110,14 +315,19 @@ White squares = weeks ahead of you
                 next_run = job.next_run_time
                 if next_run:
                     # Convert to Portugal timezone for display
-                    portugal_tz = pytz.timezone('Europe/Lisbon')
-                    next_run_pt = next_run.astimezone(portugal_tz)
+                    next_run_pt = next_run.astimezone(REPORT_TIMEZONE)
                     return next_run_pt
             return None
         except Exception as e:
             logger.error(f"❌ Error getting next run time: {e}")
             return None
     
+    def _next_channel_report(self):
+        upcoming = self.channels.channels(limit=1) if self.channels else []
+        if upcoming and upcoming[0].next_run:
+            return datetime.fromtimestamp(upcoming[0].next_run, REPORT_TIMEZONE)
+        return None
+    
     def get_scheduler_status(self):
         """Get current scheduler status"""
         try:
@@ -125,6 +335,8 @@ White squares = weeks ahead of you
                 'running': self.scheduler.running,
                 'next_run': self.get_next_run_time(),
                 'job_count': len(self.scheduler.get_jobs()),
+                'channels': len(self.channels) if self.channels else 0,
+                'next_channel_report': self._next_channel_report(),
                 'timezone': 'Europe/Lisbon (Portugal)',
                 'schedule': 'Every Monday at 00:00 (midnight)'
             }
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Persistent user storage with a read-through cache and batched writes
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date
+from config import (USER_STORE_BACKEND, USER_DB_PATH, USER_STORE_BATCH_SIZE, USER_STORE_FLUSH_INTERVAL,
+                    USER_STORE_MISS_TTL, USER_STORE_MISS_MAX)
+
+logger = logging.getLogger(__name__)
+
+User = namedtuple('User', ['user_id', 'birth_date', 'gender'])
+
+
+class MemoryBackend:
+    """Keeps users in a dict; nothing survives a restart"""
+
+    def __init__(self):
+        self._users = {}
+        self._settings = {}
+
+    def load_all(self):
+        return list(self._users.values())
+
+    def get(self, user_id):
+        return self._users.get(user_id)
+
+    def write_many(self, users):
+        for user in users:
+            self._users[user.user_id] = user
+
+    def get_setting(self, name):
+        return self._settings.get(name)
+
+    def set_setting(self, name, value):
+        self._settings[name] = value
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Stores users in SQLite in WAL mode, indexed by user_id"""
+
+    def __init__(self, path=USER_DB_PATH):
+        self.path = path
+        # timeout: в кластерном режиме в ту же базу пишут несколько процессов
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                birth_date TEXT,
+                gender TEXT NOT NULL DEFAULT 'default'
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    @staticmethod
+    def _to_user(row):
+        user_id, birth_date, gender = row
+        return User(user_id, date.fromisoformat(birth_date) if birth_date else None, gender)
+
+    def load_all(self):
+        rows = self._conn.execute("SELECT user_id, birth_date, gender FROM users")
+        return [self._to_user(row) for row in rows]
+
+    def get(self, user_id):
+        row = self._conn.execute(
+            "SELECT user_id, birth_date, gender FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return self._to_user(row) if row else None
+
+    def write_many(self, users):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO users (user_id, birth_date, gender) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET birth_date = excluded.birth_date, gender = excluded.gender",
+                [(u.user_id, u.birth_date.isoformat() if u.birth_date else None, u.gender) for u in users]
+            )
+
+    def get_setting(self, name):
+        row = self._conn.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, name, value):
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO settings (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, value)
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def create_backend(name=USER_STORE_BACKEND):
+    """Create a storage backend by its config name"""
+    if name == 'sqlite':
+        return SQLiteBackend()
+    if name == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown user store backend: {name}")
+
+
+class UserStore:
+    def __init__(self, backend=None, batch_size=USER_STORE_BATCH_SIZE,
+                 flush_interval=USER_STORE_FLUSH_INTERVAL, miss_ttl=USER_STORE_MISS_TTL,
+                 max_misses=USER_STORE_MISS_MAX):
+        self.backend = backend or create_backend()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.miss_ttl = miss_ttl
+        self.max_misses = max_misses
+        self._pending = {}  # user_id -> User, еще не записанные в backend
+        self._misses = OrderedDict()  # user_id -> когда забыть отсутствие; TTL общий, поэтому по порядку истечения
+
+        # Загружаем всех пользователей заранее, чтобы обработчики не ходили на диск
+        self._cache = {user.user_id: user for user in self.backend.load_all()}
+        logger.info(f"👥 Loaded {len(self._cache)} users from {type(self.backend).__name__}")
+
+    def get(self, user_id):
+        """Return the user record or None; O(1) from the in-process cache"""
+        user = self._cache.get(user_id)
+        if user is not None:
+            return user
+        expires = self._misses.get(user_id)
+        if expires is not None and expires > time.monotonic():
+            return None
+
+        # Пользователь мог появиться в базе из другого процесса
+        user = self.backend.get(user_id)
+        self._misses.pop(user_id, None)
+        if user is not None:
+            self._cache[user_id] = user
+        elif self.miss_ttl > 0:
+            # Отсутствие помним miss_ttl секунд, чтобы повторные запросы не читали базу
+            self._misses[user_id] = time.monotonic() + self.miss_ttl
+            while len(self._misses) > self.max_misses:
+                self._misses.popitem(last=False)
+        return user
+
+    def get_birth_date(self, user_id):
+        user = self.get(user_id)
+        return user.birth_date if user else None
+
+    def get_gender(self, user_id):
+        user = self.get(user_id)
+        return user.gender if user else 'default'
+
+    def set_birth_date(self, user_id, birth_date):
+        self._save(self._current(user_id)._replace(birth_date=birth_date))
+
+    def set_gender(self, user_id, gender):
+        self._save(self._current(user_id)._replace(gender=gender))
+
+    def _current(self, user_id):
+        return self.get(user_id) or User(user_id, None, 'default')
+
+    def _save(self, user):
+        self._misses.pop(user.user_id, None)
+        self._cache[user.user_id] = user
+        self._pending[user.user_id] = user
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def all_users(self):
+        """Return every user with a birth date, read from the backend.
+
+        Other processes of a cluster write their own users to the same database,
+        so the local cache alone is not the full list.
+        """
+        self.flush()
+        return [user for user in self.backend.load_all() if user.birth_date]
+
+    def get_setting(self, name):
+        """Bot-wide setting shared by all processes (e.g. the report channel), or None"""
+        return self.backend.get_setting(name)
+
+    def set_setting(self, name, value):
+        """Settings are rare, so they are written immediately instead of batched"""
+        self.backend.set_setting(name, value)
+
+    def flush(self):
+        """Write all pending changes to the backend in one transaction"""
+        if not self._pending:
+            return
+        users = list(self._pending.values())
+        self._pending.clear()
+        try:
+            self.backend.write_many(users)
+        except Exception as e:
+            logger.error(f"❌ Failed to write {len(users)} users: {e}")
+            # Вернем изменения в очередь, если их не перезаписали новыми
+            for user in users:
+                self._pending.setdefault(user.user_id, user)
+
+    async def run_flusher(self):
+        """Periodically flush pending writes until cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                self.flush()
+        finally:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.backend.close()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Vector output: the life calendar as a compact SVG, and weekly deltas for clients that keep the SVG
+
+Lived weeks are run-length rectangles in cell units (at most three for any range of weeks), the
+grid lines are one path, so the file size does not depend on how many weeks are filled. A delta
+carries only the rectangles of the weeks lived since a previous render plus the new statistics
+and footer, which a web client swaps in by element id.
+"""
+
+import json
+from xml.sax.saxutils import escape, quoteattr
+from config import GRID_COLUMNS, RASTER_CELL_WIDTH, RASTER_CELL_HEIGHT, COMPLETED_WEEK_COLOR, \
+    FUTURE_WEEK_COLOR, GRID_COLOR
+from life_visualizer import STATS_STYLE, FOOTER_STYLE
+from pillow_renderer import (measure_layout, title_text, TITLE_STYLE, AXIS_STYLE, LEGEND_STYLE, SIGNATURE_STYLE,
+                             AGE_TEXT, AXIS_TEXT, LEGEND_TEXT, SIGNATURE_TEXT)
+
+FONT_FAMILY = "DejaVu Sans, Verdana, sans-serif"
+
+
+def lived_runs(start, end, columns=GRID_COLUMNS):
+    """Weeks [start, end) as rectangles (col, row, width, height) in cells.
+
+    One run per row, and the full rows between the first and the last merge into one rectangle.
+    """
+    if end <= start:
+        return []
+    row, col = divmod(start, columns)
+    end_row, end_col = divmod(end, columns)
+    if row == end_row:
+        return [(col, row, end_col - col, 1)]
+    runs = []
+    if col:
+        runs.append((col, row, columns - col, 1))
+        row += 1
+    if end_row > row:
+        runs.append((0, row, columns, end_row - row))
+    if end_col:
+        runs.append((0, end_row, end_col, 1))
+    return runs
+
+
+def _num(value):
+    # Координаты с точностью до десятой пикселя, без лишних нулей
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+
+def _rects(runs):
+    return ''.join(f'<rect x="{col}" y="{row}" width="{width}" height="{height}"/>'
+                   for col, row, width, height in runs)
+
+
+class SvgRenderer:
+    """Builds SVG documents and deltas; page layouts are shared with the pillow engine"""
+
+    def __init__(self, visualizer):
+        self.visualizer = visualizer
+        self._pages = {}
+        self._bases = {}
+
+    def _page(self, life_expectancy):
+        page = self._pages.get(life_expectancy)
+        if page is None:
+            page = self._pages[life_expectancy] = measure_layout(self.visualizer, life_expectancy)
+        return page
+
+    def _text(self, center, text, style, element_id=None, rotate=False):
+        """<text> centered on a point, one <tspan> per line; with a rounded box if the style has one"""
+        x, y = (_num(value) for value in center)
+        size = style.size * self.visualizer.dpi / 72
+        attrs = f' font-size="{_num(size)}" fill="{style.color}"'
+        if style.font == 'bold':
+            attrs += ' font-weight="bold"'
+        elif style.font == 'italic':
+            attrs += ' font-style="italic"'
+        if rotate:
+            attrs += f' transform="rotate(-90 {x} {y})"'
+        lines = text.split('\n')
+        # Строки через 1.2 кегля, как в matplotlib; блок центрирован по вертикали
+        tspans = ''.join(
+            f'<tspan x="{x}" dy="{_num(-0.6 * (len(lines) - 1) if i == 0 else 1.2)}em">{escape(line)}</tspan>'
+            for i, line in enumerate(lines)
+        )
+        element = f'<text y="{y}" dominant-baseline="central"{attrs}>{tspans}</text>'
+        if style.box_fill:
+            width, height = self.visualizer._text_box_size(text, style)
+            pad = style.pad * self.visualizer.dpi / 72
+            element = (f'<rect x="{_num(center[0] - width / 2)}" y="{_num(center[1] - height / 2)}" '
+                       f'width="{width}" height="{height}" rx="{_num(pad)}" fill="{style.box_fill}" '
+                       f'stroke="{style.box_edge}" fill-opacity="0.8" stroke-opacity="0.8"/>{element}')
+        if element_id:
+            element = f'<g id={quoteattr(element_id)}>{element}</g>'
+        return element
+
+    def _dynamic_parts(self, key):
+        """Statistics and footer: the only text that changes from week to week"""
+        page = self._page(key.life_expectancy)
+        visualizer = self.visualizer
+        return (
+            self._text(page.stats_center, visualizer._format_stats_text(key.weeks_lived, key.life_expectancy),
+                       STATS_STYLE, element_id='stats'),
+            self._text(page.footer_center, visualizer._format_footer_text(key.week_of), FOOTER_STYLE,
+                       element_id='footer')
+        )
+
+    def _base(self, life_expectancy):
+        """Everything up to the lived weeks and everything after them, cached per life expectancy"""
+        base = self._bases.get(life_expectancy)
+        if base is None:
+            page = self._page(life_expectancy)
+            width, height = page.size
+            x0, y0, x1, y1 = page.grid_box
+            # Линии сетки: вертикальные и горизонтальные по границам клеток
+            lines = ''.join(f'M{x0 + col * RASTER_CELL_WIDTH}.5 {y0}v{y1 - y0}' for col in range(GRID_COLUMNS))
+            lines += ''.join(f'M{x0} {y0 + row * RASTER_CELL_HEIGHT}.5h{x1 - x0}' for row in range(life_expectancy))
+            lines += f'M{x1 - 0.5} {y0}v{y1 - y0}M{x0} {y1 - 0.5}h{x1 - x0}'
+            head = (
+                f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}" text-anchor="middle">'
+                f'<rect width="{width}" height="{height}" fill="white"/>'
+                f'<g transform="translate({x0} {y0}) scale({RASTER_CELL_WIDTH} {RASTER_CELL_HEIGHT})">'
+                f'<rect width="{GRID_COLUMNS}" height="{life_expectancy}" fill="{FUTURE_WEEK_COLOR}"/>'
+                f'<g id="lived" fill="{COMPLETED_WEEK_COLOR}">'
+            )
+            tail = (
+                '</g></g>'
+                f'<path d="{lines}" stroke="{GRID_COLOR}" fill="none" shape-rendering="crispEdges"/>'
+                + self._text(page.title_center, title_text(life_expectancy), TITLE_STYLE)
+                + self._text(page.age_center, AGE_TEXT, AXIS_STYLE, rotate=True)
+                + self._text(page.axis_center, AXIS_TEXT, AXIS_STYLE)
+                + self._text(page.legend_center, LEGEND_TEXT, LEGEND_STYLE)
+                + self._text(page.signature_center, SIGNATURE_TEXT, SIGNATURE_STYLE)
+            )
+            base = self._bases[life_expectancy] = (head, tail)
+        return base
+
+    def render(self, key):
+        """The whole calendar as SVG bytes"""
+        head, tail = self._base(key.life_expectancy)
+        weeks_lived = min(key.weeks_lived, key.life_expectancy * GRID_COLUMNS)
+        stats, footer = self._dynamic_parts(key)
+        return f'{head}{_rects(lived_runs(0, weeks_lived))}{tail}{stats}{footer}</svg>'.encode('utf-8')
+
+    def render_delta(self, key, since_weeks_lived):
+        """JSON update from a calendar rendered with since_weeks_lived to the one for key.
+
+        The client appends `lived` (SVG rects in cell units) to the #lived group and replaces the
+        #stats and #footer elements with `stats` and `footer`.
+        """
+        if since_weeks_lived < 0:
+            raise ValueError(f"since_weeks_lived must not be negative, got {since_weeks_lived}")
+        if since_weeks_lived > key.weeks_lived:
+            raise ValueError(f"cannot go back from {since_weeks_lived} to {key.weeks_lived} weeks lived")
+        total = key.life_expectancy * GRID_COLUMNS
+        weeks_lived = min(key.weeks_lived, total)
+        since = min(since_weeks_lived, total)
+        stats, footer = self._dynamic_parts(key)
+        delta = {
+            'week_of': key.week_of.isoformat(),
+            'since_weeks_lived': since_weeks_lived,
+            'weeks_lived': key.weeks_lived,
+            'lived': _rects(lived_runs(since, weeks_lived)),
+            'stats': stats,
+            'footer': footer
+        }
+        return json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
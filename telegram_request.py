@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+HTTP transport for Bot API calls
+"""
+
+import time
+import httpx
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+from metrics import TELEGRAM_REQUEST_DURATION, TELEGRAM_REQUEST_ERRORS
+from config import (
+    TELEGRAM_POOL_SIZE, TELEGRAM_KEEPALIVE_CONNECTIONS, TELEGRAM_KEEPALIVE_EXPIRY,
+    TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT, TELEGRAM_WRITE_TIMEOUT,
+    TELEGRAM_MEDIA_WRITE_TIMEOUT, TELEGRAM_POOL_TIMEOUT
+)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records latency and errors of every Bot API call.
+
+    Pool size, keep-alive and timeouts default to the TELEGRAM_* settings, so every Bot built
+    on it (the Application's bot, shared with the scheduler and broadcasts) keeps connections warm.
+    """
+
+    def __init__(self, connection_pool_size=TELEGRAM_POOL_SIZE,
+                 keepalive_connections=TELEGRAM_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=TELEGRAM_KEEPALIVE_EXPIRY,
+                 read_timeout=TELEGRAM_READ_TIMEOUT, write_timeout=TELEGRAM_WRITE_TIMEOUT,
+                 connect_timeout=TELEGRAM_CONNECT_TIMEOUT, pool_timeout=TELEGRAM_POOL_TIMEOUT,
+                 media_write_timeout=TELEGRAM_MEDIA_WRITE_TIMEOUT, **kwargs):
+        # HTTPXRequest задает только max_connections; keep-alive настраиваем своими лимитами httpx
+        limits = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=min(keepalive_connections, connection_pool_size),
+            keepalive_expiry=keepalive_expiry
+        )
+        kwargs['httpx_kwargs'] = {'limits': limits, **(kwargs.get('httpx_kwargs') or {})}
+        super().__init__(
+            connection_pool_size=connection_pool_size,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+            media_write_timeout=media_write_timeout,
+            **kwargs
+        )
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(
+                url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout
+            )
+        except TelegramError as e:
+            TELEGRAM_REQUEST_ERRORS.labels(api_method, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_REQUEST_DURATION.labels(api_method).observe(time.perf_counter() - started)
+
+        if code >= 400:
+            TELEGRAM_REQUEST_ERRORS.labels(api_method, str(code)).inc()
+        return code, payload
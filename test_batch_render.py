@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки пакетного рендеринга календарей
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date
+from collections import namedtuple
+from batch_render import main
+from broadcast import WeeklyBroadcast
+from render_cache import RenderCache
+
+User = namedtuple('User', 'user_id birth_date gender')
+
+def run(*argv):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        assert main(list(argv) + ['--workers', '2', '--quiet']) == 0
+    return json.loads(output.getvalue())
+
+def test_batch_render():
+    """Проверяет выходные форматы, общий рендер для одинаковых ключей и возобновление"""
+    print("🎯 Тестирование пакетного рендеринга...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        users_path = os.path.join(tmp_dir, 'users.csv')
+        with open(users_path, 'w', encoding='utf-8') as f:
+            f.write("user_id,birth_date,gender\n"
+                    "1,1990-03-15,male\n"
+                    "2,15.03.1990,male\n"        # тот же ключ, что у пользователя 1
+                    "3,1985-07-01,female\n"
+                    "4,not a date,male\n"
+                    "5,2999-01-01,female\n"     # еще не родился
+                    "7,1800-01-01,male\n")      # старше 120 лет - /setbirth такую дату не примет
+        jsonl_path = os.path.join(tmp_dir, 'users.jsonl')
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'user_id': 6, 'birth_date': '2000-01-01', 'gender': None}) + "\n"
+                    "{bad json\n"
+                    "[8]\n"
+                    + json.dumps({'user_id': 9, 'birth_date': '1995-05-05'}) + "\n")
+
+        out_dir, archive, cache_dir = (os.path.join(tmp_dir, name) for name in ('out', 'grids.zip', 'cache'))
+        results = run(users_path, '--output-dir', out_dir, '--archive', archive, '--cache-dir', cache_dir,
+                      '--week-of', '2024-06-05')
+        assert results['users'] == 3 and results['invalid_rows'] == 3, results
+        assert results['unique_keys'] == 2 and results['rendered'] == 2 and results['week_of'] == '2024-06-03'
+        assert sorted(os.listdir(out_dir)) == ['.manifest', '1.png', '2.png', '3.png']
+        assert sorted(zipfile.ZipFile(archive).namelist()) == ['1.png', '2.png', '3.png']
+        assert not os.path.exists(f"{archive}.parts")
+        print(f"✅ 3 календаря из 2 рендеров: {results['renders_per_s']} рендеров/с")
+
+        # Повторный запуск ничего не рендерит заново
+        results = run(users_path, '--output-dir', out_dir, '--cache-dir', cache_dir, '--week-of', '2024-06-05')
+        assert results['rendered'] == 0 and results['skipped'] == 2
+        results = run(jsonl_path, '--output-dir', out_dir, '--week-of', '2024-06-05')
+        assert results['rendered'] == 2 and results['users'] == 2 and results['invalid_rows'] == 2, results
+        print("✅ Готовые календари пропускаются при повторном запуске")
+
+        # Рассылка понедельника находит календарь в дисковом кэше
+        broadcast = WeeklyBroadcast(None, None, None, None)
+        key, _ = broadcast._prepare([User(1, date(1990, 3, 15), 'male')], date(2024, 6, 3))[1]
+        with open(os.path.join(out_dir, '1.png'), 'rb') as f:
+            assert RenderCache(disk_dir=cache_dir).get(key) == f.read()
+        print("✅ Рассылка берет заранее отрисованный календарь из кэша")
+
+        # Запуск на следующую неделю в ту же папку перерисовывает файлы, а не оставляет старые
+        with open(os.path.join(out_dir, '1.png'), 'rb') as f:
+            last_week = f.read()
+        results = run(users_path, '--output-dir', out_dir, '--week-of', '2024-06-12')
+        assert results['rendered'] == 2 and results['skipped'] == 0 and results['week_of'] == '2024-06-10'
+        with open(os.path.join(out_dir, '1.png'), 'rb') as f:
+            assert f.read() != last_week
+        assert run(users_path, '--output-dir', out_dir, '--week-of', '2024-06-12')['rendered'] == 0
+        print("✅ Файлы прошлой недели не засчитываются как готовые")
+
+if __name__ == "__main__":
+    test_batch_render()
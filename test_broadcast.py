@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки еженедельной рассылки: доля пула рендеринга и контрольная точка
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from broadcast import BroadcastCheckpoint, SendRateLimiter, TokenBucket, WeeklyBroadcast
+from file_id_index import FileIdIndex
+from render_pool import RenderPool, RenderPoolBusy
+from storage import User
+
+class FakeRenderPool(RenderPool):
+    """Пул без процессов: рендер занимает место в очереди так же, как настоящий"""
+    def __init__(self):
+        super().__init__(workers=2, queue_limit=8)
+        self.max_pending = 0
+
+    async def render_grid(self, key):
+        return await self._submit(None, key)
+
+    async def _submit(self, func, *args):
+        if self.saturated:
+            raise RenderPoolBusy("full")
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        try:
+            await asyncio.sleep(0.01)
+            return b'png'
+        finally:
+            self.pending -= 1
+            if self._capacity_freed is not None:
+                self._capacity_freed.set()
+
+class PassThroughCache:
+    async def get_or_render(self, key, render):
+        return await render(key)
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.sent.append(chat_id)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"file-{chat_id}")])
+
+class FakeUsers:
+    def __init__(self, users):
+        self.users = users
+
+    def all_users(self):
+        return self.users
+
+async def run_broadcast(tmp_dir):
+    users = [User(user_id, date(1950, 1, 1) + timedelta(weeks=user_id), 'default') for user_id in range(1, 41)]
+    pool = FakeRenderPool()
+    file_ids = FileIdIndex(os.path.join(tmp_dir, 'file_ids.db'), None)
+    broadcast = WeeklyBroadcast(FakeUsers(users), PassThroughCache(), pool, file_ids, concurrency=32, render_slots=2)
+    broadcast.limiter = SendRateLimiter(global_rate=10000, per_chat_interval=0)
+    broadcast.checkpoint = BroadcastCheckpoint(os.path.join(tmp_dir, 'checkpoint.json'))
+    bot = FakeBot()
+    today = date(2024, 6, 3)
+
+    task = asyncio.create_task(broadcast.run(bot, today))
+    interactive = 0
+    while not task.done():
+        # Пока идет рассылка, /show получает место в пуле
+        assert not pool.saturated
+        await pool.render_grid(None)
+        interactive += 1
+        # Проверка со стороны планировщика не сбивает состояние идущей рассылки
+        sent = broadcast.checkpoint.sent
+        broadcast.is_finished(date(2024, 5, 27))
+        assert broadcast.checkpoint.sent == sent
+        assert broadcast.checkpoint.broadcast_id == broadcast.current_broadcast_id(today)
+    await task
+    file_ids.close()
+
+    assert sorted(bot.sent) == list(range(1, 41)) and interactive > 0
+    assert pool.max_pending <= 2 + 1, pool.max_pending
+    assert broadcast.is_finished(today) and not broadcast.has_unfinished(today)
+    print(f"✅ Рассылка заняла не больше 2 мест в пуле, /show отрисован {interactive} раз")
+
+async def check_pause():
+    bucket = TokenBucket(10)
+    await asyncio.sleep(0.3)
+    await bucket.pause(0.5)
+    started = time.monotonic()
+    await bucket.acquire()
+    # Пополнение считается с момента паузы, а не с прошлой выдачи токена
+    assert time.monotonic() - started >= 0.55
+    print("✅ Пауза после flood control выдерживается полностью")
+
+def test_broadcast():
+    """Проверяет долю пула для рассылки, проверки контрольной точки и паузу лимитера"""
+    print("🎯 Тестирование рассылки...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(run_broadcast(tmp_dir))
+    asyncio.run(check_pause())
+
+if __name__ == "__main__":
+    test_broadcast()
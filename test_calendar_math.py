@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки точной календарной арифметики
+"""
+
+from datetime import date, timedelta
+from calendar_math import Age, add_months, exact_age, exact_age_batch, life_stats_batch, weeks_lived
+from life_visualizer import LifeVisualizer, get_profile
+
+def test_calendar_math():
+    """Проверяет точный возраст, високосные годы и совпадение пакетного расчета с поштучным"""
+    print("🎯 Тестирование календарной арифметики...")
+
+    assert add_months(date(2023, 1, 31), 1) == date(2023, 2, 28)
+    assert add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert exact_age(date(1990, 3, 15), date(2024, 3, 14)) == Age(33, 11, 28, 12418, 1774)
+    assert exact_age(date(1990, 3, 15), date(2024, 3, 15))[:3] == (34, 0, 0)
+    # Родившиеся 29 февраля становятся старше 28 февраля в невисокосный год
+    assert exact_age(date(2000, 2, 29), date(2025, 2, 27))[:3] == (24, 11, 29)
+    assert exact_age(date(2000, 2, 29), date(2025, 2, 28))[:3] == (25, 0, 0)
+    assert exact_age(date(2000, 2, 29), date(2028, 2, 29))[:3] == (28, 0, 0)
+    assert exact_age(date(2001, 1, 31), date(2001, 3, 1))[:3] == (0, 1, 1)
+    assert exact_age(date(2030, 1, 1), date(2024, 1, 1)) == Age(0, 0, 0, 0, 0)
+    print("✅ Точный возраст учитывает длину месяцев и високосные годы")
+
+    today = date(2026, 10, 18)
+    births = [date(1920, 1, 1) + timedelta(days=37 * i) for i in range(1000)] + [date(2000, 2, 29), date(2030, 1, 1)]
+    batch = exact_age_batch(births, today)
+    for i, birth_date in enumerate(births):
+        assert exact_age(birth_date, today) == Age(*(int(values[i]) for values in batch))
+    print(f"✅ Пакетный расчет совпадает с поштучным для {len(births)} дат")
+
+    visualizer = LifeVisualizer()
+    genders = ['male', 'female', 'default']
+    expectancy = [get_profile(genders[i % 3]).life_expectancy_years for i in range(len(births))]
+    stats = life_stats_batch(births, expectancy, today)
+    for i, birth_date in enumerate(births):
+        profile = get_profile(genders[i % 3])
+        week_info = visualizer.get_week_info(birth_date, profile, today)
+        percentage_info = visualizer.get_life_percentage(birth_date, profile, today)
+        assert stats['weeks_lived'][i] == weeks_lived(birth_date, today) == week_info['total_weeks']
+        assert stats['age_years'][i] == week_info['age_years']
+        assert stats['week_in_year'][i] == week_info['week_in_year']
+        assert stats['weeks_remaining'][i] == week_info['weeks_remaining']
+        assert stats['total_weeks'][i] == percentage_info['total_weeks']
+        assert stats['percentage'][i] == percentage_info['percentage']
+    print("✅ Статистика для рассылки совпадает с ответами команд")
+
+if __name__ == "__main__":
+    test_calendar_math()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки списка каналов и диспетчера отчетов с кучей времен запуска
+"""
+
+import asyncio
+import calendar
+import os
+import sqlite3
+import tempfile
+import time
+from telegram.error import NetworkError
+from channels import ChannelRegistry, build_report, next_fire_time
+from scheduler import ChannelDispatcher
+
+class RecordingBot:
+    """Бот, который запоминает отправленные сообщения и может один раз упасть"""
+    def __init__(self, fail_once=()):
+        self.sent = []
+        self.fail_once = set(fail_once)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.fail_once:
+            self.fail_once.discard(chat_id)
+            raise NetworkError("connection reset")
+        self.sent.append((chat_id, text))
+
+def make_due(registry, chat_id, seconds_ago):
+    """Переносит следующий отчет канала в прошлое, как будто он уже должен был уйти"""
+    channel = registry.get(chat_id)
+    due = time.time() - seconds_ago
+    assert registry.claim(chat_id, channel.next_run, due)
+    return due
+
+def check_registry(registry):
+    monday = registry.add('-1001', 'Europe/Lisbon', '0 0 * * mon', 'weekly')
+    tokyo = registry.add('-1002', 'Asia/Tokyo', '0 9 * * *', 'year')
+    assert len(registry) == 2 and registry.channels(limit=1)[0].chat_id in ('-1001', '-1002')
+    # Понедельник 00:00 в Лиссабоне летом - это воскресенье 23:00 UTC
+    sunday = calendar.timegm((2024, 6, 2, 12, 0, 0))
+    assert next_fire_time(monday.schedule, monday.timezone, sunday) - sunday == 11 * 3600
+    assert "Asia/Tokyo" in build_report(tokyo) and "Year Progress" in build_report(tokyo)
+    # Отчеты отправляются в Markdown: подчеркивание в имени пояса экранируется
+    new_york = registry.add('-1004', 'America/New_York', '0 9 * * mon', 'weekly')
+    for report in ('weekly', 'year'):
+        text = build_report(new_york._replace(report=report))
+        assert "America/New\\_York" in text and text.replace("\\_", "").count("_") == 0
+    assert registry.remove('-1004')
+    # /channels показывает пользователю только его каналы
+    registry.add('-1005', 'UTC', '0 0 * * mon', 'weekly', owner_id=42)
+    assert registry.get('-1005').owner_id == 42 and registry.count(42) == 1 and registry.count() == 3
+    assert [channel.chat_id for channel in registry.channels(owner_id=42)] == ['-1005']
+    assert registry.channels(owner_id=7) == [] and registry.count(7) == 0
+    assert registry.remove('-1005')
+    for bad in [('Mars/Base', '0 0 * * mon', 'weekly'), ('UTC', '0 0 *', 'weekly'), ('UTC', '0 0 * * mon', 'daily')]:
+        try:
+            registry.add('-1003', *bad)
+            assert False, f"{bad} принят"
+        except ValueError:
+            pass
+    assert registry.get('-1003') is None
+
+    # Один запуск забирается только один раз
+    assert registry.claim('-1001', monday.next_run, monday.next_run + 60)
+    assert not registry.claim('-1001', monday.next_run, monday.next_run + 120)
+    assert registry.remove('-1002') and not registry.remove('-1002')
+
+async def run_dispatcher(db_path):
+    registry = ChannelRegistry(db_path)
+    for i in range(1000):
+        registry.add(f'-100{i}', 'UTC', '0 0 1 1 *', 'weekly')
+    on_time = make_due(registry, '-1001', 1)
+    make_due(registry, '-1002', 3 * 3600)  # бот лежал дольше SCHEDULER_MISFIRE_GRACE - отчет догоняется
+    make_due(registry, '-1003', 1)
+
+    bot = RecordingBot(fail_once={'-1003'})
+    dispatcher = ChannelDispatcher(bot, registry)
+    dispatcher.start()
+    assert len(dispatcher._heap) == 1000, "одна запись в куче на канал"
+    await asyncio.sleep(0.5)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == ['-1001', '-1002']
+    assert registry.get('-1001').next_run > time.time() > on_time
+    print("✅ Отчеты, чье время наступило, отправлены по одному разу")
+
+    # Неудачная отправка возвращает запуск каналу и ставит повтор
+    retry = registry.get('-1003')
+    assert retry.next_run < time.time()
+    assert any(chat_id == '-1003' and fire_at > time.time() for fire_at, chat_id, _ in dispatcher._heap)
+    print("✅ Неудачный отчет будет повторен")
+
+    # Канал, добавленный другим процессом, подхватывается при синхронизации
+    other = ChannelRegistry(db_path)
+    other.add('-1009999', 'UTC', '0 0 1 1 *', 'year')
+    make_due(other, '-1009999', 1)
+    dispatcher._sync()
+    dispatcher._wakeup.set()
+    await asyncio.sleep(0.5)
+    assert [chat_id for chat_id, _ in bot.sent].count('-1009999') == 1
+
+    # Удаленный канал ничего не получает, даже если его запись еще в куче
+    make_due(registry, '-1004', 0)
+    dispatcher.schedule(registry.get('-1004'))
+    registry.remove('-1004')
+    dispatcher.schedule(registry.add('-1005', 'UTC', '0 0 1 1 *', 'weekly'))
+    await asyncio.sleep(0.2)
+    assert '-1004' not in [chat_id for chat_id, _ in bot.sent]
+    dispatcher.stop()
+    other.close()
+    registry.close()
+    print("✅ Изменения из других процессов подхвачены, удаленные каналы пропущены")
+
+def check_migration(db_path):
+    """Каналы из базы, созданной до появления владельцев, остаются без владельца"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE channels (chat_id TEXT PRIMARY KEY, timezone TEXT NOT NULL, schedule TEXT NOT NULL, "
+                 "report TEXT NOT NULL, next_run REAL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO channels VALUES ('-1001', 'UTC', '0 0 * * mon', 'weekly', NULL, 0)")
+    conn.commit()
+    conn.close()
+    registry = ChannelRegistry(db_path)
+    assert registry.get('-1001').owner_id is None and registry.count(42) == 0 and len(registry) == 1
+    registry.close()
+
+def test_channels():
+    """Проверяет список каналов с часовыми поясами и диспетчер на одной куче"""
+    print("🎯 Тестирование каналов отчетов...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        registry = ChannelRegistry(os.path.join(tmp_dir, 'channels.db'))
+        check_registry(registry)
+        registry.close()
+        print("✅ Каналы хранят часовой пояс, расписание и тип отчета")
+        check_migration(os.path.join(tmp_dir, 'legacy.db'))
+        print("✅ База без владельцев каналов дополняется при открытии")
+        asyncio.run(run_dispatcher(os.path.join(tmp_dir, 'dispatcher.db')))
+
+if __name__ == "__main__":
+    test_channels()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки кластерного режима: фронт, воркеры по user_id и аренда лидера
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from aiohttp import ClientSession, web
+from telegram import Bot
+from cluster import run_cluster, shard_for, update_user_id
+from fake_telegram import FakeTelegram
+from file_id_index import FileIdIndex
+from leader import SQLiteLease
+from test_webhook import free_port
+
+def check_lease(db_path):
+    """Аренду держит один владелец; после освобождения или истечения ее забирает другой"""
+    first = SQLiteLease(path=db_path, ttl=0.5, owner='first')
+    second = SQLiteLease(path=db_path, ttl=0.5, owner='second')
+    assert first.try_acquire() and not second.try_acquire()
+    assert first.try_acquire(), "владелец продлевает свою аренду"
+    first.release()
+    assert second.try_acquire() and second.holder() == 'second'
+    time.sleep(0.6)  # second не продлевает - аренда истекает
+    assert first.try_acquire() and not second.try_acquire()
+    first.close()
+    second.close()
+
+async def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "не дождались ответа"
+        await asyncio.sleep(0.1)
+
+def stored_file_ids(db_path):
+    index = FileIdIndex(db_path, None)
+    try:
+        return len(index)
+    finally:
+        index.close()
+
+async def run_scenario(tmp_dir):
+    fake = FakeTelegram()
+    fake_runner = web.AppRunner(fake.build_app())
+    await fake_runner.setup()
+    fake_port = free_port()
+    await web.TCPSite(fake_runner, '127.0.0.1', fake_port).start()
+
+    db_path = os.path.join(tmp_dir, 'cluster.db')
+    worker_env = {
+        'BOT_TOKEN': '123456:TEST',
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{fake_port}/bot",
+        'USER_DB_PATH': db_path,
+        'FILE_ID_INDEX_PATH': os.path.join(tmp_dir, 'file_ids.json'),
+        'BROADCAST_CHECKPOINT_PATH': os.path.join(tmp_dir, 'checkpoint.json'),
+        'RENDER_WORKERS': '1',
+        'METRICS_ENABLED': 'false',
+        'LEADER_LEASE_TTL': '3',
+    }
+    front_port = free_port()
+    stop_event = asyncio.Event()
+    cluster_task = asyncio.create_task(run_cluster(
+        workers=2, webhook_url=f"http://127.0.0.1:{front_port}", base_port=free_port(),
+        listen='127.0.0.1', port=front_port, secret='s3cret',
+        bot=Bot('123456:TEST', base_url=f"http://127.0.0.1:{fake_port}/bot"),
+        stop_event=stop_event, worker_env=worker_env
+    ))
+
+    try:
+        await wait_for(lambda: fake.webhook_url)
+        assert fake.webhook_url == f"http://127.0.0.1:{front_port}/telegram"
+
+        # Команды одного пользователя идут в один воркер и обрабатываются по порядку
+        users = [1, 2, 3, 4, 5, 6]
+        for user_id in users:
+            assert await fake.deliver(fake.make_update(user_id, '/setbirth 15.03.1990')) == 200
+            assert await fake.deliver(fake.make_update(user_id, '/age')) == 200
+        replies = lambda user_id: [m['text'] for m in fake.sent if m['chat_id'] == user_id]
+        await wait_for(lambda: all(len(replies(user_id)) == 2 for user_id in users))
+        for user_id in users:
+            assert replies(user_id)[0].startswith("✅ Дата рождения установлена"), replies(user_id)
+            assert "Ваш точный возраст" in replies(user_id)[1], replies(user_id)
+        print("✅ Обновления распределены по воркерам и обработаны по порядку")
+
+        # Пользователи 1 и 2 живут в разных воркерах, но file_id общий через SQLite
+        assert shard_for(1, 2) != shard_for(2, 2)
+        photos = lambda: [m for m in fake.sent if m['method'] == 'sendPhoto']
+        await fake.deliver(fake.make_update(1, '/show'))
+        await wait_for(lambda: len(photos()) == 1)
+        # file_id сохраняется после ответа Telegram - ждем его в общей базе, иначе второй воркер его не найдет
+        await wait_for(lambda: stored_file_ids(db_path) == 1)
+        await fake.deliver(fake.make_update(2, '/show'))
+        await wait_for(lambda: len(photos()) == 2)
+        assert photos()[0]['uploaded_bytes'] > 0
+        assert photos()[1]['uploaded_bytes'] == 0 and photos()[1]['file_id'] == photos()[0]['file_id']
+        print("✅ Второй воркер отправил календарь по file_id первого")
+
+        holder = SQLiteLease(path=db_path).holder()
+        assert holder is not None
+        print(f"✅ Планировщик ведет один процесс: {holder}")
+
+        async with ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{front_port}/health") as response:
+                health = await response.json()
+                assert response.status == 200 and len(health['workers']) == 2
+                assert sum(w['forwarded'] for w in health['workers']) == len(users) * 2 + 2
+        print("✅ Health фронта показывает оба воркера")
+    finally:
+        stop_event.set()
+        await cluster_task
+        await fake_runner.cleanup()
+
+    # Воркеры отдали аренду при остановке
+    assert SQLiteLease(path=db_path).holder() is None
+
+def test_cluster():
+    """Проверяет выбор лидера и работу фронта с двумя процессами бота на одной машине"""
+    print("🎯 Тестирование кластерного режима...")
+    assert update_user_id({'update_id': 1, 'message': {'from': {'id': 42}, 'chat': {'id': 42}}}) == 42
+    assert update_user_id({'update_id': 2, 'channel_post': {'chat': {'id': -100}}}) == -100
+    assert update_user_id({'update_id': 3}) is None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_lease(os.path.join(tmp_dir, 'lease.db'))
+        print("✅ Аренда лидера переходит только после освобождения или истечения")
+        asyncio.run(run_scenario(tmp_dir))
+
+if __name__ == "__main__":
+    test_cluster()
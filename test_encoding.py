@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки пресетов кодирования изображений
+"""
+
+from datetime import date
+from io import BytesIO
+from PIL import Image
+from life_visualizer import LifeVisualizer, PALETTE_EXACT_COLORS
+from image_encoding import ENCODING_PRESETS
+
+def test_encoding():
+    """Проверяет форматы пресетов, размер палитры и точность основных цветов"""
+    print("🎯 Тестирование пресетов кодирования...")
+    
+    birth_date = date(1990, 3, 15)
+    sizes = {}
+    for preset in ENCODING_PRESETS:
+        if ENCODING_PRESETS[preset].format == 'SVG':
+            continue  # вектор проверяет test_svg_renderer
+        visualizer = LifeVisualizer(preset=preset)
+        key = visualizer.get_render_key(birth_date)
+        image = Image.open(BytesIO(visualizer.render_grid(key)))
+        sizes[preset] = len(visualizer.render_grid(key))
+        
+        assert key.preset == preset
+        assert image.format.lower().replace('jpeg', 'jpg') == visualizer.file_extension(key)
+        if ENCODING_PRESETS[preset].colors:
+            assert image.mode == 'P'
+            # Фон, прожитые недели и текст не должны сдвигаться при квантизации
+            colors = {color for _, color in image.convert('RGB').getcolors(256)}
+            assert (255, 255, 255) in colors and PALETTE_EXACT_COLORS[1] in colors
+        print(f"✅ {preset}: {image.format} {image.size[0]}x{image.size[1]}, {sizes[preset]:,} байт")
+    
+    assert sizes['palette'] < sizes['png']
+    assert sizes['mobile'] < sizes['palette']
+    assert Image.open(BytesIO(LifeVisualizer(preset='mobile').render_life_grid(birth_date))).width <= 1000
+    
+    try:
+        LifeVisualizer(preset='tiff')
+        assert False, "неизвестный пресет должен вызывать ошибку"
+    except ValueError:
+        print("✅ Неизвестный пресет отклоняется")
+
+if __name__ == "__main__":
+    test_encoding()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки индекса file_id загруженных календарей
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+from file_id_index import FileIdIndex
+from life_visualizer import RenderKey
+
+def week_key(week_of, weeks_lived=1909):
+    return RenderKey('pillow', 80, weeks_lived, week_of, 'palette')
+
+def test_file_id_index():
+    """Проверяет общий индекс, удаление старых недель и лимит кэша в памяти"""
+    print("🎯 Тестирование индекса file_id...")
+    monday = date(2024, 6, 3)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'file_ids.db')
+        legacy_path = os.path.join(tmp_dir, 'file_ids.json')
+        with open(legacy_path, 'w', encoding='utf-8') as f:
+            json.dump({'old-digest': 'legacy-file-id'}, f)
+
+        index = FileIdIndex(db_path, legacy_path, max_cached=2)
+        assert len(index) == 1 and os.path.exists(f"{legacy_path}.imported")
+        for weeks_ago in range(6):
+            index.put(week_key(monday - timedelta(weeks=weeks_ago)), f"file-{weeks_ago}")
+        other = FileIdIndex(db_path, None)
+        assert other.get(week_key(monday)) == 'file-0'
+        print("✅ file_id виден всем процессам")
+
+        # В памяти - только последние использованные file_id
+        assert len(index._file_ids) == 2
+        index.get(week_key(monday))
+        assert list(index._file_ids.values())[-1] == 'file-0'
+        print("✅ Кэш в памяти ограничен")
+
+        # Рассылка удаляет недели старше FILE_ID_KEEP_WEEKS и строки без недели
+        assert index.prune(monday, keep_weeks=4) == 2
+        assert len(index) == 5 and index.get(week_key(monday - timedelta(weeks=5))) is None
+        assert index.get(week_key(monday - timedelta(weeks=4))) == 'file-4'
+        assert index.prune(monday, keep_weeks=4) == 0
+        index.close()
+        other.close()
+
+        # База, созданная до появления недель, получает колонку при открытии
+        legacy_db = os.path.join(tmp_dir, 'legacy.db')
+        conn = sqlite3.connect(legacy_db)
+        conn.execute("CREATE TABLE file_ids (digest TEXT PRIMARY KEY, file_id TEXT NOT NULL)")
+        conn.execute("INSERT INTO file_ids VALUES ('old-digest', 'old-file-id')")
+        conn.commit()
+        conn.close()
+        index = FileIdIndex(legacy_db, None)
+        index.put(week_key(monday), 'new-file-id')
+        assert index.prune(monday) == 1 and index.get(week_key(monday)) == 'new-file-id'
+        index.close()
+        print("✅ Старые недели удаляются")
+
+if __name__ == "__main__":
+    test_file_id_index()
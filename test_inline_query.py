@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки разбора инлайн-запросов и времени кэширования ответов
+"""
+
+from datetime import date, datetime
+from inline_query import inline_cache_time, parse_inline_query
+
+def test_inline_query():
+    """Проверяет разбор даты и пола и кэширование ответа до полуночи"""
+    print("🎯 Тестирование инлайн-режима...")
+    today = date(2024, 6, 5)
+    assert parse_inline_query('15.03.1990', today) == (date(1990, 3, 15), 'default')
+    assert parse_inline_query(' 1990-03-15  Female ', today) == (date(1990, 3, 15), 'female')
+    for query in ('', '15.03', '31.02.1990', '15.03.1990 robot', '15.03.1990 male extra',
+                  '01.01.2030', '01.01.1900'):
+        assert parse_inline_query(query, today) is None, query
+    print("✅ Запросы разбираются так же строго, как /setbirth")
+
+    # Цифры в ответе меняются в полночь - Telegram не должен хранить его дольше
+    assert inline_cache_time(datetime(2024, 6, 5, 23, 59, 30)) == 30
+    assert inline_cache_time(datetime(2024, 6, 5, 12, 0), limit=3600) == 3600
+    assert inline_cache_time(datetime(2024, 6, 5, 0, 0)) == 86400
+    print("✅ Время кэширования не выходит за полночь")
+
+if __name__ == "__main__":
+    test_inline_query()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки метрик и проб здоровья
+"""
+
+import asyncio
+from aiohttp import ClientSession
+from datetime import date
+from life_visualizer import LifeVisualizer
+from metrics import Counter, Histogram, generate_latest, track_handler, HANDLER_DURATION, HANDLER_ERRORS
+from metrics_server import MetricsServer
+from test_webhook import free_port
+
+def test_metrics():
+    """Проверяет формат метрик, обертку обработчиков и время фаз рендеринга"""
+    print("🎯 Тестирование метрик...")
+    
+    requests = Counter('test_requests_total', 'Test counter', ['result'])
+    requests.labels('hit').inc()
+    requests.labels(result='hit').inc(2)
+    latency = Histogram('test_latency_seconds', 'Test histogram', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+    
+    text = generate_latest()
+    assert 'test_requests_total{result="hit"} 3' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count 4' in text
+    print("✅ Экспорт в формате Prometheus")
+    
+    async def week_info(update, context):
+        return 'ok'
+    
+    async def show_calendar(update, context):
+        raise RuntimeError('boom')
+    
+    assert asyncio.run(track_handler(week_info)(None, None)) == 'ok'
+    try:
+        asyncio.run(track_handler(show_calendar)(None, None))
+    except RuntimeError:
+        pass
+    assert HANDLER_DURATION.labels('week_info').count == 1
+    assert HANDLER_ERRORS.labels('show_calendar').value == 1
+    print("✅ Время и ошибки обработчиков учитываются")
+    
+    visualizer = LifeVisualizer()
+    timings = {}
+    visualizer.render_grid(visualizer.get_render_key(date(1990, 3, 15)), timings)
+    assert set(timings) == {'layout', 'rasterize', 'encode'}
+    print(f"✅ Фазы рендеринга: {', '.join(f'{k}={v * 1000:.1f}ms' for k, v in timings.items())}")
+    
+    asyncio.run(check_server())
+    print("✅ /metrics и пробы здоровья отвечают")
+
+async def check_server():
+    state = {'application': False}
+    server = MetricsServer(lambda: dict(state), listen='127.0.0.1', port=free_port())
+    await server.start()
+    base = f"http://127.0.0.1:{server.port}"
+    try:
+        async with ClientSession() as session:
+            async with session.get(f"{base}/metrics") as response:
+                assert 'bot_handler_duration_seconds' in await response.text()
+            async with session.get(f"{base}/health/live") as response:
+                assert response.status == 200
+            async with session.get(f"{base}/health/ready") as response:
+                assert response.status == 503
+            state['application'] = True
+            async with session.get(f"{base}/health/ready") as response:
+                assert response.status == 200
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    test_metrics()
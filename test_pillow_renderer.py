@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки движка pillow, который рисует календарь без matplotlib
+"""
+
+import subprocess
+import sys
+from datetime import date
+from io import BytesIO
+from PIL import Image, ImageColor
+from config import GRID_COLUMNS, RASTER_CELL_WIDTH, RASTER_CELL_HEIGHT, COMPLETED_WEEK_COLOR, FUTURE_WEEK_COLOR
+from life_visualizer import LifeVisualizer, RenderKey
+
+def cell_color(image, layout, week):
+    """Цвет середины клетки недели"""
+    row, col = divmod(week, GRID_COLUMNS)
+    x0, y0 = layout.page.grid_box[:2]
+    return image.getpixel((x0 + col * RASTER_CELL_WIDTH + RASTER_CELL_WIDTH // 2,
+                           y0 + row * RASTER_CELL_HEIGHT + RASTER_CELL_HEIGHT // 2))[:3]
+
+def test_pillow_renderer():
+    """Проверяет закраску недель, фазы рендеринга и отсутствие matplotlib"""
+    print("🎯 Тестирование движка pillow...")
+    visualizer = LifeVisualizer(engine='pillow', preset='png')
+    backend = visualizer._get_backend('pillow')
+    lived, future = ImageColor.getrgb(COMPLETED_WEEK_COLOR), ImageColor.getrgb(FUTURE_WEEK_COLOR)
+
+    for weeks_lived in (0, 1, 51, 52, 1909, 80 * GRID_COLUMNS, 90 * GRID_COLUMNS):
+        timings = {}
+        key = RenderKey('pillow', 80, weeks_lived, date(2024, 6, 3), 'png')
+        image = Image.open(BytesIO(visualizer.render_grid(key, timings)))
+        layout = backend._get_layout(80)
+        assert image.size == layout.page.size
+        assert set(timings) == {'layout', 'rasterize', 'encode'}
+        filled = min(weeks_lived, 80 * GRID_COLUMNS)
+        if filled:
+            assert cell_color(image, layout, filled - 1) == lived
+        if filled < 80 * GRID_COLUMNS:
+            assert cell_color(image, layout, filled) == future
+    print(f"✅ Прожитые недели закрашены точно по клеткам, {image.size[0]}x{image.size[1]}")
+
+    # Картинка зависит только от ключа
+    key = visualizer.get_render_key(date(1990, 3, 15), today=date(2024, 6, 5))
+    assert visualizer.render_grid(key) == LifeVisualizer(engine='pillow', preset='png').render_grid(key)
+    print("✅ Одинаковый ключ дает одинаковые байты")
+
+    # Отдельный процесс: движок pillow рисует календарь, не импортируя matplotlib
+    code = ("import sys\n"
+            "from datetime import date\n"
+            "from life_visualizer import LifeVisualizer\n"
+            "visualizer = LifeVisualizer(engine='pillow')\n"
+            "visualizer.warm_up()\n"
+            "assert visualizer.render_life_grid(date(1990, 3, 15))\n"
+            "print('matplotlib' in sys.modules)\n")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False', result.stdout
+    print("✅ matplotlib не загружается")
+
+if __name__ == "__main__":
+    test_pillow_renderer()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки кэша отрисованных календарей
+"""
+
+import asyncio
+import os
+import tempfile
+from datetime import date
+from life_visualizer import RenderKey
+from render_cache import RenderCache, render_key_digest
+
+def make_key(weeks_lived):
+    return RenderKey('pillow', 80, weeks_lived, date(2024, 6, 3), 'palette')
+
+def check_memory_lru():
+    cache = RenderCache(max_bytes=300, disk_dir='')
+    for weeks in (1, 2, 3):
+        cache.put(make_key(weeks), bytes([weeks]) * 100)
+    cache.get(make_key(1))  # первый ключ снова нужен - вытеснится второй
+    cache.put(make_key(4), b'4' * 100)
+    assert cache.get(make_key(2)) is None
+    assert [cache.get(make_key(weeks)) is not None for weeks in (1, 3, 4)] == [True, True, True]
+    cache.put(make_key(5), b'5' * 1000)  # больше всего кэша - в память не попадает
+    assert cache.get(make_key(5)) is None and cache.get_status()['memory_bytes'] == 300
+
+def check_disk_eviction(disk_dir):
+    cache = RenderCache(max_bytes=0, disk_dir=disk_dir, disk_max_bytes=250, evict_every=200)
+    for weeks in (1, 2, 3):
+        cache.put(make_key(weeks), b'x' * 100)
+        # Время изменения задает порядок вытеснения, разводим его явно
+        os.utime(cache._disk_path(render_key_digest(make_key(weeks))), (weeks, weeks))
+    # Каталог сканируется раз в evict_every байт: третья запись еще не вытеснила ничего
+    assert len(os.listdir(disk_dir)) == 3 and cache.get(make_key(1)) is not None
+    os.utime(cache._disk_path(render_key_digest(make_key(1))), (1, 1))
+    cache.evict_disk()
+    files = sorted(os.listdir(disk_dir))
+    assert len(files) == 2 and f"{render_key_digest(make_key(1))}.img" not in files
+    assert RenderCache(max_bytes=0, disk_dir=disk_dir).get(make_key(3)) == b'x' * 100
+
+async def check_single_flight(disk_dir):
+    cache = RenderCache(max_bytes=10000, disk_dir=disk_dir)
+    renders = []
+
+    async def render(key):
+        renders.append(key)
+        await asyncio.sleep(0.05)
+        return b'png' * key.weeks_lived
+
+    results = await asyncio.gather(*(cache.get_or_render(make_key(7), render) for _ in range(10)))
+    assert results == [b'png' * 7] * 10 and len(renders) == 1
+    assert cache.hits == 9 and cache.misses == 1
+    assert os.path.exists(cache._disk_path(render_key_digest(make_key(7))))
+
+    # Другой процесс находит картинку на диске и не рендерит ее заново
+    other = RenderCache(max_bytes=10000, disk_dir=disk_dir)
+    assert await other.get_or_render(make_key(7), render) == b'png' * 7 and len(renders) == 1
+
+    # Ошибка рендера достается всем ожидающим, и следующий запрос рендерит заново
+    async def broken(key):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("worker died")
+
+    results = await asyncio.gather(*(cache.get_or_render(make_key(8), broken) for _ in range(3)),
+                                   return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await cache.get_or_render(make_key(8), render) == b'png' * 8
+
+def test_render_cache():
+    """Проверяет LRU в памяти, вытеснение с диска и один рендер на параллельные запросы"""
+    print("🎯 Тестирование кэша рендеров...")
+    check_memory_lru()
+    print("✅ Память вытесняет давно не использованные календари")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_disk_eviction(os.path.join(tmp_dir, 'evict'))
+        print("✅ Диск вытесняет самые старые файлы")
+        asyncio.run(check_single_flight(os.path.join(tmp_dir, 'shared')))
+        print("✅ 10 параллельных запросов - один рендер")
+
+if __name__ == "__main__":
+    test_render_cache()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки памяти ответов текстовых команд
+"""
+
+from datetime import date, timedelta
+from response_memo import ResponseMemo
+
+def test_response_memo():
+    """Проверяет сброс в полночь, сброс по пользователю и лимит пользователей"""
+    print("🎯 Тестирование памяти ответов...")
+    memo = ResponseMemo(max_users=2)
+    today = date(2024, 6, 3)
+    builds = []
+
+    def build(text):
+        def build_text():
+            builds.append(text)
+            return text
+        return build_text
+
+    assert memo.get_or_build(1, 'week', today, build('неделя')) == 'неделя'
+    assert memo.get_or_build(1, 'week', today, build('заново')) == 'неделя'
+    assert memo.get_or_build(1, 'age', today, build('возраст')) == 'возраст'
+    assert builds == ['неделя', 'возраст'] and memo.hits == 1 and memo.misses == 2
+    print("✅ Повторная команда в тот же день берется из памяти")
+
+    # После полуночи все ответы считаются заново
+    tomorrow = today + timedelta(days=1)
+    assert memo.get(1, 'week', tomorrow) is None and len(memo) == 0
+    assert memo.get_or_build(1, 'week', tomorrow, build('завтра')) == 'завтра'
+    print("✅ Ответы живут до полуночи")
+
+    # /setbirth и /setgender сбрасывают ответы только своего пользователя
+    memo.put(2, 'week', tomorrow, 'второй')
+    memo.invalidate(1)
+    assert memo.get(1, 'week', tomorrow) is None and memo.get(2, 'week', tomorrow) == 'второй'
+    print("✅ Изменение настроек сбрасывает ответы пользователя")
+
+    # Сверх лимита вытесняется пользователь, который дольше всех не обращался
+    memo.put(1, 'week', tomorrow, 'первый')
+    memo.get(2, 'week', tomorrow)
+    memo.put(3, 'week', tomorrow, 'третий')
+    assert len(memo) == 2 and memo.get(1, 'week', tomorrow) is None and memo.get(2, 'week', tomorrow) == 'второй'
+    print("✅ Лимит пользователей соблюдается")
+
+if __name__ == "__main__":
+    test_response_memo()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки постоянного хранилища задач и догоняющей рассылки календарей
+"""
+
+import asyncio
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+import pytz
+from broadcast import WeeklyBroadcast
+from scheduler import (CLEANUP_JOB_ID, JOB_ID, REPORT_TIMEZONE, WeeklyReportScheduler, report_week_start,
+                       run_file_id_cleanup)
+
+class RecordingBroadcast:
+    """Рассылка, которая только запоминает, за какие недели ее запускали"""
+    def __init__(self):
+        self.runs = []
+
+    def has_unfinished(self, today=None):
+        return False
+
+    def is_finished(self, today=None):
+        return today in self.runs
+
+    async def run(self, bot, today=None):
+        self.runs.append(today)
+
+class RecordingFileIds:
+    def __init__(self):
+        self.pruned = []
+
+    def prune(self, week_of):
+        self.pruned.append(week_of)
+        return 0
+
+def make_scheduler(db_path, calls):
+    scheduler = WeeklyReportScheduler(None, broadcast=RecordingBroadcast(), db_path=db_path)
+
+    async def send_weekly_report(week_start=None):
+        calls.append(week_start)
+    scheduler.send_weekly_report = send_weekly_report  # без обращений к Telegram
+    return scheduler
+
+async def run_scenario(db_path):
+    calls = []
+    first = make_scheduler(db_path, calls)
+    first.start_scheduler()
+    job = first.scheduler.get_job(JOB_ID)
+    assert job.func_ref == 'scheduler:run_weekly_report'
+    assert job.next_run_time > datetime.now(REPORT_TIMEZONE) and first.missed_run is None
+    # Бот "лежал" два дня: запуск пропущен дальше misfire_grace_time
+    missed = datetime.now(REPORT_TIMEZONE) - timedelta(days=2)
+    first.scheduler.pause()
+    first.scheduler.modify_job(JOB_ID, next_run_time=missed)
+    first.stop_scheduler()
+    print("✅ Задача сохраняется в SQLite по ссылке на функцию")
+
+    second = make_scheduler(db_path, calls)
+    second.start_scheduler()
+    assert second.missed_run is not None
+    await second._catch_up_task
+    await asyncio.sleep(0.2)  # APScheduler сам пропускает запуск, опоздавший больше misfire_grace_time
+    assert calls == [report_week_start()]
+    assert second.scheduler.get_job(JOB_ID).next_run_time > datetime.now(REPORT_TIMEZONE)
+    second.stop_scheduler()
+    print("✅ Пропущенный отчет отправлен один раз при старте")
+
+    # Следующий перезапуск ничего не догоняет
+    third = make_scheduler(db_path, calls)
+    third.start_scheduler()
+    assert third.missed_run is None and third._catch_up_task is None
+    third.stop_scheduler()
+    assert len(calls) == 1
+    print("✅ Повторный старт не отправляет отчет еще раз")
+
+    # Настоящий запуск передает рассылке общего бота приложения и неделю отчета
+    bot, broadcast = object(), RecordingBroadcast()
+    fourth = WeeklyReportScheduler(bot, broadcast=broadcast, db_path=db_path)
+    await fourth.send_weekly_report()
+    assert broadcast.runs == [report_week_start()]
+    fourth.stop_scheduler()
+
+    # Без рассылки задача из базы удаляется, а чистка file_id остается и проходит при старте
+    file_ids = RecordingFileIds()
+    fifth = WeeklyReportScheduler(bot, file_ids=file_ids, db_path=db_path)
+    fifth.start_scheduler()
+    assert fifth.scheduler.get_job(JOB_ID) is None
+    assert fifth.scheduler.get_job(CLEANUP_JOB_ID).func_ref == 'scheduler:run_file_id_cleanup'
+    assert file_ids.pruned == [report_week_start()]
+    await run_file_id_cleanup()
+    assert len(file_ids.pruned) == 2
+    fifth.stop_scheduler()
+    print("✅ Рассылка идет через общего бота приложения")
+    print("✅ Старые file_id чистятся и без рассылки")
+
+def test_scheduler():
+    """Проверяет хранилище задач, неделю отчета и догоняющую рассылку"""
+    print("🎯 Тестирование планировщика...")
+    # Понедельник 00:30 в Лиссабоне летом - это еще воскресенье по UTC
+    sunday_night_utc = pytz.utc.localize(datetime(2024, 6, 2, 23, 30))
+    assert report_week_start(sunday_night_utc) == date(2024, 6, 3)
+    assert WeeklyBroadcast.current_broadcast_id(date(2024, 6, 3)) == '2024-W23'
+    print("✅ Неделя отчета считается по времени Лиссабона")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(run_scenario(os.path.join(tmp_dir, 'scheduler.db')))
+
+if __name__ == "__main__":
+    test_scheduler()
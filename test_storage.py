@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки хранилища пользователей
+"""
+
+import os
+import tempfile
+from datetime import date
+from storage import UserStore, SQLiteBackend, MemoryBackend
+
+def test_storage():
+    """Проверяет запись, кэш и сохранение пользователей между перезапусками"""
+    print("🎯 Тестирование хранилища пользователей...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'users.db')
+        
+        store = UserStore(SQLiteBackend(db_path), batch_size=2)
+        assert store.get(1) is None
+        assert store.get_gender(1) == 'default'
+        
+        store.set_gender(1, 'female')
+        store.set_birth_date(1, date(1990, 3, 15))
+        assert store.get(1).birth_date == date(1990, 3, 15)
+        assert store.get(1).gender == 'female'
+        
+        # Второй пользователь заполняет пачку - изменения записываются в базу
+        store.set_birth_date(2, date(1985, 1, 1))
+        store.close()
+        
+        reopened = UserStore(SQLiteBackend(db_path))
+        assert reopened.get(1).gender == 'female'
+        assert reopened.get_birth_date(2) == date(1985, 1, 1)
+        assert len(reopened.all_users()) == 2
+        
+        # Другой процесс пишет в ту же базу - общий список и настройки видны всем
+        other = UserStore(SQLiteBackend(db_path))
+        other.set_birth_date(3, date(2001, 9, 9))
+        other.set_setting('channel_id', '-1001234567890')
+        other.flush()
+        assert len(reopened.all_users()) == 3
+        assert reopened.get_setting('channel_id') == '-1001234567890'
+        other.close()
+        reopened.close()
+        
+        # Отсутствие пользователя помнится недолго и в ограниченном числе
+        store = UserStore(SQLiteBackend(db_path), miss_ttl=60, max_misses=2)
+        writer = UserStore(SQLiteBackend(db_path))
+        assert store.get(4) is None
+        writer.set_birth_date(4, date(1970, 1, 1))
+        writer.flush()
+        assert store.get(4) is None, "отсутствие еще не истекло"
+        store._misses[4] = 0  # время жизни вышло
+        assert store.get(4).birth_date == date(1970, 1, 1)
+        for user_id in (5, 6, 7):
+            assert store.get(user_id) is None
+        assert list(store._misses) == [6, 7]
+        writer.close()
+        store.close()
+        print("✅ Пользователи сохраняются между перезапусками")
+    
+    memory_store = UserStore(MemoryBackend(), batch_size=100)
+    memory_store.set_birth_date(3, date(2000, 6, 1))
+    memory_store.flush()
+    assert memory_store.backend.get(3).birth_date == date(2000, 6, 1)
+    print("✅ Хранилище в памяти работает")
+
+if __name__ == "__main__":
+    test_storage()
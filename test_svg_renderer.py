@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки векторного SVG и недельных обновлений к нему
+"""
+
+import json
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from config import GRID_COLUMNS
+from life_visualizer import LifeVisualizer, RenderKey
+from svg_renderer import lived_runs
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+def covered_weeks(runs):
+    """Номера недель, которые закрывают прямоугольники"""
+    return {row * GRID_COLUMNS + col
+            for x, y, width, height in runs
+            for row in range(y, y + height) for col in range(x, x + width)}
+
+def lived_rects(svg_bytes):
+    lived = next(g for g in ET.fromstring(svg_bytes).iter(f'{SVG}g') if g.get('id') == 'lived')
+    return [tuple(int(rect.get(a)) for a in ('x', 'y', 'width', 'height')) for rect in lived]
+
+def test_svg_renderer():
+    """Проверяет прямоугольники прожитых недель, размер SVG и недельную дельту"""
+    print("🎯 Тестирование SVG...")
+    for start, end in [(0, 0), (0, 1), (0, 52), (0, 1909), (5, 50), (51, 53), (1908, 1909), (10, 4160)]:
+        runs = lived_runs(start, end)
+        assert covered_weeks(runs) == set(range(start, end)), (start, end)
+        assert len(runs) <= 3
+    print("✅ Любой диапазон недель - не больше трех прямоугольников")
+
+    visualizer = LifeVisualizer(preset='svg')
+    key = RenderKey(visualizer.engine, 80, 1909, date(2024, 6, 3), 'svg')
+    svg_bytes = visualizer.render_grid(key)
+    assert visualizer.file_extension(key) == 'svg'
+    assert len(svg_bytes) < 10000, len(svg_bytes)
+    assert covered_weeks(lived_rects(svg_bytes)) == set(range(1909))
+    root = ET.fromstring(svg_bytes)
+    ids = {element.get('id') for element in root.iter() if element.get('id')}
+    assert ids == {'lived', 'stats', 'footer'}
+    assert 'Weeks Lived: 1,909' in ''.join(root.itertext())
+    assert lived_rects(visualizer.render_grid(key._replace(weeks_lived=100 * GRID_COLUMNS))) == [(0, 0, 52, 80)]
+    print(f"✅ SVG календаря: {len(svg_bytes):,} байт")
+
+    # Прошлая неделя + дельта = календарь этой недели
+    next_key = key._replace(weeks_lived=1910, week_of=key.week_of + timedelta(weeks=1))
+    delta = json.loads(visualizer.render_delta(next_key))
+    assert delta['since_weeks_lived'] == 1909 and delta['lived'] == '<rect x="37" y="36" width="1" height="1"/>'
+    assert 'June 10, 2024' in delta['footer'] and 'Weeks Lived: 1,910' in delta['stats']
+    next_svg = visualizer.render_grid(next_key)
+    for element_id in ('stats', 'footer'):
+        assert delta[element_id] in next_svg.decode('utf-8')
+    print(f"✅ Недельная дельта: {len(visualizer.render_delta(next_key))} байт")
+
+    # Дельта за несколько недель через границу года
+    delta = json.loads(visualizer.render_delta(key._replace(weeks_lived=1980), since_weeks_lived=1909))
+    rects = lived_rects(f'<svg xmlns="http://www.w3.org/2000/svg"><g id="lived">{delta["lived"]}</g></svg>')
+    assert covered_weeks(rects) == set(range(1909, 1980))
+    for since_weeks_lived in (2000, -1):
+        try:
+            visualizer.render_delta(key, since_weeks_lived=since_weeks_lived)
+            assert False, f"дельта с {since_weeks_lived} должна вызывать ошибку"
+        except ValueError:
+            pass
+    print("✅ Дельта за несколько недель и проверка направления")
+
+if __name__ == "__main__":
+    test_svg_renderer()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки параллельной обработки обновлений
+"""
+
+import asyncio
+from types import SimpleNamespace
+from update_processor import UserOrderedUpdateProcessor
+
+def make_update(chat_id, text):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=chat_id), effective_chat=SimpleNamespace(id=chat_id),
+                           effective_message=SimpleNamespace(text=text))
+
+def make_inline_query(user_id):
+    """У инлайн-запроса есть пользователь, но нет чата и сообщения"""
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None, effective_message=None)
+
+async def run_scenario():
+    processor = UserOrderedUpdateProcessor(concurrency=2)
+    log = []
+
+    async def handle(chat_id, text, delay):
+        log.append(('start', chat_id, text))
+        await asyncio.sleep(delay)
+        log.append(('end', chat_id, text))
+
+    def submit(chat_id, text, delay):
+        update = make_update(chat_id, text)
+        return asyncio.ensure_future(processor.process_update(update, handle(chat_id, text, delay)))
+
+    # Два долгих /show занимают оба слота, затем приходят /setbirth+/show от 3 и /age от 4
+    tasks = [
+        submit(1, '/show', 0.2),
+        submit(2, '/show', 0.2),
+        submit(3, '/setbirth 15.03.1990', 0.01),
+        submit(3, '/show', 0.05),
+        submit(5, '/show', 0.01),
+        submit(4, '/age', 0.01),
+    ]
+    await asyncio.sleep(0.05)
+    assert processor.get_status()['running'] == 2
+    await asyncio.gather(*tasks)
+
+    starts = [(chat_id, text) for event, chat_id, text in log if event == 'start']
+    # Команды одного пользователя не переставляются
+    assert starts.index((3, '/setbirth 15.03.1990')) < starts.index((3, '/show'))
+    assert log.index(('end', 3, '/setbirth 15.03.1990')) < log.index(('start', 3, '/show'))
+    # Текстовые команды обгоняют рендеры, пришедшие раньше
+    assert starts.index((4, '/age')) < starts.index((5, '/show'))
+    assert processor.get_status()['chats'] == 0
+
+    # Инлайн-запросы без чата идут в порядке прихода вместе с командами того же пользователя
+    log.clear()
+    tasks = [
+        asyncio.ensure_future(processor.process_update(make_inline_query(6), handle(6, 'inline 1', 0.05))),
+        asyncio.ensure_future(processor.process_update(make_inline_query(6), handle(6, 'inline 2', 0.01))),
+        submit(6, '/setbirth 15.03.1990', 0.01),
+    ]
+    await asyncio.gather(*tasks)
+    assert [text for event, _, text in log if event == 'end'] == ['inline 1', 'inline 2', '/setbirth 15.03.1990']
+
+def test_update_processor():
+    """Проверяет порядок обновлений одного пользователя и приоритет текстовых команд"""
+    print("🎯 Тестирование обработки обновлений...")
+    asyncio.run(run_scenario())
+    print("✅ Порядок команд пользователя сохраняется, текстовые команды идут первыми")
+
+if __name__ == "__main__":
+    test_update_processor()
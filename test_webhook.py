@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки режима webhook на локальном фейковом Telegram
+"""
+
+import asyncio
+import socket
+from aiohttp import ClientSession, web
+from telegram.ext import Application, CommandHandler
+from fake_telegram import FakeTelegram
+from webhook_server import SECRET_HEADER, WebhookServer, run_webhook
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def run_scenario():
+    fake = FakeTelegram()
+    fake_runner = web.AppRunner(fake.build_app())
+    await fake_runner.setup()
+    fake_port = free_port()
+    await web.TCPSite(fake_runner, '127.0.0.1', fake_port).start()
+
+    async def start(update, context):
+        await update.message.reply_text(f"привет, {update.effective_user.id}")
+
+    application = (
+        Application.builder()
+        .token('123456:TEST')
+        .base_url(f"http://127.0.0.1:{fake_port}/bot")
+        .updater(None)
+        .concurrent_updates(4)
+        .build()
+    )
+    application.add_handler(CommandHandler("start", start))
+
+    server = WebhookServer(application, path='/telegram', secret='s3cret', listen='127.0.0.1', port=free_port())
+    stop_event = asyncio.Event()
+    webhook_url = f"http://127.0.0.1:{server.port}"
+    bot_task = asyncio.create_task(run_webhook(application, webhook_url, server, stop_event))
+
+    try:
+        async with ClientSession() as session:
+            for _ in range(100):
+                if fake.webhook_url:
+                    break
+                await asyncio.sleep(0.05)
+            assert fake.webhook_url == f"{webhook_url}/telegram"
+
+            async with session.get(f"{webhook_url}/health") as response:
+                assert response.status == 200
+                assert (await response.json())['mode'] == 'webhook'
+            print("✅ Health endpoint отвечает")
+
+            # Запрос без секрета отклоняется и не доходит до обработчиков
+            async with session.post(f"{webhook_url}/telegram", json=fake.make_update(7, '/start')) as response:
+                assert response.status == 403
+            print("✅ Запрос с неверным секретом отклонен")
+
+            # Тело - JSON, но не объект обновления
+            headers = {SECRET_HEADER: 's3cret'}
+            for body in ([], 42, "update", None, {"foo": 1}, {"update_id": 1, "message": "text"}):
+                async with session.post(f"{webhook_url}/telegram", json=body, headers=headers) as response:
+                    assert response.status == 400, body
+            print("✅ Тело, которое не является обновлением, отклонено с кодом 400")
+
+            for user_id in (1, 2, 3):
+                assert await fake.deliver(fake.make_update(user_id, '/start')) == 200
+            for _ in range(100):
+                if len(fake.sent) == 3:
+                    break
+                await asyncio.sleep(0.05)
+            assert sorted(m['chat_id'] for m in fake.sent) == [1, 2, 3]
+            assert server.received == 3 and server.rejected == 1
+            print("✅ Обновления доставлены через webhook и обработаны")
+    finally:
+        stop_event.set()
+        await bot_task
+        await fake_runner.cleanup()
+
+def test_webhook():
+    """Проверяет webhook-сервер: секрет, health и обработку обновлений"""
+    print("🎯 Тестирование режима webhook...")
+    asyncio.run(run_scenario())
+
+if __name__ == "__main__":
+    test_webhook()
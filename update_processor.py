@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Concurrent update processing that keeps each user's updates in order
+"""
+
+import asyncio
+import heapq
+import itertools
+import sys
+from telegram.ext import BaseUpdateProcessor
+from config import UPDATE_WORKERS
+
+# Приоритеты: чем меньше число, тем раньше обновление получает слот
+PRIORITY_TEXT = 0
+PRIORITY_RENDER = 1
+
+
+class PrioritySemaphore:
+    """Semaphore that hands a freed slot to the waiter with the lowest priority value (FIFO within a priority)"""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.in_use = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority):
+        if self.in_use < self.slots and not self.waiting:
+            self.in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # слот уже передали нам - отдаем следующему
+            raise
+
+    def release(self):
+        # Слот переходит напрямую к ожидающему, чтобы новые запросы не обгоняли очередь
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to `concurrency` handlers at once; updates from one user run strictly in arrival order.
+
+    Updates are keyed on the user who sent them, so inline queries and callback queries from inline
+    messages, which have no chat, are ordered too. Updates without a user (channel posts) are keyed
+    on their chat. Text commands are scheduled before image renders, so a burst of /show does not
+    delay /age or /week.
+    """
+
+    def __init__(self, concurrency=UPDATE_WORKERS, render_commands=('show',)):
+        self.concurrency = concurrency
+        self.render_commands = frozenset(render_commands)
+        self._slots = PrioritySemaphore(concurrency)
+        self._tails = {}  # ключ порядка -> Future, завершающийся после последнего обновления этого пользователя
+        # Семафор PTB не должен блокировать: иначе он может переставить обновления одного чата.
+        # Настоящее ограничение - self._slots
+        super().__init__(sys.maxsize)
+
+    @staticmethod
+    def _order_key(update):
+        user = getattr(update, 'effective_user', None)
+        if user:
+            return 'user', user.id
+        chat = getattr(update, 'effective_chat', None)
+        return ('chat', chat.id) if chat else None
+
+    def priority(self, update):
+        """Renders wait behind text commands"""
+        message = getattr(update, 'effective_message', None)
+        text = (message.text or '') if message else ''
+        if text.startswith('/'):
+            command = text[1:].split(maxsplit=1)[0].split('@')[0].lower() if len(text) > 1 else ''
+            if command in self.render_commands:
+                return PRIORITY_RENDER
+        return PRIORITY_TEXT
+
+    async def do_process_update(self, update, coroutine):
+        # Встаем в очередь пользователя до первого await: задачи PTB стартуют в порядке прихода обновлений
+        key = self._order_key(update)
+        previous = self._tails.get(key) if key is not None else None
+        done = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._tails[key] = done
+
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)  # отмена этого обновления не должна отменять предыдущее
+            await self._slots.acquire(self.priority(update))
+            try:
+                await coroutine
+            finally:
+                self._slots.release()
+        finally:
+            done.set_result(None)
+            if key is not None and self._tails.get(key) is done:
+                del self._tails[key]
+            if asyncio.iscoroutine(coroutine):
+                coroutine.close()  # не запущена из-за отмены - без предупреждения "never awaited"
+
+    def get_status(self):
+        """Get current handler load"""
+        return {
+            'concurrency': self.concurrency,
+            'running': self._slots.in_use,
+            'waiting': self._slots.waiting,
+            'chats': len(self._tails)
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
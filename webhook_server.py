@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Webhook ingestion: a local aiohttp server that feeds Telegram updates into the Application
+"""
+
+import asyncio
+import hmac
+import logging
+import signal
+from aiohttp import web
+from telegram import Update
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_LISTEN, WEBHOOK_PORT
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    def __init__(self, application, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                 listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT):
+        self.application = application
+        self.path = path
+        self.secret = secret
+        self.listen = listen
+        self.port = port
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/health', self.handle_health)
+        return app
+
+    def _authorized(self, request):
+        if not self.secret:
+            return True
+        token = request.headers.get(SECRET_HEADER, '')
+        return hmac.compare_digest(token.encode('utf-8'), self.secret.encode('utf-8'))
+
+    async def handle_update(self, request):
+        """Accept one update and queue it; handlers run after Telegram already got its 200"""
+        if not self._authorized(request):
+            self.rejected += 1
+            logger.warning(f"⚠️ Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            # Валидный JSON, но не объект: Update.de_json упал бы с ошибкой 500
+            return web.Response(status=400)
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (TypeError, KeyError, ValueError, AttributeError) as e:
+            # Объект, но не Update (например, без update_id): на 500 Telegram повторял бы его без конца
+            logger.warning(f"⚠️ Rejected malformed update: {e}")
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        self.received += 1
+        return web.Response()
+
+    async def handle_health(self, request):
+        """200 while the application is processing updates, 503 otherwise"""
+        running = self.application.running
+        return web.json_response({
+            'status': 'ok' if running else 'starting',
+            'mode': 'webhook',
+            'received': self.received,
+            'rejected': self.rejected,
+            'queued': self.application.update_queue.qsize()
+        }, status=200 if running else 503)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"🌐 Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("🛑 Webhook server stopped")
+
+
+async def run_webhook(application, webhook_url=WEBHOOK_URL, server=None, stop_event=None):
+    """Run the application behind the webhook server until SIGINT/SIGTERM or stop_event is set"""
+    server = server or WebhookServer(application)
+    stop_event = stop_event or asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows или не главный поток
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+
+        # Регистрируем вебхук только когда сервер уже принимает запросы
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url.rstrip('/') + server.path,
+                secret_token=server.secret or None,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logger.info(f"✅ Webhook registered at {webhook_url.rstrip('/')}{server.path}")
+        else:
+            logger.warning("⚠️ WEBHOOK_URL is not set, expecting the webhook to be registered externally")
+
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)